@@ -0,0 +1,452 @@
+"""
+エクスポートのオフラインベンチマーク
+
+記録済みの pybaseball レスポンス (fixtures) を遅延付きで再生し、S3 の代わりに moto
+(またはローカルの S3 互換サーバー) に書き出して、エクスポート全体を計測する。
+変更前後のコミットで同じシナリオを実行し、結果の JSON を比較する。
+
+シナリオ = 年度範囲 × 並列数 × 注入する遅延 (× レート制限)。各シナリオは別プロセスで実行し、
+  - 全体の所要時間 (lambda_handler の呼び出し)
+  - ステージ別の合計時間 (fetch / transform / serialize / upload、EMF 出力から集計)
+  - ピーク RSS
+  - 書き込んだバイト数 (プレフィックス別)
+を記録する。
+
+    # fixtures の記録 (ネットワークが必要。1回だけ)
+    python benchmarks/bench_export.py record --years 2015-2025
+
+    # 計測 (fixtures がない (dataset, year) は --synthetic で合成データを使う)
+    python benchmarks/bench_export.py run --years 2021-2025 --years 2015-2025 \\
+        --workers 2 --workers 8 --latency 0.3 --output benchmarks/results/$(git rev-parse --short HEAD).json
+
+    # 比較
+    python benchmarks/bench_export.py compare benchmarks/results/abc1234.json benchmarks/results/def5678.json
+
+S3 の代わりは既定で moto (pip install moto) を使い、
+--endpoint-url で MinIO / moto_server などのローカル S3 互換サーバーも使える。
+シナリオが完走することの確認は pytest の benchmark マーカー (python -m pytest -m benchmark、
+既定の pytest 実行からは除外) で行う (test_bench_export.py)。
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import types
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(ROOT, 'lambda')
+DEFAULT_FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+BENCH_BUCKET = 'baseball-bench'
+
+STAGES = ('fetch', 'transform', 'serialize', 'upload')
+
+# 合成データの行数 (1回の呼び出しあたり。statcast は1日あたり)
+SYNTHETIC_ROWS = {
+    'batting_stats': 150,
+    'pitching_stats': 100,
+    'team_batting': 30,
+    'team_pitching': 30,
+    'team_fielding': 30,
+    'statcast': 300,
+}
+
+
+# ---------- fixtures ----------
+
+def fixture_path(fixtures, func, key):
+    return os.path.join(fixtures, func, f"{key}.parquet")
+
+
+def synthetic_frame(spec, rows, seed, year=None, day=None):
+    """
+    宣言カラムの型に合わせた合成データ (fixtures がない場合のみ)
+
+    Season は取得した年度にする (コンパクションの行グループがシーズン単位になるように)。
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    data = {}
+    for column in spec.columns:
+        if column.source == 'Season':
+            data[column.source] = [year] * rows
+        elif column.glue_type == 'string':
+            data[column.source] = [f"{column.name}-{i % max(1, rows // 2)}" for i in range(rows)]
+        elif column.glue_type == 'tinyint':
+            data[column.source] = rng.integers(0, 10, rows)
+        elif column.glue_type in ('smallint', 'int', 'bigint'):
+            data[column.source] = rng.integers(1, 200, rows)
+        elif column.glue_type == 'date':
+            data[column.source] = [day] * rows
+        else:
+            data[column.source] = rng.random(rows) * 10
+    return pd.DataFrame(data)
+
+
+class Replay:
+    """
+    pybaseball の代わりに sys.modules に登録する再生用モジュール
+
+    fixtures/<func>/<year>.parquet (statcast は fixtures/statcast/<YYYY-MM-DD>.parquet、
+    選手台帳は fixtures/chadwick_register/register.parquet) を読み、
+    呼び出しごとに latency 秒待つ。
+    """
+
+    def __init__(self, fixtures, latency, synthetic):
+        from datasets import REGISTRY
+
+        self.fixtures = fixtures
+        self.latency = latency
+        self.synthetic = synthetic
+        self.specs = {spec.fetch_func: spec for spec in REGISTRY}
+        self.stats = {'calls': 0, 'fixture_hits': 0, 'synthetic': 0}
+
+    def load(self, func, key, seed, year=None, day=None):
+        import pandas as pd
+
+        self.stats['calls'] += 1
+        path = fixture_path(self.fixtures, func, key)
+        if os.path.exists(path):
+            self.stats['fixture_hits'] += 1
+            return pd.read_parquet(path)
+        if not self.synthetic or func not in self.specs:
+            raise FileNotFoundError(f"No fixture {path} (record it or pass --synthetic)")
+        self.stats['synthetic'] += 1
+        return synthetic_frame(self.specs[func], SYNTHETIC_ROWS.get(func, 100), seed, year, day)
+
+    def season_func(self, func):
+        def call(start_season, end_season=None, **kwargs):
+            time.sleep(self.latency)
+            return self.load(func, start_season, seed=start_season, year=start_season)
+        return call
+
+    def statcast(self, start_dt=None, end_dt=None, **kwargs):
+        import pandas as pd
+
+        time.sleep(self.latency)
+        start, end = date.fromisoformat(start_dt), date.fromisoformat(end_dt)
+        frames = [self.load('statcast', day.isoformat(), seed=int(day.strftime('%Y%m%d')), day=day)
+                  for day in (start + timedelta(days=i) for i in range((end - start).days + 1))]
+        return pd.concat(frames, ignore_index=True)
+
+    def module(self):
+        replay = types.ModuleType('pybaseball')
+        for func in self.specs:
+            setattr(replay, func, self.statcast if func == 'statcast' else self.season_func(func))
+        # 選手ID索引の台帳 (fixture がなければ players.py が取得失敗として player_id を null にする)
+        replay.chadwick_register = lambda save=False: self.load('chadwick_register', 'register', seed=0)
+        replay.cache = types.SimpleNamespace(enable=lambda: None, disable=lambda: None)
+        return replay
+
+
+def record(args):
+    """
+    実際の pybaseball を呼び出して fixtures を保存 (既にあるものはスキップ)
+    """
+    sys.path.insert(0, LAMBDA_DIR)
+    from datasets import select_specs
+
+    years = sorted({year for value in args.years
+                    for year in range(parse_years(value)[0], parse_years(value)[1] + 1)})
+    for spec in select_specs(args.datasets):
+        if spec.fetch_func == 'statcast':
+            print(f"  - {spec.key}: record days with --statcast-days (skipped)")
+            continue
+        for year in years:
+            path = fixture_path(args.fixtures, spec.fetch_func, year)
+            if os.path.exists(path):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fetch_args, kwargs = spec.fetch_args(year)
+            import pybaseball
+            data = getattr(pybaseball, spec.fetch_func)(*fetch_args, **kwargs)
+            data.to_parquet(path, index=False)
+            print(f"  ✓ {spec.fetch_func} {year}: {len(data)} rows → {path}")
+    path = fixture_path(args.fixtures, 'chadwick_register', 'register')
+    if not os.path.exists(path):
+        import pybaseball
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = pybaseball.chadwick_register()
+        data.to_parquet(path, index=False)
+        print(f"  ✓ chadwick_register: {len(data)} rows → {path}")
+    for day in args.statcast_days or []:
+        path = fixture_path(args.fixtures, 'statcast', day)
+        if not os.path.exists(path):
+            import pybaseball
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = pybaseball.statcast(start_dt=day, end_dt=day, verbose=False, parallel=False)
+            data.to_parquet(path, index=False)
+            print(f"  ✓ statcast {day}: {len(data)} rows → {path}")
+    return 0
+
+
+# ---------- 1シナリオの実行 (子プロセス) ----------
+
+def stage_totals(output):
+    """
+    EMF 行からユニット単位のメトリクスを集計
+    """
+    totals = {f"{stage}_seconds": 0.0 for stage in STAGES}
+    totals.update({'units': 0, 'failed_units': 0, 'rows': 0, 'unit_seconds': 0.0, 'retries': 0})
+    for line in output.splitlines():
+        if not line.startswith('{') or '"Dataset"' not in line:
+            continue
+        record = json.loads(line)
+        totals['units'] += 1
+        totals['failed_units'] += record.get('Failures', 0)
+        totals['rows'] += record.get('Rows', 0)
+        totals['retries'] += record.get('Retries', 0)
+        totals['unit_seconds'] += record.get('UnitTime', 0) / 1000
+        for stage in STAGES:
+            totals[f"{stage}_seconds"] += record.get(f"{stage.capitalize()}Time", 0) / 1000
+    return {name: round(value, 3) if isinstance(value, float) else value
+            for name, value in totals.items()}
+
+
+def bytes_by_prefix(s3_client):
+    totals = {}
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=BENCH_BUCKET):
+        for obj in page.get('Contents', []):
+            prefix = obj['Key'].split('/', 1)[0]
+            totals[prefix] = totals.get(prefix, 0) + obj['Size']
+    return dict(sorted(totals.items()))
+
+
+def run_scenario(scenario, options, result_path):
+    start_year, end_year = parse_years(scenario['years'])
+    workers = scenario['workers']
+    os.environ.update({
+        'S3_BUCKET': BENCH_BUCKET,
+        'START_YEAR': str(start_year),
+        'END_YEAR': str(end_year),
+        'FETCH_MAX_WORKERS': str(workers),
+        'SOURCE_CONCURRENCY': f"fangraphs={workers},baseball_savant={workers}",
+        'FETCH_RATE_LIMITS': f"fangraphs={scenario['rate']},baseball_savant={scenario['rate']}",
+        'RESPONSE_CACHE': 'off',
+        'AVAILABILITY': 'off',
+        # ステージ別の時間は EMF 出力から集計する
+        'METRICS': 'on',
+        'AWS_DEFAULT_REGION': os.environ.get('AWS_DEFAULT_REGION', 'ap-northeast-1'),
+        'PYBASEBALL_CACHE': tempfile.mkdtemp(prefix='bench-pybaseball-'),
+    })
+    os.environ.pop('SLACK_WEBHOOK_URL', None)
+    if options['endpoint_url'] is None:
+        os.environ.update({'AWS_ACCESS_KEY_ID': 'bench', 'AWS_SECRET_ACCESS_KEY': 'bench'})
+    sys.path.insert(0, LAMBDA_DIR)
+
+    replay = Replay(options['fixtures'], scenario['latency'], options['synthetic'])
+    sys.modules['pybaseball'] = replay.module()
+
+    import boto3
+    if options['endpoint_url'] is None:
+        from moto import mock_aws
+        context = mock_aws()
+    else:
+        from contextlib import nullcontext
+        context = nullcontext()
+
+    with context:
+        s3_client = boto3.client('s3', endpoint_url=options['endpoint_url'])
+        create_bucket(s3_client)
+        import baseball_lambda
+        if options['endpoint_url'] is not None:
+            baseball_lambda.s3_client = s3_client
+
+        output = io.StringIO()
+        event = {'mode': 'full', 'datasets': options['datasets'] or []}
+        start = time.perf_counter()
+        with redirect_stdout(output):
+            response = baseball_lambda.lambda_handler(event, None)
+        seconds = time.perf_counter() - start
+        written = bytes_by_prefix(s3_client)
+
+    result = dict(scenario)
+    result.update({
+        'status': response['statusCode'],
+        'error': response['body'].get('error'),
+        'seconds': round(seconds, 3),
+        'records': response['body'].get('total_records'),
+        'files': response['body'].get('files_exported'),
+        'stages': stage_totals(output.getvalue()),
+        # Linux の ru_maxrss は KB
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'bytes_written': sum(written.values()),
+        'bytes_by_prefix': written,
+        'replay': replay.stats,
+    })
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+
+def create_bucket(s3_client):
+    region = s3_client.meta.region_name
+    kwargs = {} if region == 'us-east-1' else {'CreateBucketConfiguration': {'LocationConstraint': region}}
+    try:
+        s3_client.create_bucket(Bucket=BENCH_BUCKET, **kwargs)
+    except s3_client.exceptions.BucketAlreadyOwnedByYou:
+        # ローカルサーバーの場合は前回の出力を消してから計測する
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=BENCH_BUCKET):
+            for obj in page.get('Contents', []):
+                s3_client.delete_object(Bucket=BENCH_BUCKET, Key=obj['Key'])
+
+
+# ---------- シナリオ一覧の実行 (親プロセス) ----------
+
+def parse_years(value):
+    start, _, end = value.partition('-')
+    return int(start), int(end or start)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--', 'lambda'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    scenarios = [
+        {'years': years, 'workers': workers, 'latency': latency, 'rate': args.rate}
+        for years, workers, latency in itertools.product(args.years, args.workers, args.latency)
+    ]
+    options = {'fixtures': args.fixtures, 'synthetic': args.synthetic, 'datasets': args.datasets,
+               'endpoint_url': args.endpoint_url}
+
+    results = []
+    for scenario in scenarios:
+        for repeat in range(args.repeat):
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+                result_path = f.name
+            payload = json.dumps({'scenario': scenario, 'options': options, 'result': result_path})
+            subprocess.run([sys.executable, os.path.abspath(__file__), '_scenario', payload], check=True)
+            with open(result_path) as f:
+                result = json.load(f)
+            os.remove(result_path)
+            result['repeat'] = repeat
+            results.append(result)
+            print(f"  {scenario_id(result)} #{repeat}: {result['seconds']:.2f}s, "
+                  f"peak RSS {result['peak_rss_mb']} MB, {result['bytes_written']:,} bytes"
+                  + (f" ✗ {result['error']}" if result['error'] else ""))
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        's3': args.endpoint_url or 'moto',
+        'datasets': args.datasets,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"✓ {len(results)} runs → {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+def scenario_id(result):
+    return (f"years={result['years']} workers={result['workers']} latency={result['latency']}s "
+            f"rate={result['rate']}/s")
+
+
+def compare(args):
+    """
+    2つの結果ファイルをシナリオごとに比較 (繰り返しは中央値)
+    """
+    import statistics
+
+    def load(path):
+        with open(path) as f:
+            report = json.load(f)
+        grouped = {}
+        for result in report['results']:
+            grouped.setdefault(scenario_id(result), []).append(result)
+        return report, {key: {
+            'seconds': statistics.median(r['seconds'] for r in runs),
+            'peak_rss_mb': statistics.median(r['peak_rss_mb'] for r in runs),
+            'bytes_written': statistics.median(r['bytes_written'] for r in runs),
+        } for key, runs in grouped.items()}
+
+    base_report, base = load(args.base)
+    head_report, head = load(args.head)
+    print(f"{base_report['commit']} → {head_report['commit']}")
+    for key in sorted(set(base) & set(head)):
+        print(f"  {key}")
+        for metric in ('seconds', 'peak_rss_mb', 'bytes_written'):
+            before, after = base[key][metric], head[key][metric]
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"    {metric:14s} {before:>14,.2f} → {after:>14,.2f}  ({change:+.1f}%)")
+    for key in sorted(set(base) ^ set(head)):
+        print(f"  {key}: only in {'base' if key in base else 'head'}")
+    return 0
+
+
+def main(argv):
+    if argv and argv[0] == '_scenario':
+        payload = json.loads(argv[1])
+        run_scenario(payload['scenario'], payload['options'], payload['result'])
+        return 0
+
+    parser = argparse.ArgumentParser(description='Offline export benchmark')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run')
+    run_parser.add_argument('--years', action='append', help='year range, e.g. 2021-2025 (repeatable)')
+    run_parser.add_argument('--workers', action='append', type=int, help='FETCH_MAX_WORKERS (repeatable)')
+    run_parser.add_argument('--latency', action='append', type=float,
+                            help='injected seconds per pybaseball call (repeatable)')
+    run_parser.add_argument('--rate', type=float, default=1000.0,
+                            help='FETCH_RATE_LIMITS per source (calls/s, default: effectively unlimited)')
+    run_parser.add_argument('--repeat', type=int, default=1)
+    run_parser.add_argument('--output')
+    run_parser.add_argument('--endpoint-url', help='local S3-compatible server instead of moto')
+
+    record_parser = sub.add_parser('record')
+    record_parser.add_argument('--years', action='append', required=True)
+    record_parser.add_argument('--statcast-days', nargs='*', help='YYYY-MM-DD')
+
+    for p in (run_parser, record_parser):
+        p.add_argument('--fixtures', default=DEFAULT_FIXTURES)
+        p.add_argument('--datasets', type=lambda v: [d for d in v.split(',') if d],
+                       help='comma-separated dataset keys (default: enabled_by_default)')
+    run_parser.add_argument('--synthetic', action='store_true',
+                            help='generate data for (dataset, year) without a fixture')
+
+    compare_parser = sub.add_parser('compare')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('head')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        args.years = args.years or ['2021-2025']
+        args.workers = args.workers or [8]
+        args.latency = args.latency or [0.0]
+        return run(args)
+    if args.command == 'record':
+        return record(args)
+    return compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,63 @@
+"""
+bench_export のシナリオを pytest から実行する (benchmark マーカー付き。既定では実行しない)
+
+    python -m pytest -m benchmark
+
+fixtures がない (dataset, year) は合成データを使い、S3 は moto に書き出す。
+所要時間は比較せず、各シナリオがエラーなく完走して計測値が揃うことを確認する
+(コミット間の比較は bench_export.py run / compare を使う)。
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import bench_export
+
+pytestmark = pytest.mark.benchmark
+
+SCENARIOS = [
+    {'years': '2024', 'workers': 1, 'latency': 0.0, 'rate': 1000.0},
+    {'years': '2023-2024', 'workers': 4, 'latency': 0.0, 'rate': 1000.0},
+    {'years': '2023-2024', 'workers': 4, 'latency': 0.05, 'rate': 1000.0},
+]
+
+
+def run_bench(*args):
+    return subprocess.run([sys.executable, bench_export.__file__, *args], check=True,
+                          capture_output=True, text=True).stdout
+
+
+@pytest.mark.parametrize('scenario', SCENARIOS, ids=bench_export.scenario_id)
+def test_scenario(scenario, tmp_path):
+    # bench_export.py run と同じく1シナリオ1プロセスで実行する
+    result_path = tmp_path / 'result.json'
+    options = {'fixtures': str(tmp_path / 'fixtures'), 'synthetic': True, 'datasets': None,
+               'endpoint_url': None}
+    run_bench('_scenario', json.dumps({'scenario': scenario, 'options': options,
+                                       'result': str(result_path)}))
+    result = json.loads(result_path.read_text())
+
+    start, end = bench_export.parse_years(scenario['years'])
+    assert result['status'] == 200 and result['error'] is None
+    assert result['stages']['units'] >= end - start + 1
+    assert result['stages']['failed_units'] == 0
+    assert result['records'] > 0 and result['files'] > 0
+    assert result['bytes_written'] > 0 and result['peak_rss_mb'] > 0
+    assert result['replay']['synthetic'] > 0
+
+
+def test_run_and_compare(tmp_path):
+    output = tmp_path / 'results.json'
+    run_bench('run', '--years', '2024', '--workers', '2', '--workers', '4', '--synthetic',
+              '--datasets', 'batting,team_batting', '--fixtures', str(tmp_path / 'fixtures'),
+              '--output', str(output))
+    report = json.loads(output.read_text())
+    assert [r['workers'] for r in report['results']] == [2, 4]
+    assert all(r['status'] == 200 for r in report['results'])
+
+    compared = run_bench('compare', str(output), str(output))
+    assert compared.count('(+0.0%)') == 2 * 3
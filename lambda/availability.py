@@ -0,0 +1,201 @@
+"""
+データセットの年度別提供状況 (dataset, year) の確認とキャッシュ
+
+固定の skip_years の代わりに、取得前に (dataset, year) ごとにそのデータセット自身の取得関数で
+確認用リクエストを送り、データが返らない組み合わせはその実行でスキップする
+(同じ取得元でもエンドポイントごとに提供年度が違うため、取得元単位では判定しない)。
+結果は S3 に保存し、
+
+  - 提供あり: AVAILABILITY_TTL_HOURS (既定 30日) の間は確認せずに本取得へ進む
+  - 提供なし: AVAILABILITY_RECHECK_HOURS (既定 7日) の間はスキップし、その後に再確認する
+
+FanGraphs のデータセットは本取得と同じ呼び出しで確認する (レスポンスキャッシュ経由なら
+本取得でそのまま再利用される)。Statcast はシーズン中の複数の日付を1日ずつ確認し、
+どの日もデータがない場合だけ提供なしとする (開幕の遅れ・休養日で1日だけ空になることがあるため)。
+
+確認用リクエストは取得ゲートウェイ (レート制限・リトライ) を通す。
+429 / タイムアウト等で判定できなかった場合は保存せず、提供ありとして本取得に任せる
+(データを黙って取りこぼさないため)。
+
+    _state/availability.json   {"batting/2022": {"available": false, "checked_at": ..., "reason": ...}}
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from botocore.exceptions import ClientError
+
+from fetch_gateway import CircuitOpenError, get_gateway, is_retryable
+
+STATE_KEY = '_state/availability.json'
+DEFAULT_TTL_HOURS = 24 * 30
+DEFAULT_RECHECK_HOURS = 24 * 7
+PROBE_WORKERS = 4
+
+# Statcast はシーズン中の各月のこの日を順に確認し、データが返った時点で提供ありとする
+SAVANT_PROBE_DAY = 15
+
+
+def _probe_dataset(spec, year, cache):
+    # 本取得と同じ呼び出し (レスポンスキャッシュ経由なら本取得で再利用される)
+    return spec.fetch(year, cache=cache)
+
+
+def savant_probe_dates(spec, year):
+    """
+    Statcast の確認日 (シーズン期間内の各月の SAVANT_PROBE_DAY 日)
+    """
+    start, end = date(year, *spec.season_start), date(year, *spec.season_end)
+    days = [date(year, month, SAVANT_PROBE_DAY) for month in range(start.month, end.month + 1)]
+    return [day for day in days if start <= day <= end]
+
+
+def _probe_savant(spec, year, cache):
+    # 1日分ずつ取得し、データが返った日で打ち切る (全日が空なら空の結果を返す)
+    import pybaseball
+    data = None
+    for day in savant_probe_dates(spec, year):
+        data = get_gateway().call(spec.source, getattr(pybaseball, spec.fetch_func),
+                                  start_dt=day.isoformat(), end_dt=day.isoformat(), **spec.fetch_kwargs)
+        if data is not None and len(data) > 0:
+            break
+    return data
+
+
+# 取得元ごとの確認方法 (ないものは _probe_dataset)
+PROBES = {
+    'baseball_savant': _probe_savant,
+}
+
+
+def availability_id(dataset, year):
+    return f"{dataset}/{year}"
+
+
+class AvailabilityCache:
+    """
+    (dataset, year) の提供状況 (S3 に保存した確認結果 + TTL)
+
+        availability = AvailabilityCache(s3_client, bucket).load()
+        unavailable = availability.check(specs, range(2015, 2026), season=2025, cache=cache)
+        availability.save()
+    """
+
+    def __init__(self, s3_client, s3_bucket, ttl=None, recheck=None):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.ttl = ttl or float(os.environ.get('AVAILABILITY_TTL_HOURS', DEFAULT_TTL_HOURS)) * 3600
+        self.recheck = recheck or float(
+            os.environ.get('AVAILABILITY_RECHECK_HOURS', DEFAULT_RECHECK_HOURS)) * 3600
+        self.entries = {}
+        self.stats = {'cached': 0, 'probed': 0, 'unknown': 0}
+        self._dirty = False
+
+    def load(self):
+        try:
+            response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=STATE_KEY)
+            self.entries = json.loads(response['Body'].read()).get('entries', {})
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+                raise
+        return self
+
+    def save(self):
+        if not self._dirty:
+            return
+        body = json.dumps({'entries': self.entries}, indent=1, sort_keys=True)
+        self.s3_client.put_object(Bucket=self.s3_bucket, Key=STATE_KEY, Body=body.encode('utf-8'),
+                                  ContentType='application/json')
+        self._dirty = False
+
+    def fresh(self, entry, now=None):
+        """
+        保存済みの結果がまだ有効か (提供なしは短い間隔で再確認する)
+        """
+        age = (now or time.time()) - entry['checked_at']
+        return age < (self.ttl if entry['available'] else self.recheck)
+
+    def probe(self, spec, year, cache=None):
+        """
+        1つの (dataset, year) を確認して結果を保存
+
+        Returns:
+            True / False (判定できなかった場合は None)
+        """
+        probe = PROBES.get(spec.source, _probe_dataset)
+        reason = None
+        try:
+            data = probe(spec, year, cache)
+            available = data is not None and len(data) > 0
+            if not available:
+                reason = 'empty response'
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            if is_retryable(e):
+                return None
+            available, reason = False, f"{type(e).__name__}: {str(e)[:120]}"
+
+        self.entries[availability_id(spec.key, year)] = {
+            'available': available,
+            'checked_at': time.time(),
+            'reason': reason,
+        }
+        self._dirty = True
+        return available
+
+    def check(self, specs, years, season, cache=None):
+        """
+        全 (dataset, year) の提供状況を確定 (期限切れ・未確認のものだけ並列に確認)
+
+        進行中のシーズン (season 以降) は開幕前に空になるため確認せず、常に本取得する。
+
+        Returns:
+            {dataset: [提供なしの年度]}
+        """
+        specs = sorted(specs, key=lambda spec: spec.key)
+        years = [year for year in years if year < season]
+        now = time.time()
+        pending = []
+        for spec in specs:
+            for year in years:
+                entry = self.entries.get(availability_id(spec.key, year))
+                if entry and self.fresh(entry, now):
+                    self.stats['cached'] += 1
+                else:
+                    pending.append((spec, year))
+
+        if pending:
+            print(f"\n[Availability] probing {len(pending)} (dataset, year) combinations...")
+            with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as executor:
+                outcomes = list(executor.map(
+                    lambda item: self.probe(item[0], item[1], cache=cache), pending))
+            for (spec, year), available in zip(pending, outcomes):
+                if available is None:
+                    self.stats['unknown'] += 1
+                    continue
+                self.stats['probed'] += 1
+                if not available:
+                    reason = self.entries[availability_id(spec.key, year)]['reason']
+                    print(f"  ⊘ {spec.key} {year}: unavailable ({reason})")
+
+        unavailable = {}
+        for spec in specs:
+            for year in years:
+                entry = self.entries.get(availability_id(spec.key, year))
+                if entry and not entry['available']:
+                    unavailable.setdefault(spec.key, []).append(year)
+        return unavailable
+
+    def summary(self, unavailable):
+        """
+        実行サマリー用 (確認数と提供なしの一覧・理由)
+        """
+        return dict(self.stats, unavailable={
+            dataset: {str(year): self.entries[availability_id(dataset, year)]['reason']
+                      for year in years}
+            for dataset, years in unavailable.items()
+        })
@@ -2,215 +2,172 @@
 """
 Baseball Historical Data Import Script v2
 タイムアウト対策付き
+
+接続設定は環境変数 (PGHOST / PGUSER / PGPASSWORD ... または PG_SECRET_ID) から取得する。
+書き込み先は IMPORT_SINKS (postgres, s3) で選択し、シーズン単位で並列に書き込む。
+
+取得・書き込みに失敗したシーズンがある場合やデータを1件も取得できなかった場合は、
+終了コード 1 で終了する (cron / CI で失敗を検知できるように)。
 """
 
 import pybaseball as pyb
-import psycopg2
-import pandas as pd
-from datetime import datetime
-import time
-
-# RDS接続情報
-RDS_HOST = 'baseballcdkstack-baseballdatabase1cf3ef3f-tuii6lbo74pr.cxwioiws4x0q.ap-northeast-1.rds.amazonaws.com'
-RDS_DATABASE = 'postgres'
-RDS_USER = 'postgres'
-RDS_PASSWORD = 'to106kita9mA'
-RDS_PORT = 5432
+import os
+import sys
+
+import players
+from fetch_gateway import get_gateway
+from pg_loader import LOAD_MODES
+from pg_pool import PgConfig, PgPool
+from sinks import DEFAULT_FETCH_WORKERS, PostgresSink, S3ParquetSink, stream_seasons
+
+# ロードモード: partition (取得シーズンのパーティション差し替え) / upsert / full
+IMPORT_MODE = os.environ.get('IMPORT_MODE', 'partition')
+if IMPORT_MODE not in LOAD_MODES:
+    raise SystemExit(f"IMPORT_MODE must be one of {LOAD_MODES}: {IMPORT_MODE}")
+
+# 書き込み先 (カンマ区切り): postgres / s3 (s3 は S3_BUCKET が必要)
+IMPORT_SINKS = [s.strip() for s in os.environ.get('IMPORT_SINKS', 'postgres').split(',') if s.strip()]
+
+# 同時に取得するシーズン数 (1 なら1シーズンずつ取得)
+IMPORT_FETCH_WORKERS = int(os.environ.get('IMPORT_FETCH_WORKERS', DEFAULT_FETCH_WORKERS))
+
+COLUMN_MAPPING = {
+    'Name': 'player_name',
+    'Season': 'season',
+    'Team': 'team',
+    'Pos': 'position',
+    'G': 'games_played',
+    'AB': 'at_bats',
+    'R': 'runs',
+    'H': 'hits',
+    '2B': 'doubles',
+    '3B': 'triples',
+    'HR': 'home_runs',
+    'RBI': 'rbi',
+    'SB': 'stolen_bases',
+    'AVG': 'batting_avg',
+    'OBP': 'obp',
+    'SLG': 'slg',
+    'OPS': 'ops',
+}
+
+
+def fetch_season(year):
+    """
+    1シーズンを取得し、players_historical の列だけに絞って返す
+    (欠損の補完・型変換はシンク側の pg_loader.coerce_frame で行う)
+    """
+    # レート制限・リトライ・サーキットブレーカーは取得ゲートウェイに任せる
+    batting_data = get_gateway().call('fangraphs', pyb.batting_stats, year, qual=100)
+    if batting_data is None or len(batting_data) == 0:
+        return None
+
+    existing_cols = [k for k in COLUMN_MAPPING if k in batting_data.columns]
+    df = batting_data[existing_cols].rename(columns={k: COLUMN_MAPPING[k] for k in existing_cols})
+    df['season'] = year
+    # 選手ID (MLBAM) は IDfg → 名前の順で解決 (索引がなければ NULL)
+    df['player_id'] = (player_index.resolve(batting_data.get('IDfg'), batting_data['Name'], year).array
+                       if player_index is not None else None)
+    print(f"  Fetched {year} season data ✓ ({len(df)} players)")
+    return df
+
 
 print("=" * 60)
 print("Baseball Historical Data Import Script v2")
 print("=" * 60)
 
+pool = None
+player_index = None
+exit_code = 0
 try:
-    # RDSに接続
-    print("\n[1] Connecting to RDS PostgreSQL...")
-    conn = psycopg2.connect(
-        host=RDS_HOST,
-        database=RDS_DATABASE,
-        user=RDS_USER,
-        password=RDS_PASSWORD,
-        port=RDS_PORT,
-        sslmode='require'
-    )
-    cur = conn.cursor()
-    print("✓ Connected to RDS successfully")
-
-    # 既存テーブルをドロップ
-    print("\n[2] Preparing database schema...")
-    cur.execute("DROP TABLE IF EXISTS players_historical CASCADE")
-    
-    # テーブル作成
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS players_historical (
-            id SERIAL PRIMARY KEY,
-            player_name VARCHAR(100),
-            season INT,
-            team VARCHAR(50),
-            position VARCHAR(10),
-            games_played INT,
-            at_bats INT,
-            runs INT,
-            hits INT,
-            doubles INT,
-            triples INT,
-            home_runs INT,
-            rbi INT,
-            stolen_bases INT,
-            batting_avg DECIMAL(5,3),
-            obp DECIMAL(5,3),
-            slg DECIMAL(5,3),
-            ops DECIMAL(5,3),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    print("✓ Table created successfully")
-
-    # 2015-2025年のデータを年ごとに取得
-    print("\n[3] Fetching historical batting data from pybaseball...")
+    # 書き込み先を準備
+    print(f"\n[1] Preparing sinks ({', '.join(IMPORT_SINKS)})...")
+    sinks = []
+    if 'postgres' in IMPORT_SINKS:
+        config = PgConfig.from_env()
+        pool = PgPool(config)
+        pool.run(lambda conn: conn.cursor().execute("SELECT 1"))
+        sinks.append(PostgresSink(pool, mode=IMPORT_MODE))
+        print(f"✓ Connected to PostgreSQL {config.host} (pool size={pool.size})")
+    if 's3' in IMPORT_SINKS:
+        import boto3
+        sinks.append(S3ParquetSink(boto3.client('s3'), os.environ['S3_BUCKET']))
+        print(f"✓ S3 sink: s3://{os.environ['S3_BUCKET']}/")
+    if not sinks:
+        raise SystemExit(f"No valid sinks in IMPORT_SINKS: {IMPORT_SINKS}")
+
+    # 選手ID索引 (全シーズンで共有。/tmp に保存して次回以降は再取得しない)
+    player_index = players.get_index()
+    if player_index is not None:
+        print(f"✓ Player index: {len(player_index)} MLB players")
+    elif players.enabled():
+        # player_id が null のまま書き込むと、解決済みの ID を上書きしてしまう
+        raise RuntimeError("Player index unavailable; not writing to keep existing player_id values "
+                           "(PLAYER_IDS=off imports without IDs)")
+
+    # 2015-2025年のデータをシーズンごとに並列取得し、取得できたシーズンから順に書き込む
+    # (生の DataFrame は取得直後に必要な列だけに絞り、書き込み後に破棄する)
+    print(f"\n[2] Fetching seasons and writing to sinks "
+          f"(postgres mode={IMPORT_MODE}, {IMPORT_FETCH_WORKERS} fetch workers)...")
     print("(This may take several minutes...)\n")
 
-    all_data = []
     years = range(2015, 2018)
-    total_records = 0
-    failed_years = []
-
-    for year in years:
-        print(f"  Fetching {year} season data...", end='', flush=True)
-        try:
-            # タイムアウト対策: リトライロジック
-            max_retries = 2
-            for attempt in range(max_retries):
-                try:
-                    batting_data = pyb.batting_stats(year, qual=100)
-                    break
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        print(f"\n    Retry {attempt + 1}/{max_retries}...", end='', flush=True)
-                        time.sleep(2)
-                    else:
-                        raise
-            
-            if batting_data is not None and len(batting_data) > 0:
-                batting_data['Season'] = year
-                all_data.append(batting_data)
-                print(f" ✓ ({len(batting_data)} players)")
-                total_records += len(batting_data)
-            else:
-                print(" (No data)")
-        except Exception as e:
-            print(f" ✗ Failed: {str(e)[:50]}")
-            failed_years.append(year)
-
-    print(f"\n  Total records fetched: {total_records}")
-    if failed_years:
-        print(f"  ⚠ Failed years: {failed_years}")
-
-    # すべてのデータを結合
-    if all_data:
-        df_combined = pd.concat(all_data, ignore_index=True)
-        print(f"\n[4] Processing data ({len(df_combined)} total rows)...")
-
-        df_combined = df_combined.fillna(0)
-        df_combined['Season'] = df_combined['Season'].astype(int)
-
-        column_mapping = {
-            'Name': 'player_name',
-            'Season': 'season',
-            'Tm': 'team',
-            'Pos': 'position',
-            'G': 'games_played',
-            'AB': 'at_bats',
-            'R': 'runs',
-            'H': 'hits',
-            '2B': 'doubles',
-            '3B': 'triples',
-            'HR': 'home_runs',
-            'RBI': 'rbi',
-            'SB': 'stolen_bases',
-            'BA': 'batting_avg',
-            'OBP': 'obp',
-            'SLG': 'slg',
-            'OPS': 'ops',
-        }
-
-        existing_cols = [k for k in column_mapping.keys() if k in df_combined.columns]
-        df_processed = df_combined[existing_cols].rename(
-            columns={k: column_mapping[k] for k in existing_cols}
-        )
-
-        print(f"✓ Data processed: {len(df_processed)} rows")
-
-        # RDSに投入
-        print("\n[5] Inserting data into RDS...")
-        insert_count = 0
-
-        for index, row in df_processed.iterrows():
-            try:
-                cur.execute("""
-                    INSERT INTO players_historical 
-                    (player_name, season, team, position, games_played, at_bats, runs, 
-                     hits, doubles, triples, home_runs, rbi, stolen_bases, 
-                     batting_avg, obp, slg, ops)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    row.get('player_name', ''),
-                    int(row.get('season', 0)),
-                    row.get('team', ''),
-                    row.get('position', ''),
-                    int(row.get('games_played', 0)),
-                    int(row.get('at_bats', 0)),
-                    int(row.get('runs', 0)),
-                    int(row.get('hits', 0)),
-                    int(row.get('doubles', 0)),
-                    int(row.get('triples', 0)),
-                    int(row.get('home_runs', 0)),
-                    int(row.get('rbi', 0)),
-                    int(row.get('stolen_bases', 0)),
-                    float(row.get('batting_avg', 0)),
-                    float(row.get('obp', 0)),
-                    float(row.get('slg', 0)),
-                    float(row.get('ops', 0)),
-                ))
-                insert_count += 1
-                
-                if insert_count % 100 == 0:
-                    conn.commit()
-                    print(f"  Inserted {insert_count} records...", flush=True)
-            except Exception as e:
-                print(f"  ✗ Error row {index}: {e}")
-
-        conn.commit()
-        print(f"✓ Total inserted: {insert_count} records")
+    sink_summary, fetched = stream_seasons(sinks, years, fetch_season, fetch_workers=IMPORT_FETCH_WORKERS)
+
+    print(f"\n  Total records fetched: {fetched['rows']} ({fetched['seconds']:.2f}s)")
+    for source, stats in get_gateway().summary().items():
+        print(f"  {source}: {stats['calls']} calls, {stats['retries']} retries, "
+              f"{stats['throttled_seconds']}s throttled, circuit {stats['circuit']}")
+    if fetched['failed_seasons']:
+        print(f"  ⚠ Failed years: {fetched['failed_seasons']}")
+        exit_code = 1
+
+    if fetched['seasons']:
+        for name, totals in sink_summary.items():
+            print(f"✓ [{name}] {totals['rows']} records "
+                  f"{ {k: v for k, v in totals.items() if k != 'rows'} }")
+        failed_sinks = [name for name, totals in sink_summary.items() if totals['failed_seasons']]
+        if failed_sinks:
+            raise RuntimeError(f"Failed to write seasons to: {failed_sinks}")
 
         # 統計情報
-        print("\n[6] Data Summary:")
-        cur.execute("""
-            SELECT 
-                season, 
-                COUNT(*) as player_count,
-                ROUND(AVG(home_runs)::numeric, 2) as avg_hr,
-                MAX(home_runs) as max_hr
-            FROM players_historical
-            GROUP BY season
-            ORDER BY season DESC
-        """)
-        
-        results = cur.fetchall()
-        print("\n  Season | Players | Avg HR | Max HR")
-        print("  " + "-" * 40)
-        for row in results:
-            print(f"  {row[0]}   | {row[1]:7d} | {row[2]:6} | {row[3]:6}")
+        if pool is not None:
+            print("\n[3] Data Summary:")
+
+            def summarize(conn):
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT 
+                            season, 
+                            COUNT(*) as player_count,
+                            ROUND(AVG(home_runs)::numeric, 2) as avg_hr,
+                            MAX(home_runs) as max_hr
+                        FROM players_historical
+                        GROUP BY season
+                        ORDER BY season DESC
+                    """)
+                    return cur.fetchall()
+
+            results = pool.run(summarize)
+            print("\n  Season | Players | Avg HR | Max HR")
+            print("  " + "-" * 40)
+            for row in results:
+                print(f"  {row[0]}   | {row[1]:7d} | {row[2]:6} | {row[3]:6}")
 
         print("\n" + "=" * 60)
-        print("✓ Import completed successfully!")
+        print("✓ Import completed" + (" with failed years" if exit_code else " successfully!"))
         print("=" * 60)
 
     else:
         print("No data fetched")
-
-    cur.close()
-    conn.close()
+        exit_code = 1
 
 except Exception as e:
     print(f"✗ Error: {e}")
+    exit_code = 1
+
+finally:
+    if pool is not None:
+        pool.close()
+
+sys.exit(exit_code)
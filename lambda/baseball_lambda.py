@@ -3,430 +3,327 @@ import os
 # 最初に環境変数設定 (import前に実行!)
 os.environ['PYBASEBALL_CACHE'] = '/tmp/.pybaseball'
 
+import sys
+
 import boto3
-import pandas as pd
-from pybaseball import batting_stats, pitching_stats, team_batting, team_pitching, team_fielding
 from datetime import datetime
 import json
-import urllib3
+
+# pandas / pyarrow / pybaseball は各ステージ内で import する (plan / summarize では読み込まない)
+import metrics
+from fetch_gateway import get_gateway
+from incremental import current_season, plan_incremental
+from orchestrator import (RunConfig, aggregate, compact_outputs, derive_outputs, make_cache,
+                          plan_run, probe_availability, run_worker)
+from pipeline import run_pipeline
+
+# Slack通知は slack-notifier と共通のモジュール (イメージではタスクルートにコピーされる)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'slack-notifier'))
+import notifications
 
 s3_client = boto3.client('s3')
 
-def send_slack_notification(success=True, records=0, years="", failed_years=None, duration=0, error_msg="", s3_path=""):
+def send_slack_notification(success=True, records=0, years="", failed_years=None, duration=0, error_msg="", s3_path="",
+                            warnings=None, changes=None):
     """
-    Slack通知を送信
+    Slack通知を送信 (非同期。ハンドラーの最後に notifications.flush で完了を待つ)
+
+    1回の実行につき1メッセージ。派生テーブル・統合テーブルの失敗なども warnings として同じメッセージに載せる
     """
-    webhook_url = os.environ.get('SLACK_WEBHOOK_URL')
-    if not webhook_url:
-        print("⚠️  SLACK_WEBHOOK_URL not set, skipping notification")
-        return
+    if success:
+        # 成功時の通知
+        color = "warning" if failed_years or warnings else "good"
+        emoji = ":white_check_mark:"
+        title = f"{emoji} Baseball Data Export Completed"
+
+        fields = [
+            {"title": "Status", "value": "Success", "short": True},
+            {"title": "Records", "value": str(records), "short": True},
+            {"title": "Years", "value": years, "short": True},
+            {"title": "Duration", "value": f"{duration}s", "short": True},
+            {"title": "S3 Location", "value": s3_path, "short": False}
+        ]
+
+        if changes:
+            fields.insert(4, {
+                "title": "Changes",
+                "value": f"{changes['new']} new / {changes['updated']} updated / {changes['unchanged']} unchanged",
+                "short": False
+            })
+
+        if failed_years:
+            fields.append({
+                "title": "Failed Years",
+                "value": str(failed_years),
+                "short": False
+            })
+        if warnings:
+            fields.append({
+                "title": "Warnings",
+                "value": "\n".join(warnings)[:1000],
+                "short": False
+            })
+    else:
+        # エラー時の通知
+        color = "danger"
+        emoji = ":x:"
+        title = f"{emoji} Baseball Data Export Failed"
+
+        fields = [
+            {"title": "Status", "value": "Failed", "short": True},
+            {"title": "Duration", "value": f"{duration}s", "short": True},
+            {"title": "Error", "value": error_msg[:500], "short": False}
+        ]
+
+    slack_message = {
+        "attachments": [{
+            "color": color,
+            "title": title,
+            "fields": fields,
+            "footer": "Baseball Lambda (Data Lake)",
+            "ts": int(datetime.now().timestamp())
+        }]
+    }
 
     try:
-        http = urllib3.PoolManager()
-
-        if success:
-            # 成功時の通知
-            color = "good"
-            emoji = ":white_check_mark:"
-            title = f"{emoji} Baseball Data Export Completed"
-
-            fields = [
-                {"title": "Status", "value": "Success", "short": True},
-                {"title": "Records", "value": str(records), "short": True},
-                {"title": "Years", "value": years, "short": True},
-                {"title": "Duration", "value": f"{duration}s", "short": True},
-                {"title": "S3 Location", "value": s3_path, "short": False}
-            ]
-
-            if failed_years:
-                fields.append({
-                    "title": "Failed Years",
-                    "value": str(failed_years),
-                    "short": False
-                })
-        else:
-            # エラー時の通知
-            color = "danger"
-            emoji = ":x:"
-            title = f"{emoji} Baseball Data Export Failed"
-
-            fields = [
-                {"title": "Status", "value": "Failed", "short": True},
-                {"title": "Duration", "value": f"{duration}s", "short": True},
-                {"title": "Error", "value": error_msg[:500], "short": False}
-            ]
-
-        slack_message = {
-            "attachments": [{
-                "color": color,
-                "title": title,
-                "fields": fields,
-                "footer": "Baseball Lambda (Data Lake)",
-                "ts": int(datetime.now().timestamp())
-            }]
-        }
-
-        response = http.request(
-            'POST',
-            webhook_url,
-            body=json.dumps(slack_message),
-            headers={'Content-Type': 'application/json'}
-        )
-
-        if response.status == 200:
-            print("✓ Slack notification sent successfully")
-        else:
-            print(f"⚠️  Slack notification failed: {response.status}")
-
+        notifications.send(slack_message)
     except Exception as e:
         print(f"⚠️  Failed to send Slack notification: {str(e)}")
 
-def fetch_batting_data(s3_bucket, s3_prefix, start_year, end_year, skip_years):
-    """
-    打撃成績データを取得してS3に保存
-    """
-    print(f"\n[Batting Stats] Fetching data from {start_year} to {end_year}...")
-    total_records = 0
-    failed_years = []
-    exported_files = []
-
-    for year in range(start_year, end_year + 1):
-        if year in skip_years:
-            print(f"  ⊘ {year}: SKIPPED (pybaseball limitation)")
-            failed_years.append(year)
-            continue
-
-        try:
-            print(f"  Fetching {year} batting data...")
-            data = batting_stats(year, qual=100)
-
-            df_clean = data[['Name', 'G', 'AB', 'R', 'H', 'HR', 'RBI', 'SB', 'AVG']].copy()
-            df_clean.columns = ['name', 'games', 'at_bats', 'runs', 'hits', 'hr', 'rbi', 'sb', 'avg']
-            df_clean['season'] = year
-            df_clean['created_at'] = datetime.now()
-            df_clean = df_clean.dropna()
-
-            record_count = len(df_clean)
-            total_records += record_count
-
-            s3_key = f"{s3_prefix}/year={year}/batting_stats.parquet"
-            parquet_buffer = df_clean.to_parquet(index=False, engine='pyarrow')
-
-            s3_client.put_object(
-                Bucket=s3_bucket,
-                Key=s3_key,
-                Body=parquet_buffer
-            )
-
-            exported_files.append(s3_key)
-            print(f"  ✓ {year}: {record_count} players → s3://{s3_bucket}/{s3_key}")
-
-        except Exception as e:
-            print(f"  ✗ {year}: FAILED - {str(e)}")
-            failed_years.append(year)
-
-    return total_records, failed_years, exported_files
-
-def fetch_pitching_data(s3_bucket, s3_prefix, start_year, end_year, skip_years):
+def report(config, results, start_time, cache_stats=None, availability=None, compaction=None,
+           derived=None):
     """
-    投手成績データを取得してS3に保存
+    集計結果を出力し、メトリクス・Slack通知を送って Lambda のレスポンスを返す
+    (単体実行と fan-out の summarize で共通)
     """
-    print(f"\n[Pitching Stats] Fetching data from {start_year} to {end_year}...")
-    total_records = 0
-    failed_years = []
-    exported_files = []
-
-    for year in range(start_year, end_year + 1):
-        if year in skip_years:
-            print(f"  ⊘ {year}: SKIPPED (pybaseball limitation)")
-            failed_years.append(year)
-            continue
-
-        try:
-            print(f"  Fetching {year} pitching data...")
-            data = pitching_stats(year, qual=50)  # 50イニング以上
-
-            # 投手成績の主要カラムを抽出
-            df_clean = data[['Name', 'G', 'W', 'L', 'ERA', 'SO', 'IP', 'WHIP']].copy()
-            df_clean.columns = ['name', 'games', 'wins', 'losses', 'era', 'strikeouts', 'innings_pitched', 'whip']
-            df_clean['season'] = year
-            df_clean['created_at'] = datetime.now()
-            df_clean = df_clean.dropna()
-
-            record_count = len(df_clean)
-            total_records += record_count
-
-            s3_key = f"{s3_prefix}/year={year}/pitching_stats.parquet"
-            parquet_buffer = df_clean.to_parquet(index=False, engine='pyarrow')
-
-            s3_client.put_object(
-                Bucket=s3_bucket,
-                Key=s3_key,
-                Body=parquet_buffer
-            )
-
-            exported_files.append(s3_key)
-            print(f"  ✓ {year}: {record_count} pitchers → s3://{s3_bucket}/{s3_key}")
-
-        except Exception as e:
-            print(f"  ✗ {year}: FAILED - {str(e)}")
-            failed_years.append(year)
-
-    return total_records, failed_years, exported_files
-
-def fetch_team_batting_data(s3_bucket, s3_prefix, start_year, end_year, skip_years):
-    """
-    チーム打撃成績データを取得してS3に保存
-    """
-    print(f"\n[Team Batting Stats] Fetching data from {start_year} to {end_year}...")
-    total_records = 0
-    failed_years = []
-    exported_files = []
-
-    for year in range(start_year, end_year + 1):
-        if year in skip_years:
-            print(f"  ⊘ {year}: SKIPPED (pybaseball limitation)")
-            failed_years.append(year)
-            continue
-
-        try:
-            print(f"  Fetching {year} team batting data...")
-            data = team_batting(year, year)
-
-            # created_atカラムを追加
-            data['created_at'] = datetime.now()
-
-            record_count = len(data)
-            total_records += record_count
-
-            s3_key = f"{s3_prefix}/year={year}/team_batting.parquet"
-            parquet_buffer = data.to_parquet(index=False, engine='pyarrow')
-
-            s3_client.put_object(
-                Bucket=s3_bucket,
-                Key=s3_key,
-                Body=parquet_buffer
-            )
+    import time
 
-            exported_files.append(s3_key)
-            print(f"  ✓ {year}: {record_count} teams → s3://{s3_bucket}/{s3_key}")
+    specs = config.specs()
+    start_year, end_year = config.start_year, config.end_year
+    total_records = sum(r.records for r in results.values())
+    total_files = sum(len(r.files) for r in results.values())
+    up_to_date = sum(len(r.up_to_date_years) for r in results.values())
+    resumed = sum(len(r.resumed_years) for r in results.values())
+    all_failed = sorted({year for r in results.values() for year in r.failed_years})
+    skipped = {key: r.skipped_years for key, r in results.items() if r.skipped_years}
+    # 完了ユニットの変更状態 (unchanged は内容が同じため書き込んでいない)
+    changes = {change: sum(len(getattr(r, f"{change}_years")) for r in results.values())
+               for change in ('new', 'updated', 'unchanged')}
+
+    # 全年度失敗チェック
+    if not any(r.completed_years or r.up_to_date_years for r in results.values()):
+        raise ValueError("No data exported to S3! All years failed.")
+
+    print(f"\n[Summary] Export completed!")
+    for spec in specs:
+        print(f"    {spec.summary_name} records: {results[spec.key].records}")
+    print(f"    Total records: {total_records}")
+    print(f"    Files exported: {total_files}")
+    print(f"    Changes: {changes['new']} new, {changes['updated']} updated, "
+          f"{changes['unchanged']} unchanged (not rewritten)")
+    if config.mode == 'incremental':
+        print(f"    Up-to-date (skipped): {up_to_date}")
+    if resumed:
+        print(f"    Already done in run {config.run_id} (resumed): {resumed}")
+    if availability:
+        print(f"    Availability: {availability['cached']} cached, {availability['probed']} probed, "
+              f"{availability['unknown']} unknown")
+        for dataset, years in availability['unavailable'].items():
+            print(f"    Unavailable {dataset}: {', '.join(years)}")
+    if derived:
+        failed = [key for key, stats in derived.items() if 'error' in stats]
+        print(f"    Derived tables: {len(derived) - len(failed)} tables"
+              + (f", failed: {failed}" if failed else ""))
+    if compaction:
+        failed = [key for key, stats in compaction.items() if 'error' in stats]
+        print(f"    Compacted (all years): {len(compaction) - len(failed)} datasets"
+              + (f", failed: {failed}" if failed else ""))
+    if cache_stats:
+        print(f"    Cache: {cache_stats['local_hits']} local hits, {cache_stats['s3_hits']} S3 hits, "
+              f"{cache_stats['misses']} misses (hit rate {cache_stats['hit_rate']:.0%})")
+    # fan-out の summarize ではこのプロセスで取得していないので空になる
+    fetch_stats = get_gateway().summary()
+    for source, stats in fetch_stats.items():
+        print(f"    Fetch {source}: {stats['calls']} calls, {stats['retries']} retries, "
+              f"{stats['throttled_seconds']}s throttled, concurrency {stats['concurrency']}, "
+              f"circuit {stats['circuit']}")
+
+    # 実行単位のメトリクス (ユニット単位は pipeline が出力済み)
+    metrics.emit({
+        'RunTime': (round((time.time() - start_time) * 1000, 1), 'Milliseconds'),
+        'TotalRecords': (total_records, 'Count'),
+        'FilesExported': (total_files, 'Count'),
+        'NewUnits': (changes['new'], 'Count'),
+        'UpdatedUnits': (changes['updated'], 'Count'),
+        'UnchangedUnits': (changes['unchanged'], 'Count'),
+        'UpToDateUnits': (up_to_date, 'Count'),
+        'FailedUnits': (sum(len(r.failed_years) for r in results.values()), 'Count'),
+        'RunFailures': (0, 'Count'),
+    }, properties={'Mode': config.mode})
+
+    # 結果サマリー
+    s3_path = f"s3://{config.s3_bucket}/"
+    body = {'message': 'Success'}
+    body.update({f"{spec.key}_records": results[spec.key].records for spec in specs})
+    body.update({
+        'mode': config.mode,
+        'run_id': config.run_id,
+        'manifest': f"s3://{config.s3_bucket}/{config.manifest(s3_client).prefix}/manifest.json",
+        'total_records': total_records,
+        'files_exported': total_files,
+        'changes': changes,
+        'up_to_date_files': up_to_date,
+        'resumed_units': resumed,
+        's3_location': s3_path,
+        'years': f"{start_year}-{end_year}",
+        'failed_years': all_failed,
+        'skipped_years': skipped,
+        'availability': availability,
+        'derived': derived,
+        'compacted': compaction,
+        'cache': cache_stats,
+        'fetch': fetch_stats or None,
+        'athena_queries': {
+            spec.key: spec.athena_query(end_year) for spec in specs
+        }
+    })
+    result = {
+        'statusCode': 200,
+        'body': body
+    }
 
-        except Exception as e:
-            print(f"  ✗ {year}: FAILED - {str(e)}")
-            failed_years.append(year)
+    print("=" * 60)
+    print("✓ Export completed successfully!")
+    print(f"📊 Athena Queries:")
+    for spec in specs:
+        print(f"   {spec.summary_name}: SELECT * FROM baseball_stats.{spec.prefix}")
+    if all_failed:
+        print(f"⚠️  Note: {len(all_failed)} year(s) failed: {all_failed}")
+    print("=" * 60)
 
-    return total_records, failed_years, exported_files
+    # Slack通知送信 (実行全体で1メッセージ)
+    warnings = [f"Unavailable {dataset}: {', '.join(years)}"
+                for dataset, years in (availability or {}).get('unavailable', {}).items()]
+    for label, stats in (('Derived', derived), ('Compaction', compaction)):
+        warnings.extend(f"{label} {key} failed: {value['error'][:200]}"
+                        for key, value in (stats or {}).items() if 'error' in value)
+    duration = round(time.time() - start_time, 2)
+    send_slack_notification(
+        success=True,
+        records=total_records,
+        years=f"{start_year}-{end_year}",
+        failed_years=all_failed,
+        duration=duration,
+        s3_path=s3_path,
+        warnings=warnings,
+        changes=changes
+    )
+
+    return result
 
-def fetch_team_pitching_data(s3_bucket, s3_prefix, start_year, end_year, skip_years):
-    """
-    チーム投手成績データを取得してS3に保存
+def lambda_handler(event, context):
     """
-    print(f"\n[Team Pitching Stats] Fetching data from {start_year} to {end_year}...")
-    total_records = 0
-    failed_years = []
-    exported_files = []
-
-    for year in range(start_year, end_year + 1):
-        if year in skip_years:
-            print(f"  ⊘ {year}: SKIPPED (pybaseball limitation)")
-            failed_years.append(year)
-            continue
-
-        try:
-            print(f"  Fetching {year} team pitching data...")
-            data = team_pitching(year, year)
-
-            # created_atカラムを追加
-            data['created_at'] = datetime.now()
-
-            record_count = len(data)
-            total_records += record_count
-
-            s3_key = f"{s3_prefix}/year={year}/team_pitching.parquet"
-            parquet_buffer = data.to_parquet(index=False, engine='pyarrow')
-
-            s3_client.put_object(
-                Bucket=s3_bucket,
-                Key=s3_key,
-                Body=parquet_buffer
-            )
-
-            exported_files.append(s3_key)
-            print(f"  ✓ {year}: {record_count} teams → s3://{s3_bucket}/{s3_key}")
-
-        except Exception as e:
-            print(f"  ✗ {year}: FAILED - {str(e)}")
-            failed_years.append(year)
+    Lambda関数のエントリーポイント - S3 Data Lake版
 
-    return total_records, failed_years, exported_files
+    event.action:
+      - run (既定): 全ユニットをこの呼び出し内で並列実行
+      - plan / unit / summarize: Step Functions による fan-out 実行 (orchestrator 参照)
+      - ping: 何もせずに返す (コールドスタート計測用)
 
-def fetch_team_fielding_data(s3_bucket, s3_prefix, start_year, end_year, skip_years):
+    Slack通知はバックグラウンドで送り、返却前に残り時間の範囲で完了を待つ
     """
-    チーム守備成績データを取得してS3に保存
-    """
-    print(f"\n[Team Fielding Stats] Fetching data from {start_year} to {end_year}...")
-    total_records = 0
-    failed_years = []
-    exported_files = []
-
-    for year in range(start_year, end_year + 1):
-        if year in skip_years:
-            print(f"  ⊘ {year}: SKIPPED (pybaseball limitation)")
-            failed_years.append(year)
-            continue
-
-        try:
-            print(f"  Fetching {year} team fielding data...")
-            data = team_fielding(year, year)
-
-            # created_atカラムを追加
-            data['created_at'] = datetime.now()
-
-            record_count = len(data)
-            total_records += record_count
-
-            s3_key = f"{s3_prefix}/year={year}/team_fielding.parquet"
-            parquet_buffer = data.to_parquet(index=False, engine='pyarrow')
+    try:
+        return handle(event, context)
+    finally:
+        notifications.flush(notifications.budget(context))
 
-            s3_client.put_object(
-                Bucket=s3_bucket,
-                Key=s3_key,
-                Body=parquet_buffer
-            )
+def handle(event, context):
+    import time
+    start_time = time.time()
 
-            exported_files.append(s3_key)
-            print(f"  ✓ {year}: {record_count} teams → s3://{s3_bucket}/{s3_key}")
+    event = event or {}
+    action = event.get('action', 'run')
 
-        except Exception as e:
-            print(f"  ✗ {year}: FAILED - {str(e)}")
-            failed_years.append(year)
+    # コールドスタート計測用 (measure_cold_start.py)。初期化だけで何もしない
+    if action == 'ping':
+        return {'statusCode': 200, 'body': {'message': 'pong'}}
 
-    return total_records, failed_years, exported_files
+    # 取得統計はこの呼び出しの分だけ数える (制限・ブレーカーの状態は引き継ぐ)
+    get_gateway().reset_stats()
+    # fan-out のワーカーは Map の同時実行数 (processes) で取得元の制限を分け合う
+    get_gateway().set_processes(event.get('processes', 1) if action == 'unit' else 1)
 
-def lambda_handler(event, context):
-    """
-    Lambda関数のエントリーポイント - S3 Data Lake版
-    """
-    import time
-    start_time = time.time()
+    # fan-out: 計画とワーカーは結果を返すだけ (通知は summarize で1回)
+    if action == 'plan':
+        # Step Functions からは実行入力が request、実行名が execution に入る
+        config = RunConfig.from_event(event.get('request') or event, run_id=event.get('execution'))
+        return plan_run(config, s3_client)
+    if action == 'unit':
+        return run_worker(event['unit'], RunConfig.from_dict(event['config']), s3_client)
 
     print("=" * 60)
     print("Baseball Historical Data Export to S3 Data Lake")
     print("=" * 60)
 
-    # 環境変数取得
-    s3_bucket = os.environ['S3_BUCKET']
-
-    # 取得する年度範囲
-    start_year = int(os.environ.get('START_YEAR', 2015))
-    end_year = int(os.environ.get('END_YEAR', 2025))
-    skip_years = [2022]  # pybaseballで取得できない年度
-
+    mode = event.get('mode', os.environ.get('EXPORT_MODE', 'full'))
     try:
-        print(f"Fetching data from {start_year} to {end_year}...")
-        print(f"S3 Destination: s3://{s3_bucket}/")
-
-        # 打撃成績データ取得
-        batting_records, batting_failed, batting_files = fetch_batting_data(
-            s3_bucket, 'batting_stats', start_year, end_year, skip_years
-        )
-
-        # 投手成績データ取得
-        pitching_records, pitching_failed, pitching_files = fetch_pitching_data(
-            s3_bucket, 'pitching_stats', start_year, end_year, skip_years
-        )
-
-        # チーム打撃成績データ取得
-        team_batting_records, team_batting_failed, team_batting_files = fetch_team_batting_data(
-            s3_bucket, 'team_batting_stats', start_year, end_year, skip_years
-        )
-
-        # チーム投手成績データ取得
-        team_pitching_records, team_pitching_failed, team_pitching_files = fetch_team_pitching_data(
-            s3_bucket, 'team_pitching_stats', start_year, end_year, skip_years
-        )
-
-        # チーム守備成績データ取得
-        team_fielding_records, team_fielding_failed, team_fielding_files = fetch_team_fielding_data(
-            s3_bucket, 'team_fielding_stats', start_year, end_year, skip_years
-        )
-
-        total_records = (batting_records + pitching_records + team_batting_records +
-                        team_pitching_records + team_fielding_records)
-        total_files = (len(batting_files) + len(pitching_files) + len(team_batting_files) +
-                      len(team_pitching_files) + len(team_fielding_files))
-        all_failed = list(set(batting_failed + pitching_failed + team_batting_failed +
-                             team_pitching_failed + team_fielding_failed))
-
-        # 全年度失敗チェック
-        if total_records == 0:
-            raise ValueError("No data exported to S3! All years failed.")
-
-        print(f"\n[Summary] Export completed!")
-        print(f"    Player Batting records: {batting_records}")
-        print(f"    Player Pitching records: {pitching_records}")
-        print(f"    Team Batting records: {team_batting_records}")
-        print(f"    Team Pitching records: {team_pitching_records}")
-        print(f"    Team Fielding records: {team_fielding_records}")
-        print(f"    Total records: {total_records}")
-        print(f"    Files exported: {total_files}")
-
-        # 結果サマリー
-        s3_path = f"s3://{s3_bucket}/"
-        result = {
-            'statusCode': 200,
-            'body': {
-                'message': 'Success',
-                'batting_records': batting_records,
-                'pitching_records': pitching_records,
-                'team_batting_records': team_batting_records,
-                'team_pitching_records': team_pitching_records,
-                'team_fielding_records': team_fielding_records,
-                'total_records': total_records,
-                'files_exported': total_files,
-                's3_location': s3_path,
-                'years': f"{start_year}-{end_year}",
-                'failed_years': all_failed,
-                'athena_queries': {
-                    'batting': f"SELECT * FROM baseball_stats.batting_stats WHERE year = {end_year} LIMIT 10;",
-                    'pitching': f"SELECT * FROM baseball_stats.pitching_stats WHERE year = {end_year} LIMIT 10;",
-                    'team_batting': f"SELECT * FROM baseball_stats.team_batting_stats WHERE year = {end_year};",
-                    'team_pitching': f"SELECT * FROM baseball_stats.team_pitching_stats WHERE year = {end_year};",
-                    'team_fielding': f"SELECT * FROM baseball_stats.team_fielding_stats WHERE year = {end_year};"
-                }
-            }
-        }
-
-        print("=" * 60)
-        print("✓ Export completed successfully!")
-        print(f"📊 Athena Queries:")
-        print(f"   Player Batting: SELECT * FROM baseball_stats.batting_stats")
-        print(f"   Player Pitching: SELECT * FROM baseball_stats.pitching_stats")
-        print(f"   Team Batting: SELECT * FROM baseball_stats.team_batting_stats")
-        print(f"   Team Pitching: SELECT * FROM baseball_stats.team_pitching_stats")
-        print(f"   Team Fielding: SELECT * FROM baseball_stats.team_fielding_stats")
-        if all_failed:
-            print(f"⚠️  Note: {len(all_failed)} year(s) failed: {all_failed}")
-        print("=" * 60)
-
-        # Slack通知送信
-        duration = round(time.time() - start_time, 2)
-        send_slack_notification(
-            success=True,
-            records=total_records,
-            years=f"{start_year}-{end_year}",
-            failed_years=all_failed,
-            duration=duration,
-            s3_path=s3_path
-        )
-
-        return result
+        if action == 'summarize':
+            config = RunConfig.from_dict(event['config'])
+            mode = config.mode
+            start_time = event.get('started_at', start_time)
+            manifest = config.manifest(s3_client).load()
+            results, cache_stats = aggregate(config, event.get('results', []),
+                                             event.get('up_to_date', []), manifest)
+            manifest.finalize()
+            derived = derive_outputs(config, s3_client, results)
+            compaction = compact_outputs(config, s3_client, results)
+            return report(config, results, start_time, cache_stats, event.get('availability'), compaction,
+                          derived)
+
+        # 実行モード: full (全年度再取得) / incremental (当年度・欠損・無効化年度のみ)
+        # run_id: 非同期呼び出しのリトライでは同じリクエストIDになるので、完了済みユニットから再開する
+        config = RunConfig.from_event(event, run_id=getattr(context, 'aws_request_id', None))
+        specs = config.specs()
+        print(f"Fetching data from {config.start_year} to {config.end_year} "
+              f"(mode={mode}, run={config.run_id})...")
+        print(f"S3 Destination: s3://{config.s3_bucket}/")
+
+        season = current_season(config.end_year)
+        plan = None
+        if mode == 'incremental':
+            plan = plan_incremental(s3_client, config.s3_bucket, specs, config.years(), season,
+                                    config.invalidate_years)
+
+        # pybaseballレスポンスキャッシュ (/tmp + S3)
+        cache = make_cache(s3_client, config)
+
+        # 取得元の提供状況を確認 (提供なしの (source, year) はスキップ)
+        availability = probe_availability(config, s3_client, cache)
+
+        # 全データセット × 全年度を並列取得 (ユニットごとにマニフェストへ記録)
+        manifest = config.manifest(s3_client).load()
+        results = run_pipeline(s3_client, config.s3_bucket, config.start_year, config.end_year,
+                               config.skip_years, specs=specs, plan=plan, cache=cache,
+                               refresh_years=set(config.invalidate_years), manifest=manifest,
+                               unavailable=config.unavailable, created_at=config.created_time())
+        manifest.finalize()
+
+        # 派生指標テーブルを計算し、全年度をまとめたテーブル (<prefix>_all) を作り直す
+        derived = derive_outputs(config, s3_client, results)
+        compaction = compact_outputs(config, s3_client, results)
+        return report(config, results, start_time, cache.summary() if cache else None, availability,
+                      compaction, derived)
 
     except Exception as e:
         print(f"ERROR: {str(e)}")
         import traceback
         traceback.print_exc()
 
+        metrics.emit({
+            'RunTime': (round((time.time() - start_time) * 1000, 1), 'Milliseconds'),
+            'RunFailures': (1, 'Count'),
+        }, properties={'Mode': mode, 'Error': str(e)[:200]})
+
         # エラー時のSlack通知
         duration = round(time.time() - start_time, 2)
         send_slack_notification(
@@ -0,0 +1,133 @@
+"""
+内容ハッシュによる変更検出
+
+変換後の Arrow テーブルから実行メタデータの列 (created_at) を除いた内容をハッシュし、
+既存オブジェクトのメタデータ (data-sha256) と比較する。同じなら書き込まない
+(PUT が減り、ETag も変わらないので ETag をキーにした下流のキャッシュが無効にならない)。
+
+  new:       オブジェクトがない
+  updated:   ハッシュが異なる (旧形式でハッシュがない場合を含む)
+  unchanged: ハッシュが同じ (書き込まない)
+
+ファイルのバイト列のハッシュ (content-sha256) は created_at を含むため、毎回変わる。
+CHANGE_DETECTION=off で内容が同じでも常に書き込む。
+"""
+
+import hashlib
+import os
+from datetime import datetime
+
+from incremental import FETCHED_AT_METADATA_KEY, SCHEMA_METADATA_KEY, season_final_at
+
+CHANGE_NEW = 'new'
+CHANGE_UPDATED = 'updated'
+CHANGE_UNCHANGED = 'unchanged'
+CHANGES = (CHANGE_NEW, CHANGE_UPDATED, CHANGE_UNCHANGED)
+
+DATA_HASH_METADATA_KEY = 'data-sha256'
+
+# 実行ごとに変わるためハッシュに含めない列
+RUN_METADATA_COLUMNS = ('created_at',)
+
+
+def enabled():
+    return os.environ.get('CHANGE_DETECTION', 'on') != 'off'
+
+
+class _HashWriter:
+    """Arrow IPC の出力をメモリに溜めずにハッシュへ流す"""
+
+    def __init__(self, digest):
+        self.digest = digest
+        self.closed = False
+
+    def write(self, data):
+        self.digest.update(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _canonical_nulls(table):
+    """
+    null の位置の値バッファを 0 に揃える
+
+    IPC は null の位置の値 (未定義) もそのまま出力するため、nullable な整数列 (player_id など) は
+    内容が同じでも変換のたびにハッシュが変わる。値を 0 で埋め、null の位置は別の列で表す。
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    for index, field in reversed(list(enumerate(table.schema))):
+        column = table.column(index)
+        numeric = pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+        if not numeric or column.null_count == 0:
+            continue
+        table = table.set_column(index, field.name, pc.fill_null(column, 0))
+        table = table.add_column(index + 1, f"{field.name}.is_null", pc.is_null(column))
+    return table
+
+
+def data_digest(table, schema_version=None):
+    """
+    実行メタデータを除いたテーブル内容の sha256 (スキーマ・列順・値が同じなら同じ値)
+
+    チャンク分割やスキーマのメタデータ (pandas 情報) の違いは無視する。
+    """
+    import pyarrow as pa
+
+    columns = [name for name in table.column_names if name not in RUN_METADATA_COLUMNS]
+    payload = _canonical_nulls(table.select(columns).replace_schema_metadata(None).combine_chunks())
+    digest = hashlib.sha256((schema_version or '').encode('utf-8'))
+    sink = pa.PythonFile(_HashWriter(digest), mode='w')
+    with pa.ipc.new_stream(sink, payload.schema) as writer:
+        writer.write_table(payload)
+    return digest.hexdigest()
+
+
+def change_status(head, digest):
+    """
+    既存オブジェクト (head_object の結果、なければ None) と内容ハッシュを比較
+    """
+    if head is None:
+        return CHANGE_NEW
+    if head.get('Metadata', {}).get(DATA_HASH_METADATA_KEY) == digest:
+        return CHANGE_UNCHANGED
+    return CHANGE_UPDATED
+
+
+def needs_metadata_refresh(head, year, fetched_at, schema_version=None):
+    """
+    内容は同じだが、メタデータのままではインクリメンタル判定で毎回再取得になる場合 True
+    (シーズン確定前に取得した扱いのまま・スキーマの指紋が古い)
+    """
+    metadata = head.get('Metadata', {})
+    if schema_version and metadata.get(SCHEMA_METADATA_KEY) != schema_version:
+        return True
+    if year is None:
+        return False
+    final_at = season_final_at(year)
+    if fetched_at < final_at:
+        return False
+    try:
+        return datetime.fromisoformat(metadata.get(FETCHED_AT_METADATA_KEY) or '') < final_at
+    except ValueError:
+        return True
+
+
+def unit_change(changes):
+    """
+    ユニット内の全ファイルの変更状態 → ユニットの変更状態
+
+    全ファイルが unchanged (または書き込みなし) なら unchanged、全ファイルが new なら new、それ以外は updated
+    """
+    changes = set(changes)
+    if not changes or changes == {CHANGE_UNCHANGED}:
+        return CHANGE_UNCHANGED
+    if changes == {CHANGE_NEW}:
+        return CHANGE_NEW
+    return CHANGE_UPDATED
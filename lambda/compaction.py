@@ -0,0 +1,168 @@
+"""
+全年度をまとめたコンパクション済みデータセット
+
+エクスポート後に、データセットごとの year=YYYY/ 配下のファイルを1ファイルにまとめ、
+<prefix>_all/<prefix>_all.parquet に書き出す (Glue テーブル <prefix>_all)。
+「2015〜2025年の通算本塁打」のような年度をまたぐクエリが、年度ごとの小さなファイルを
+開かずに1ファイルで済む。
+
+  - sort_columns ((season, name) など) の順に並べ、シーズンごとに行グループを分ける
+    (season の min/max 統計で範囲外の行グループを読み飛ばせる)
+  - ページインデックスで行グループ内の name / team の範囲も絞り込める
+  - lookup_columns にはブルームフィルタを付ける (pyarrow 26 以降。古い pyarrow では
+    並び順とブルームフィルタのないファイルになるため、書き出さずにエラーにする)
+
+行数の多いデータセット (compact=False の Statcast) は対象外。
+"""
+
+import inspect
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from datasets import COMPACT_SUFFIX
+from incremental import HASH_METADATA_KEY, object_metadata
+from parquet_writer import StreamingParquetWriter
+
+DEFAULT_ROW_GROUP_ROWS = 10_000
+BLOOM_FILTER_FPP = 0.05
+
+
+class CompactionUnsupportedError(RuntimeError):
+    """pyarrow が並び順・ブルームフィルタの書き込みに対応していない"""
+
+
+def bloom_filters_supported():
+    import pyarrow.parquet as pq
+    return 'bloom_filter_options' in inspect.signature(pq.ParquetWriter.__init__).parameters
+
+
+def list_year_files(s3_client, s3_bucket, spec):
+    """
+    year= 配下の既存ファイル (今回の実行で書いていない年度も含む)
+    """
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=s3_bucket, Prefix=f"{spec.prefix}/year="):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.parquet'))
+    return sorted(keys)
+
+
+def read_frame(s3_client, s3_bucket, s3_key):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    body = s3_client.get_object(Bucket=s3_bucket, Key=s3_key)['Body'].read()
+    table = pq.read_table(io.BytesIO(body))
+    # 辞書はファイルごとに異なるので、結合・並べ替えの前に通常の文字列に戻す
+    columns = [c.cast(c.type.value_type) if pa.types.is_dictionary(c.type) else c
+               for c in table.columns]
+    return pa.Table.from_arrays(columns, names=table.column_names).to_pandas()
+
+
+def writer_options(spec, table, largest_group):
+    """
+    並び順・ページインデックス・ブルームフィルタの ParquetWriter オプション
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if not (hasattr(pq, 'SortingColumn') and bloom_filters_supported()):
+        raise CompactionUnsupportedError(
+            f"pyarrow {pa.__version__} cannot write sorting columns and bloom filters "
+            f"(requirements.txt pins the version that can)")
+    return {
+        'write_page_index': True,
+        'sorting_columns': [pq.SortingColumn(table.schema.get_field_index(c)) for c in spec.sort_columns],
+        'bloom_filter_options': {
+            c: {'ndv': max(1, largest_group), 'fpp': BLOOM_FILTER_FPP} for c in spec.lookup_columns
+        },
+    }
+
+
+def compact_dataset(spec, s3_client, s3_bucket, row_group_rows=None):
+    """
+    1データセットの全年度ファイルを並べ替えて1ファイルに書き出す
+
+    Returns:
+        {'key', 'source_files', 'rows', 'row_groups', 'bytes', 'seconds'}
+        (元ファイルがなければ None)
+
+    Raises:
+        CompactionUnsupportedError: pyarrow が並び順・ブルームフィルタに対応していない
+    """
+    import pandas as pd
+    import pyarrow.compute as pc
+
+    start = time.time()
+    keys = list_year_files(s3_client, s3_bucket, spec)
+    if not keys:
+        return None
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        frames = list(executor.map(lambda key: read_frame(s3_client, s3_bucket, key), keys))
+    df = pd.concat(frames, ignore_index=True)
+    del frames
+    # カラムを追加する前に書いた年度のファイルにはそのカラムがない (全年度にない場合は null で補う。
+    # 一部の年度だけにない場合は concat が null で補う)
+    for name in spec.arrow_schema().names:
+        if name not in df.columns:
+            df[name] = None
+    df = df.sort_values(list(spec.sort_columns), kind='stable', ignore_index=True)
+    table = spec.conform(df)
+    del df
+
+    # 並べ替え済みなので value_counts はシーズン順 (出現順) に並ぶ
+    groups = [item['counts'].as_py() for item in pc.value_counts(table.column(spec.sort_columns[0]))]
+    options = writer_options(spec, table, max(groups))
+    with StreamingParquetWriter(
+        s3_client, s3_bucket, spec.compact_key(),
+        schema=table.schema,
+        row_group_rows=row_group_rows or int(os.environ.get('COMPACT_ROW_GROUP_ROWS', DEFAULT_ROW_GROUP_ROWS)),
+        metadata=object_metadata(datetime.now(), spec.schema_version()),
+        hash_metadata_key=HASH_METADATA_KEY,
+        writer_options=options,
+    ) as writer:
+        offset = 0
+        for count in groups:
+            writer.write_table(table.slice(offset, count))
+            offset += count
+
+    return {
+        'key': spec.compact_key(),
+        'source_files': len(keys),
+        'rows': writer.stats['rows'],
+        'row_groups': writer.stats['row_groups'],
+        'bytes': writer.stats['bytes'],
+        'seconds': round(time.time() - start, 2),
+    }
+
+
+def compact_datasets(specs, s3_client, s3_bucket):
+    """
+    複数データセットを並列にコンパクション (失敗しても他のデータセットは続ける)
+
+    Returns:
+        {spec.key: stats or {'error': ...}}
+    """
+    specs = [spec for spec in specs if spec.compact]
+    if not specs:
+        return {}
+    print(f"\n[Compaction] {len(specs)} datasets (all years → <prefix>{COMPACT_SUFFIX}/)")
+
+    def run(spec):
+        try:
+            stats = compact_dataset(spec, s3_client, s3_bucket)
+        except Exception as e:
+            print(f"  ✗ [{spec.label}] compaction FAILED - {e}")
+            return {'error': str(e)}
+        if stats:
+            print(f"  ✓ [{spec.label}] {stats['source_files']} files → s3://{s3_bucket}/{stats['key']} "
+                  f"({stats['rows']} rows, {stats['row_groups']} row groups, {stats['seconds']:.1f}s)")
+        return stats
+
+    with ThreadPoolExecutor(max_workers=len(specs)) as executor:
+        results = list(executor.map(run, specs))
+    return {spec.key: stats for spec, stats in zip(specs, results) if stats}
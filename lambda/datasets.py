@@ -0,0 +1,696 @@
+"""
+データセット定義レジストリ
+
+1データセット = 1エントリ。pybaseballの呼び出し、カラム射影/リネーム、
+S3プレフィックス、Glueカラム定義をここに集約する。
+
+カラムの型は Glue と Parquet (Arrow) で共通。書き込み前に conform() で宣言どおりの
+Arrowスキーマに変換し、収まらない値や欠落カラム (上流のスキーマ変更) は SchemaDriftError にする。
+
+Glueテーブル定義 (lib/glue-tables.json) もこのレジストリから生成する:
+    python lambda/datasets.py > lib/glue-tables.json
+    python lambda/datasets.py --check lib/glue-tables.json   # 差分チェック
+"""
+
+import hashlib
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+
+# Glue型 → Arrow型 (pyarrowは使用時にimport)
+# 文字列は辞書型 (チーム名・選手名など繰り返しが多いため、メモリ上もParquet上も小さくなる)
+ARROW_TYPES = {
+    'string': lambda pa: pa.dictionary(pa.int32(), pa.string()),
+    'tinyint': lambda pa: pa.int8(),
+    'smallint': lambda pa: pa.int16(),
+    'int': lambda pa: pa.int32(),
+    'bigint': lambda pa: pa.int64(),
+    'float': lambda pa: pa.float32(),
+    'double': lambda pa: pa.float64(),
+    'date': lambda pa: pa.date32(),
+    'timestamp': lambda pa: pa.timestamp('us'),
+}
+# ARROW_TYPES の対応を変えたら上げる (schema_version() が変わり、インクリメンタルで書き直される)
+ARROW_TYPES_VERSION = 1
+
+
+class SchemaDriftError(ValueError):
+    """取得データが宣言したスキーマに収まらない (上流のカラム追加・削除・型変更)"""
+
+
+@dataclass(frozen=True)
+class Column:
+    """出力カラム定義 (source: pybaseball側のカラム名)"""
+    source: str
+    name: str
+    glue_type: str
+    comment: str
+
+
+# 全データセット共通の実行メタデータカラム
+CREATED_AT = Column('created_at', 'created_at', 'timestamp', 'Record creation timestamp')
+
+# 全年度をまとめたコンパクション済みテーブルの接尾辞 (<prefix>_all)
+COMPACT_SUFFIX = '_all'
+
+# パーティションキー
+YEAR_PARTITION = Column('year', 'year', 'int', 'Season year')
+MONTH_PARTITION = Column('month', 'month', 'int', 'Game month')
+
+# 選手ID (players テーブルの player_id。Statcast の batter / pitcher と同じ MLBAM ID)
+PLAYER_ID = Column('player_id', 'player_id', 'int', 'Player ID (MLBAM, see players table)')
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """
+    1データセットの宣言的定義
+    """
+    key: str                    # 結果キー (lambda_handler の `<key>_records`)
+    label: str                  # ログ表示名
+    prefix: str                 # S3プレフィックス = Glueテーブル名
+    filename: str               # year=YYYY/ 配下のファイル名
+    fetch_func: str             # pybaseballの関数名
+    columns: Tuple[Column, ...]
+    description: str
+    construct_id: str           # CDKのCfnTable ID
+    unit_name: str = 'records'
+    source: str = 'fangraphs'
+    fetch_kwargs: Dict = field(default_factory=dict)
+    season_range: bool = False  # True: func(year, year) / False: func(year, **kwargs)
+    project: bool = True        # False: 取得結果の全カラムを保持 (Glueは宣言カラムのみ参照)
+    dropna: bool = True
+    summary_label: Optional[str] = None
+    query_limit: Optional[int] = 10  # Athenaクエリ例のLIMIT
+    partition_keys: Tuple[Column, ...] = (YEAR_PARTITION,)
+    enabled_by_default: bool = True  # False: event/EXPORT_DATASETS で明示指定した時のみ実行
+    compact: bool = True        # 全年度を1ファイルにまとめたテーブル (<prefix>_all) を作る
+    sort_columns: Tuple[str, ...] = ('season', 'name')  # コンパクション時の並び順
+    lookup_columns: Tuple[str, ...] = ('name',)         # ブルームフィルタを付けるカラム
+    player_id_source: Optional[str] = None  # player_id (MLBAM ID) を解決する取得結果のカラム (FanGraphs ID)
+
+    # True: 年度内の進捗を自前で管理する (インクリメンタル判定で常に実行対象)
+    manages_own_state = False
+
+    @property
+    def summary_name(self):
+        return self.summary_label or self.label.replace(' Stats', '')
+
+    def athena_query(self, year):
+        query = f"SELECT * FROM baseball_stats.{self.prefix} WHERE year = {year}"
+        return query + (f" LIMIT {self.query_limit};" if self.query_limit else ";")
+
+    def fetch_args(self, year):
+        """
+        pybaseball関数に渡す (args, kwargs)
+        """
+        if self.season_range:
+            return (year, year), dict(self.fetch_kwargs)
+        return (year,), dict(self.fetch_kwargs)
+
+    def fetch(self, year, cache=None, refresh=False):
+        """
+        pybaseballから1年度分を取得 (importは初回呼び出し時)
+
+        上流への呼び出しは取得ゲートウェイ (レート制限・リトライ) を通す。
+        cache (ResponseCache) を渡すとレスポンスキャッシュ経由で取得する。
+        """
+        args, kwargs = self.fetch_args(year)
+
+        def call():
+            import pybaseball
+            from fetch_gateway import get_gateway
+            return get_gateway().call(self.source, getattr(pybaseball, self.fetch_func),
+                                      *args, **kwargs)
+
+        if cache is None:
+            return call()
+        return cache.get_or_fetch(self.fetch_func, args, kwargs, year, call, refresh=refresh)
+
+    def transform(self, data, year, created_at, players=None):
+        """
+        カラム射影/リネーム + season/created_at付与
+
+        player_id_source があれば players (players.PlayerIndex / PreviousIds) で player_id を付与する
+        (players が None なら null)。
+        """
+        if self.project:
+            df = data[[c.source for c in self.columns]].copy()
+            df.columns = [c.name for c in self.columns]
+            df['season'] = year
+        else:
+            # 取得結果 (レスポンスキャッシュと共有する場合がある) は変更しない
+            df = data.copy()
+        df['created_at'] = created_at
+        if self.dropna:
+            df = df.dropna()
+        if self.player_id_source:
+            # ID のカラムがない取得結果は名前だけで解決する
+            source_ids = (data[self.player_id_source].loc[df.index]
+                          if self.player_id_source in data.columns else None)
+            df['player_id'] = (players.resolve(source_ids, df['name'], year).array
+                               if players is not None else None)
+        return df
+
+    def s3_key(self, year):
+        return f"{self.prefix}/year={year}/{self.filename}"
+
+    @property
+    def compact_prefix(self):
+        return f"{self.prefix}{COMPACT_SUFFIX}"
+
+    def compact_key(self):
+        return f"{self.compact_prefix}/{self.compact_prefix}.parquet"
+
+    def table_key(self):
+        """パーティションのないテーブルのファイル"""
+        return f"{self.prefix}/{self.filename}"
+
+    def glue_columns(self):
+        """
+        Glue storageDescriptor.columns 相当のリスト
+        """
+        columns = [{'name': c.name, 'type': c.glue_type, 'comment': c.comment} for c in self.columns]
+        if self.project:
+            columns.insert(1, {'name': 'season', 'type': 'smallint', 'comment': 'Season year'})
+        if self.player_id_source:
+            columns.insert(2, {'name': 'player_id', 'type': 'int', 'comment': PLAYER_ID.comment})
+        columns.append({'name': CREATED_AT.name, 'type': CREATED_AT.glue_type, 'comment': CREATED_AT.comment})
+        return columns
+
+
+    def arrow_schema(self):
+        """
+        Glueカラム定義と一致するArrowスキーマ
+
+        project=False のデータセットは宣言したカラムのみ (宣言外のカラムは conform() で推論)。
+        """
+        import pyarrow as pa
+        return pa.schema([(c['name'], ARROW_TYPES[c['type']](pa)) for c in self.glue_columns()])
+
+    def schema_version(self):
+        """
+        スキーマの指紋 (S3オブジェクトのメタデータに記録し、変更時はインクリメンタルで書き直す)
+
+        Glueカラム定義から計算する (plan でも使うため pyarrow を読み込まない)。
+        """
+        lines = [f"arrow-types={ARROW_TYPES_VERSION}"]
+        lines.extend(f"{c['name']}: {c['type']}" for c in self.glue_columns())
+        return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()[:16]
+
+    def conform(self, df):
+        """
+        DataFrameを宣言したArrowスキーマのテーブルに変換 (スキーマ強制)
+
+        宣言カラムの欠落・型に収まらない値 (小数→整数の切り捨て、桁あふれ、数値でない文字列) は
+        SchemaDriftError にして、Glueと食い違うファイルを書かない。
+        """
+        import pyarrow as pa
+
+        schema = self.arrow_schema()
+        missing = [f.name for f in schema if f.name not in df.columns]
+        if missing:
+            raise SchemaDriftError(f"{self.key}: missing columns {missing}")
+
+        if self.project:
+            names = schema.names
+        else:
+            declared = set(schema.names)
+            names = schema.names + [c for c in df.columns if c not in declared]
+
+        fields, arrays, errors = [], [], []
+        for name in names:
+            series = df[name]
+            target = schema.field(name).type if name in schema.names else None
+            try:
+                array = pa.array(series, type=target, from_pandas=True, safe=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                errors.append(f"{name} ({series.dtype} -> {target}): {e}")
+                continue
+            fields.append(pa.field(name, array.type))
+            arrays.append(array)
+        if errors:
+            raise SchemaDriftError(f"{self.key}: " + '; '.join(errors))
+        return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+    def glue_partition_keys(self):
+        return [{'name': c.name, 'type': c.glue_type, 'comment': c.comment} for c in self.partition_keys]
+
+    def partition_projection(self):
+        """
+        Athena のパーティション射影 (projection.*) のテーブルパラメータ
+
+        year の範囲 (projection.year.range) とバケットを含む保存先 (storage.location.template の前半) は
+        CDK スタックが設定値から補う。ここでは <prefix>/ 以下のテンプレートだけを返す。
+        """
+        if not self.partition_keys:
+            return {}
+        params = {'projection.enabled': 'true'}
+        for column in self.partition_keys:
+            params[f"projection.{column.name}.type"] = 'integer'
+            params.update({f"projection.{column.name}.{key}": value
+                           for key, value in self.partition_ranges().get(column.name, {}).items()})
+        params['storage.location.template'] = '/'.join(
+            f"{c.name}=${{{c.name}}}" for c in self.partition_keys) + '/'
+        return params
+
+    def partition_ranges(self):
+        """year 以外のパーティションキーの射影範囲 {name: {'range', 'digits'}}"""
+        return {}
+
+
+@dataclass(frozen=True)
+class StatcastSpec(DatasetSpec):
+    """
+    投球単位 (Statcast) データセット
+
+    1シーズンを月内に収まる日付ウィンドウに分割して並列取得し、
+    statcast/year=YYYY/month=MM/ 配下にウィンドウごとのファイルとして保存する。
+    完了したウィンドウは _state/ に記録し、再実行時はスキップする (statcast.py)。
+    """
+    compact: bool = False       # 行数が多いため全年度の1ファイル化はしない
+    window_days: int = 7
+    season_start: Tuple[int, int] = (3, 1)    # (月, 日)
+    season_end: Tuple[int, int] = (11, 30)
+    row_group_rows: int = 50_000
+    sort_by: Tuple[str, ...] = ('game_date', 'game_pk', 'at_bat_number', 'pitch_number')
+
+    manages_own_state = True
+
+    def s3_key(self, year):
+        return f"{self.prefix}/year={year}/"
+
+    def window_key(self, start, end):
+        return (f"{self.prefix}/year={start.year}/month={start.month:02d}/"
+                f"{self.prefix}_{start:%Y%m%d}_{end:%Y%m%d}.parquet")
+
+    def partition_ranges(self):
+        # month=MM (2桁) はシーズン期間の月だけ
+        return {'month': {'range': f"{self.season_start[0]},{self.season_end[0]}", 'digits': '2'}}
+
+    def export(self, s3_client, s3_bucket, year, **kwargs):
+        import statcast
+        return statcast.export_season(self, s3_client, s3_bucket, year, **kwargs)
+
+
+@dataclass(frozen=True)
+class DerivedSpec(DatasetSpec):
+    """
+    エクスポート済みデータセットから計算する派生テーブル (derived.py)
+
+    inputs の同じ年度のファイルを読んで計算し、<prefix>/year=YYYY/ に保存する。
+    取得はしないので REGISTRY ではなく DERIVED_REGISTRY に登録する。
+    """
+    inputs: Tuple[str, ...] = ()
+    compact: bool = False
+
+
+def _cols(*defs):
+    return tuple(Column(*d) for d in defs)
+
+
+REGISTRY: Tuple[DatasetSpec, ...] = (
+    DatasetSpec(
+        key='batting',
+        label='Batting Stats',
+        summary_label='Player Batting',
+        prefix='batting_stats',
+        filename='batting_stats.parquet',
+        fetch_func='batting_stats',
+        player_id_source='IDfg',
+        fetch_kwargs={'qual': 100},
+        unit_name='players',
+        description='MLB batting statistics by year',
+        construct_id='BattingStatsTable',
+        lookup_columns=('name', 'player_id'),
+        columns=_cols(
+            ('Name', 'name', 'string', 'Player name'),
+            ('G', 'games', 'smallint', 'Games played'),
+            ('AB', 'at_bats', 'smallint', 'At bats'),
+            ('R', 'runs', 'smallint', 'Runs scored'),
+            ('H', 'hits', 'smallint', 'Hits'),
+            ('HR', 'hr', 'smallint', 'Home runs'),
+            ('RBI', 'rbi', 'smallint', 'Runs batted in'),
+            ('SB', 'sb', 'smallint', 'Stolen bases'),
+            ('AVG', 'avg', 'float', 'Batting average'),
+            ('PA', 'pa', 'smallint', 'Plate appearances'),
+            ('1B', 'singles', 'smallint', 'Singles'),
+            ('2B', 'doubles', 'smallint', 'Doubles'),
+            ('3B', 'triples', 'smallint', 'Triples'),
+            ('BB', 'bb', 'smallint', 'Walks'),
+            ('IBB', 'ibb', 'smallint', 'Intentional walks'),
+            ('HBP', 'hbp', 'smallint', 'Hit by pitch'),
+            ('SF', 'sf', 'smallint', 'Sacrifice flies'),
+            ('SO', 'so', 'smallint', 'Strikeouts'),
+        ),
+    ),
+    DatasetSpec(
+        key='pitching',
+        label='Pitching Stats',
+        summary_label='Player Pitching',
+        prefix='pitching_stats',
+        filename='pitching_stats.parquet',
+        fetch_func='pitching_stats',
+        player_id_source='IDfg',
+        fetch_kwargs={'qual': 50},  # 50イニング以上
+        unit_name='pitchers',
+        description='MLB pitching statistics by year',
+        construct_id='PitchingStatsTable',
+        lookup_columns=('name', 'player_id'),
+        columns=_cols(
+            ('Name', 'name', 'string', 'Pitcher name'),
+            ('G', 'games', 'smallint', 'Games pitched'),
+            ('W', 'wins', 'smallint', 'Wins'),
+            ('L', 'losses', 'smallint', 'Losses'),
+            ('ERA', 'era', 'float', 'Earned run average'),
+            ('SO', 'strikeouts', 'smallint', 'Strikeouts'),
+            ('IP', 'innings_pitched', 'float', 'Innings pitched'),
+            ('WHIP', 'whip', 'float', 'WHIP (walks + hits per inning)'),
+            ('HR', 'home_runs', 'smallint', 'Home runs allowed'),
+            ('BB', 'walks', 'smallint', 'Walks allowed'),
+            ('HBP', 'hit_batters', 'smallint', 'Hit batters'),
+            ('ER', 'earned_runs', 'smallint', 'Earned runs'),
+        ),
+    ),
+    DatasetSpec(
+        key='team_batting',
+        label='Team Batting Stats',
+        prefix='team_batting_stats',
+        filename='team_batting.parquet',
+        fetch_func='team_batting',
+        season_range=True,
+        project=False,
+        sort_columns=('Season', 'Team'),
+        lookup_columns=('Team',),
+        dropna=False,
+        query_limit=None,
+        unit_name='teams',
+        description='MLB team batting statistics by year',
+        construct_id='TeamBattingStatsTable',
+        columns=_cols(
+            ('teamIDfg', 'teamIDfg', 'smallint', 'Team ID'),
+            ('Season', 'Season', 'smallint', 'Season year'),
+            ('Team', 'Team', 'string', 'Team abbreviation'),
+            ('G', 'G', 'smallint', 'Games played'),
+            ('AB', 'AB', 'smallint', 'At bats'),
+            ('H', 'H', 'smallint', 'Hits'),
+            ('HR', 'HR', 'smallint', 'Home runs'),
+            ('RBI', 'RBI', 'smallint', 'Runs batted in'),
+            ('AVG', 'AVG', 'float', 'Batting average'),
+            ('OBP', 'OBP', 'float', 'On-base percentage'),
+            ('SLG', 'SLG', 'float', 'Slugging percentage'),
+            ('wRC+', 'wRC+', 'smallint', 'Weighted runs created plus'),
+            ('WAR', 'WAR', 'float', 'Wins above replacement'),
+            ('PA', 'PA', 'smallint', 'Plate appearances'),
+            ('1B', '1B', 'smallint', 'Singles'),
+            ('2B', '2B', 'smallint', 'Doubles'),
+            ('3B', '3B', 'smallint', 'Triples'),
+            ('BB', 'BB', 'smallint', 'Walks'),
+            ('IBB', 'IBB', 'smallint', 'Intentional walks'),
+            ('HBP', 'HBP', 'smallint', 'Hit by pitch'),
+            ('SF', 'SF', 'smallint', 'Sacrifice flies'),
+            ('SO', 'SO', 'smallint', 'Strikeouts'),
+        ),
+    ),
+    DatasetSpec(
+        key='team_pitching',
+        label='Team Pitching Stats',
+        prefix='team_pitching_stats',
+        filename='team_pitching.parquet',
+        fetch_func='team_pitching',
+        season_range=True,
+        project=False,
+        sort_columns=('Season', 'Team'),
+        lookup_columns=('Team',),
+        dropna=False,
+        query_limit=None,
+        unit_name='teams',
+        description='MLB team pitching statistics by year',
+        construct_id='TeamPitchingStatsTable',
+        columns=_cols(
+            ('teamIDfg', 'teamIDfg', 'smallint', 'Team ID'),
+            ('Season', 'Season', 'smallint', 'Season year'),
+            ('Team', 'Team', 'string', 'Team abbreviation'),
+            ('W', 'W', 'smallint', 'Wins'),
+            ('L', 'L', 'smallint', 'Losses'),
+            ('ERA', 'ERA', 'float', 'Earned run average'),
+            ('IP', 'IP', 'float', 'Innings pitched'),
+            ('SO', 'SO', 'smallint', 'Strikeouts'),
+            ('BB', 'BB', 'smallint', 'Walks'),
+            ('WHIP', 'WHIP', 'float', 'WHIP'),
+            ('FIP', 'FIP', 'float', 'Fielding independent pitching'),
+            ('WAR', 'WAR', 'float', 'Wins above replacement'),
+            ('HR', 'HR', 'smallint', 'Home runs allowed'),
+            ('HBP', 'HBP', 'smallint', 'Hit batters'),
+            ('ER', 'ER', 'smallint', 'Earned runs'),
+        ),
+    ),
+    DatasetSpec(
+        key='team_fielding',
+        label='Team Fielding Stats',
+        prefix='team_fielding_stats',
+        filename='team_fielding.parquet',
+        fetch_func='team_fielding',
+        season_range=True,
+        project=False,
+        sort_columns=('Season', 'Team'),
+        lookup_columns=('Team',),
+        dropna=False,
+        query_limit=None,
+        unit_name='teams',
+        description='MLB team fielding statistics by year',
+        construct_id='TeamFieldingStatsTable',
+        columns=_cols(
+            ('teamIDfg', 'teamIDfg', 'smallint', 'Team ID'),
+            ('Season', 'Season', 'smallint', 'Season year'),
+            ('Team', 'Team', 'string', 'Team name'),
+            ('G', 'G', 'smallint', 'Games'),
+            ('Inn', 'Inn', 'float', 'Innings'),
+            ('PO', 'PO', 'smallint', 'Putouts'),
+            ('A', 'A', 'smallint', 'Assists'),
+            ('E', 'E', 'smallint', 'Errors'),
+            ('DP', 'DP', 'smallint', 'Double plays'),
+            ('DRS', 'DRS', 'smallint', 'Defensive runs saved'),
+            ('UZR', 'UZR', 'float', 'Ultimate zone rating'),
+            ('Def', 'Def', 'float', 'Defensive value'),
+        ),
+    ),
+    StatcastSpec(
+        key='statcast',
+        label='Statcast Pitches',
+        prefix='statcast',
+        filename='',
+        fetch_func='statcast',
+        fetch_kwargs={'verbose': False, 'parallel': False},  # ウィンドウ単位で並列化するため
+        source='baseball_savant',
+        unit_name='pitches',
+        description='MLB Statcast pitch-level data by year and month',
+        construct_id='StatcastTable',
+        partition_keys=(YEAR_PARTITION, MONTH_PARTITION),
+        enabled_by_default=False,
+        dropna=False,
+        columns=_cols(
+            ('game_date', 'game_date', 'date', 'Game date'),
+            ('game_pk', 'game_pk', 'int', 'Game ID'),
+            ('at_bat_number', 'at_bat_number', 'smallint', 'At-bat number within game'),
+            ('pitch_number', 'pitch_number', 'tinyint', 'Pitch number within at-bat'),
+            ('inning', 'inning', 'tinyint', 'Inning'),
+            ('inning_topbot', 'inning_topbot', 'string', 'Top/Bottom of inning'),
+            ('home_team', 'home_team', 'string', 'Home team'),
+            ('away_team', 'away_team', 'string', 'Away team'),
+            ('player_name', 'player_name', 'string', 'Player name (pitcher)'),
+            ('batter', 'batter', 'int', 'Batter MLBAM ID'),
+            ('pitcher', 'pitcher', 'int', 'Pitcher MLBAM ID'),
+            ('stand', 'stand', 'string', 'Batter side'),
+            ('p_throws', 'p_throws', 'string', 'Pitcher hand'),
+            ('balls', 'balls', 'tinyint', 'Balls before pitch'),
+            ('strikes', 'strikes', 'tinyint', 'Strikes before pitch'),
+            ('outs_when_up', 'outs_when_up', 'tinyint', 'Outs before pitch'),
+            ('pitch_type', 'pitch_type', 'string', 'Pitch type'),
+            ('release_speed', 'release_speed', 'float', 'Release speed (mph)'),
+            ('release_spin_rate', 'release_spin_rate', 'float', 'Spin rate (rpm)'),
+            ('pfx_x', 'pfx_x', 'float', 'Horizontal movement (ft)'),
+            ('pfx_z', 'pfx_z', 'float', 'Vertical movement (ft)'),
+            ('plate_x', 'plate_x', 'float', 'Horizontal location at plate (ft)'),
+            ('plate_z', 'plate_z', 'float', 'Vertical location at plate (ft)'),
+            ('zone', 'zone', 'tinyint', 'Strike zone region'),
+            ('type', 'type', 'string', 'Ball/Strike/In play'),
+            ('description', 'description', 'string', 'Pitch result description'),
+            ('events', 'events', 'string', 'Plate appearance result'),
+            ('bb_type', 'bb_type', 'string', 'Batted ball type'),
+            ('launch_speed', 'launch_speed', 'float', 'Exit velocity (mph)'),
+            ('launch_angle', 'launch_angle', 'float', 'Launch angle (deg)'),
+            ('hit_distance_sc', 'hit_distance_sc', 'float', 'Projected hit distance (ft)'),
+            ('estimated_woba_using_speedangle', 'estimated_woba_using_speedangle', 'float', 'xwOBA'),
+            ('woba_value', 'woba_value', 'float', 'wOBA value'),
+        ),
+    ),
+)
+
+
+def _derived(key, label, prefix, inputs, construct_id, description, columns):
+    return DerivedSpec(
+        key=key,
+        label=label,
+        prefix=prefix,
+        filename=f"{prefix}.parquet",
+        fetch_func='',
+        source='derived',
+        inputs=inputs,
+        construct_id=construct_id,
+        description=description,
+        columns=_cols(*((name, name, glue_type, comment) for name, glue_type, comment in columns)),
+    )
+
+
+# 派生テーブル (率・リーグ比・シーズン内パーセンタイル)。リーグ平均はチーム成績の合計から計算する
+DERIVED_REGISTRY: Tuple[DerivedSpec, ...] = (
+    _derived(
+        'batting_advanced', 'Batting Advanced Stats', 'batting_advanced_stats',
+        inputs=('batting', 'team_batting'),
+        construct_id='BattingAdvancedStatsTable',
+        description='MLB batting rate, league-relative and percentile metrics by year',
+        columns=(
+            ('name', 'string', 'Player name'),
+            ('player_id', 'int', PLAYER_ID.comment),
+            ('pa', 'smallint', 'Plate appearances'),
+            ('hr', 'smallint', 'Home runs'),
+            ('avg', 'float', 'Batting average'),
+            ('obp', 'float', 'On-base percentage'),
+            ('slg', 'float', 'Slugging percentage'),
+            ('ops', 'float', 'On-base plus slugging'),
+            ('iso', 'float', 'Isolated power'),
+            ('babip', 'float', 'Batting average on balls in play'),
+            ('woba', 'float', 'Weighted on-base average (scaled to league OBP)'),
+            ('ops_plus', 'float', 'OPS+ (100 = league average, no park adjustment)'),
+            ('woba_pct', 'float', 'wOBA percentile within season (0-100)'),
+            ('ops_pct', 'float', 'OPS percentile within season (0-100)'),
+            ('hr_pct', 'float', 'Home run percentile within season (0-100)'),
+        ),
+    ),
+    _derived(
+        'pitching_advanced', 'Pitching Advanced Stats', 'pitching_advanced_stats',
+        inputs=('pitching', 'team_pitching'),
+        construct_id='PitchingAdvancedStatsTable',
+        description='MLB pitching rate, league-relative and percentile metrics by year',
+        columns=(
+            ('name', 'string', 'Pitcher name'),
+            ('player_id', 'int', PLAYER_ID.comment),
+            ('innings', 'float', 'Innings pitched (thirds as fractions)'),
+            ('era', 'float', 'Earned run average'),
+            ('fip', 'float', 'Fielding independent pitching'),
+            ('era_plus', 'float', 'ERA+ (100 = league average, higher is better, no park adjustment)'),
+            ('fip_minus', 'float', 'FIP- (100 = league average, lower is better)'),
+            ('k9', 'float', 'Strikeouts per 9 innings'),
+            ('bb9', 'float', 'Walks per 9 innings'),
+            ('hr9', 'float', 'Home runs per 9 innings'),
+            ('k_bb', 'float', 'Strikeout to walk ratio'),
+            ('era_pct', 'float', 'ERA percentile within season (0-100, higher is better)'),
+            ('fip_pct', 'float', 'FIP percentile within season (0-100, higher is better)'),
+            ('k9_pct', 'float', 'K/9 percentile within season (0-100)'),
+        ),
+    ),
+)
+
+
+# 選手ディメンション (players.py が選手ID索引から書き出す。パーティションなし)
+PLAYERS = DatasetSpec(
+    key='players',
+    label='Players',
+    prefix='players',
+    filename='players.parquet',
+    fetch_func='chadwick_register',
+    source='chadwick',
+    unit_name='players',
+    description='MLB players with MLBAM, FanGraphs and Baseball-Reference IDs',
+    construct_id='PlayersTable',
+    project=False,
+    dropna=False,
+    partition_keys=(),
+    enabled_by_default=False,
+    compact=False,
+    sort_columns=('player_id',),
+    lookup_columns=('player_id',),
+    columns=_cols(
+        ('player_id', 'player_id', 'int', 'Player ID (MLBAM)'),
+        ('key_fangraphs', 'key_fangraphs', 'int', 'FanGraphs player ID (IDfg)'),
+        ('key_bbref', 'key_bbref', 'string', 'Baseball-Reference player ID'),
+        ('name_first', 'name_first', 'string', 'First name'),
+        ('name_last', 'name_last', 'string', 'Last name'),
+        ('first_year', 'first_year', 'smallint', 'First MLB season'),
+        ('last_year', 'last_year', 'smallint', 'Last MLB season'),
+    ),
+)
+
+
+def select_specs(keys=None):
+    """
+    実行対象のデータセット (keys 未指定時は enabled_by_default のもの。派生テーブルは指定できない)
+    """
+    if not keys:
+        return tuple(spec for spec in REGISTRY if spec.enabled_by_default)
+    fetchable = {spec.key for spec in REGISTRY}
+    unknown = [key for key in keys if key not in fetchable]
+    if unknown:
+        raise KeyError(f"Unknown dataset: {unknown[0]}")
+    return tuple(get_spec(key) for key in keys)
+
+
+def get_spec(key):
+    for spec in REGISTRY + DERIVED_REGISTRY + (PLAYERS,):
+        if spec.key == key:
+            return spec
+    raise KeyError(f"Unknown dataset: {key}")
+
+
+def glue_tables():
+    """
+    CDKスタックが読み込むGlueテーブル定義 (派生テーブル・選手テーブル・コンパクション済みテーブル <prefix>_all を含む)
+    """
+    tables = [
+        {
+            'constructId': spec.construct_id,
+            'name': spec.prefix,
+            'description': spec.description,
+            'partitionKeys': spec.glue_partition_keys(),
+            'columns': spec.glue_columns(),
+            'projection': spec.partition_projection(),
+        }
+        for spec in REGISTRY + DERIVED_REGISTRY + (PLAYERS,)
+    ]
+    tables.extend(
+        {
+            'constructId': spec.construct_id.replace('Table', 'AllTable'),
+            'name': spec.compact_prefix,
+            'description': f"{spec.description} (all years, sorted by {', '.join(spec.sort_columns)})",
+            'partitionKeys': [],
+            'columns': spec.glue_columns(),
+            'projection': {},
+        }
+        for spec in REGISTRY if spec.compact
+    )
+    return tables
+
+
+def render_glue_tables():
+    return json.dumps(glue_tables(), indent=2, ensure_ascii=False) + '\n'
+
+
+def main(argv):
+    if len(argv) == 2 and argv[0] == '--check':
+        with open(argv[1], encoding='utf-8') as f:
+            current = f.read()
+        if current != render_glue_tables():
+            print(f"✗ {argv[1]} is out of date. Run: python lambda/datasets.py > {argv[1]}",
+                  file=sys.stderr)
+            return 1
+        print(f"✓ {argv[1]} is up to date")
+        return 0
+    sys.stdout.write(render_glue_tables())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,250 @@
+"""
+派生指標テーブル (OPS / wOBA / ERA+ / FIP など)
+
+エクスポート後に、書き込みがあった年度について入力データセット (選手成績 + チーム成績) の
+同じ年度のファイルを読み、率・リーグ比・シーズン内パーセンタイルを列単位 (NumPy) で計算して
+<prefix>/year=YYYY/ に保存する (Glue テーブルは datasets.DERIVED_REGISTRY から生成)。
+ダッシュボードのクエリごとに Athena で計算し直さずに済む。
+
+  - リーグ平均はチーム成績 (全30球団) の合計から計算する (選手成績は規定到達者のみのため)
+  - wOBA は固定の重みで計算し、シーズンごとにリーグ wOBA = リーグ OBP となるよう尺度を合わせる
+  - パークファクターは使わない (OPS+ / ERA+ は球場補正なし)
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+from change_detection import CHANGE_UNCHANGED
+from compaction import list_year_files, read_frame
+from datasets import get_spec
+from pipeline import put_parquet_if_changed
+
+# wOBA の重み (非故意四球, 死球, 単打, 二塁打, 三塁打, 本塁打)。尺度は年度ごとに合わせる
+WOBA_WEIGHTS = (0.69, 0.72, 0.89, 1.27, 1.62, 2.10)
+
+# FIP の係数 (本塁打, 四死球, 奪三振)
+FIP_WEIGHTS = (13, 3, 2)
+
+
+def _values(df, column):
+    return df[column].to_numpy(dtype='float64', na_value=float('nan'))
+
+
+def ratio(numerator, denominator):
+    """
+    分母が0以下の行は NaN
+    """
+    import numpy as np
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def innings(ip):
+    """
+    FanGraphs の投球回表記 (180.1 = 180と1/3回) を実数に変換
+    """
+    import numpy as np
+    whole = np.floor(ip)
+    return whole + np.round((ip - whole) * 10) / 3
+
+
+def percentile(values, higher_is_better=True):
+    """
+    シーズン内のパーセンタイル (0-100、NaN は NaN のまま)
+    """
+    import pandas as pd
+    ranks = pd.Series(values).rank(pct=True, ascending=higher_is_better, method='average')
+    return (ranks * 100).to_numpy()
+
+
+def woba_raw(bb, ibb, hbp, singles, doubles, triples, hr, ab, sf):
+    w_bb, w_hbp, w_1b, w_2b, w_3b, w_hr = WOBA_WEIGHTS
+    numerator = (w_bb * (bb - ibb) + w_hbp * hbp + w_1b * singles + w_2b * doubles
+                 + w_3b * triples + w_hr * hr)
+    return ratio(numerator, ab + bb - ibb + sf + hbp)
+
+
+def derive_batting(frames, year):
+    """
+    打撃の派生指標 (frames: {'batting': 選手成績, 'team_batting': チーム成績})
+    """
+    import pandas as pd
+
+    players, teams = frames['batting'], frames['team_batting']
+    ab, h, hr, so = (_values(players, c) for c in ('at_bats', 'hits', 'hr', 'so'))
+    bb, ibb, hbp, sf = (_values(players, c) for c in ('bb', 'ibb', 'hbp', 'sf'))
+    singles, doubles, triples = (_values(players, c) for c in ('singles', 'doubles', 'triples'))
+
+    # リーグ合計 (チーム成績の列名は FanGraphs のまま)
+    lg = {c: float(_values(teams, c).sum())
+          for c in ('AB', 'H', 'HR', 'BB', 'IBB', 'HBP', 'SF', '1B', '2B', '3B')}
+    lg_obp = (lg['H'] + lg['BB'] + lg['HBP']) / (lg['AB'] + lg['BB'] + lg['HBP'] + lg['SF'])
+    lg_slg = (lg['1B'] + 2 * lg['2B'] + 3 * lg['3B'] + 4 * lg['HR']) / lg['AB']
+    lg_woba = woba_raw(lg['BB'], lg['IBB'], lg['HBP'], lg['1B'], lg['2B'], lg['3B'], lg['HR'],
+                       lg['AB'], lg['SF'])
+
+    avg = ratio(h, ab)
+    obp = ratio(h + bb + hbp, ab + bb + hbp + sf)
+    slg = ratio(singles + 2 * doubles + 3 * triples + 4 * hr, ab)
+    ops = obp + slg
+    woba = woba_raw(bb, ibb, hbp, singles, doubles, triples, hr, ab, sf) * (lg_obp / lg_woba)
+
+    return pd.DataFrame({
+        'name': players['name'],
+        'player_id': players.get('player_id'),  # 選手ID導入前のファイルには無い
+        'pa': players['pa'],
+        'hr': players['hr'],
+        'avg': avg,
+        'obp': obp,
+        'slg': slg,
+        'ops': ops,
+        'iso': slg - avg,
+        'babip': ratio(h - hr, ab - so - hr + sf),
+        'woba': woba,
+        'ops_plus': 100 * (obp / lg_obp + slg / lg_slg - 1),
+        'woba_pct': percentile(woba),
+        'ops_pct': percentile(ops),
+        'hr_pct': percentile(hr),
+    })
+
+
+def derive_pitching(frames, year):
+    """
+    投手の派生指標 (frames: {'pitching': 選手成績, 'team_pitching': チーム成績})
+    """
+    import pandas as pd
+
+    players, teams = frames['pitching'], frames['team_pitching']
+    ip = innings(_values(players, 'innings_pitched'))
+    so, bb, hbp, hr, er = (_values(players, c)
+                           for c in ('strikeouts', 'walks', 'hit_batters', 'home_runs', 'earned_runs'))
+    w_hr, w_bb, w_so = FIP_WEIGHTS
+
+    lg_ip = float(innings(_values(teams, 'IP')).sum())
+    lg = {c: float(_values(teams, c).sum()) for c in ('ER', 'HR', 'BB', 'HBP', 'SO')}
+    lg_era = 9 * lg['ER'] / lg_ip
+    # FIP 定数: リーグ FIP = リーグ ERA となるように決める
+    fip_constant = lg_era - (w_hr * lg['HR'] + w_bb * (lg['BB'] + lg['HBP']) - w_so * lg['SO']) / lg_ip
+
+    era = ratio(9 * er, ip)
+    fip = ratio(w_hr * hr + w_bb * (bb + hbp) - w_so * so, ip) + fip_constant
+    k9 = ratio(9 * so, ip)
+
+    return pd.DataFrame({
+        'name': players['name'],
+        'player_id': players.get('player_id'),  # 選手ID導入前のファイルには無い
+        'innings': ip,
+        'era': era,
+        'fip': fip,
+        'era_plus': ratio(100 * lg_era, era),
+        'fip_minus': 100 * fip / lg_era,
+        'k9': k9,
+        'bb9': ratio(9 * bb, ip),
+        'hr9': ratio(9 * hr, ip),
+        'k_bb': ratio(so, bb),
+        'era_pct': percentile(era, higher_is_better=False),
+        'fip_pct': percentile(fip, higher_is_better=False),
+        'k9_pct': percentile(k9),
+    })
+
+
+DERIVATIONS = {
+    'batting_advanced': derive_batting,
+    'pitching_advanced': derive_pitching,
+}
+
+
+def existing_years(s3_client, s3_bucket, spec):
+    return {int(key[len(spec.prefix) + len('/year='):].split('/', 1)[0])
+            for key in list_year_files(s3_client, s3_bucket, spec)}
+
+
+def pending_years(spec, s3_client, s3_bucket, changed_years):
+    """
+    計算し直す年度 (入力に書き込みがあった年度 + 入力は揃っているが派生テーブルがない年度)
+    """
+    available = None
+    for key in spec.inputs:
+        years = existing_years(s3_client, s3_bucket, get_spec(key))
+        available = years if available is None else available & years
+    missing = available - existing_years(s3_client, s3_bucket, spec)
+    return sorted(set(changed_years) | missing)
+
+
+def derive_year(spec, s3_client, s3_bucket, year, created_at):
+    """
+    1派生テーブル × 1年度 を計算して保存
+
+    Returns:
+        (行数, 変更状態) (入力ファイルが揃っていなければ None)
+    """
+    frames = {}
+    for key in spec.inputs:
+        try:
+            frames[key] = read_frame(s3_client, s3_bucket, get_spec(key).s3_key(year))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    df = DERIVATIONS[spec.key](frames, year)
+    df.insert(1, 'season', year)
+    df['created_at'] = created_at
+    table = spec.conform(df)
+    change, _ = put_parquet_if_changed(s3_client, s3_bucket, spec.s3_key(year), table, datetime.now(),
+                                       spec.schema_version())
+    return table.num_rows, change
+
+
+def derive_dataset(spec, s3_client, s3_bucket, years, created_at=None):
+    """
+    1派生テーブルの指定年度を並列に計算
+
+    Returns:
+        {'years', 'rows', 'unchanged_years', 'missing_inputs', 'seconds'}
+    """
+    start = time.time()
+    created_at = created_at or datetime.now().replace(microsecond=0)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(
+            lambda year: derive_year(spec, s3_client, s3_bucket, year, created_at), years))
+    done = [(year, result) for year, result in zip(years, results) if result is not None]
+    return {
+        'years': [year for year, _ in done],
+        'rows': sum(rows for _, (rows, _) in done),
+        'unchanged_years': [year for year, (_, change) in done if change == CHANGE_UNCHANGED],
+        'missing_inputs': [year for year, result in zip(years, results) if result is None],
+        'seconds': round(time.time() - start, 2),
+    }
+
+
+def derive_datasets(jobs, s3_client, s3_bucket, created_at=None):
+    """
+    複数の派生テーブルを計算 (失敗しても他の派生テーブルは続ける)
+
+    Args:
+        jobs: [(spec, [year, ...])]
+
+    Returns:
+        {spec.key: stats or {'error': ...}}
+    """
+    jobs = [(spec, years) for spec, years in jobs if years]
+    if not jobs:
+        return {}
+    print(f"\n[Derived] {len(jobs)} tables")
+
+    results = {}
+    for spec, years in jobs:
+        try:
+            stats = derive_dataset(spec, s3_client, s3_bucket, years, created_at)
+        except Exception as e:
+            print(f"  ✗ [{spec.label}] derivation FAILED - {e}")
+            results[spec.key] = {'error': str(e)}
+            continue
+        print(f"  ✓ [{spec.label}] {len(stats['years'])} years → s3://{s3_bucket}/{spec.prefix}/ "
+              f"({stats['rows']} rows, {len(stats['unchanged_years'])} unchanged, {stats['seconds']:.1f}s)")
+        results[spec.key] = stats
+    return results
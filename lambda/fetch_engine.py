@@ -0,0 +1,123 @@
+"""
+(dataset, year) 単位の取得ジョブを並列実行するフェッチエンジン
+
+全ジョブを1つのスレッドプールで実行する。ジョブは取得元 (source) ごとのキューに積み、
+取得元の同時実行数に空きがある分だけプールへ投入する (上限に達した取得元のジョブが
+ワーカースレッドを占有して待つことはなく、空いたスレッドは他の取得元のジョブに回る)。
+ジョブ単位の例外は結果に記録し、他のジョブは継続する。
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_SOURCE_LIMIT = 4
+
+
+@dataclass
+class WorkUnit:
+    """1つの (dataset, year) 取得ジョブ"""
+    dataset: str
+    year: int
+    source: str
+    func: Callable[[], Any]
+
+
+@dataclass
+class UnitResult:
+    """ジョブの実行結果"""
+    dataset: str
+    year: int
+    value: Any = None
+    error: Optional[str] = None
+    duration: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def parse_source_limits(spec):
+    """
+    "fangraphs=4,bref=2" 形式の文字列を {source: limit} に変換
+    """
+    limits = {}
+    if not spec:
+        return limits
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, value = item.partition('=')
+        limits[name.strip()] = int(value)
+    return limits
+
+
+class FetchEngine:
+    """
+    有界スレッドプール + 取得元ごとの同時実行制限
+    """
+
+    def __init__(self, max_workers=None, source_limits=None, default_source_limit=None):
+        self.max_workers = max_workers or int(os.environ.get('FETCH_MAX_WORKERS', DEFAULT_MAX_WORKERS))
+        if source_limits is None:
+            source_limits = parse_source_limits(os.environ.get('SOURCE_CONCURRENCY', ''))
+        self.source_limits = source_limits
+        self.default_source_limit = default_source_limit or DEFAULT_SOURCE_LIMIT
+
+    def source_limit(self, source):
+        return max(1, self.source_limits.get(source, self.default_source_limit))
+
+    def _run_unit(self, unit):
+        start = time.time()
+        try:
+            value = unit.func()
+            return UnitResult(unit.dataset, unit.year, value=value,
+                              duration=time.time() - start)
+        except Exception as e:
+            return UnitResult(unit.dataset, unit.year, error=str(e),
+                              duration=time.time() - start)
+
+    def run(self, units: List[WorkUnit]) -> List[UnitResult]:
+        """
+        全ジョブを実行し、投入順に並べた結果を返す
+
+        空きのある取得元のうち、先頭のジョブの投入順が最も早いものから投入する。
+        """
+        if not units:
+            return []
+
+        results: List[Optional[UnitResult]] = [None] * len(units)
+        queues = {}
+        for i, unit in enumerate(units):
+            queues.setdefault(unit.source, deque()).append((i, unit))
+        in_flight = {source: 0 for source in queues}
+        workers = min(self.max_workers, len(units))
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch') as executor:
+            running = {}
+
+            def fill():
+                while len(running) < workers:
+                    ready = [(queue[0][0], source) for source, queue in queues.items()
+                             if queue and in_flight[source] < self.source_limit(source)]
+                    if not ready:
+                        return
+                    _, source = min(ready)
+                    i, unit = queues[source].popleft()
+                    in_flight[source] += 1
+                    running[executor.submit(self._run_unit, unit)] = (i, source)
+
+            fill()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, source = running.pop(future)
+                    in_flight[source] -= 1
+                    results[i] = future.result()
+                fill()
+        return results
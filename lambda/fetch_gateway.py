@@ -0,0 +1,332 @@
+"""
+上流サイトへの取得ゲートウェイ
+
+pybaseball の呼び出しはすべて FetchGateway.call() を通し、取得元 (source) ごとに
+
+  - トークンバケット:     1秒あたりの呼び出し数を制限 (FETCH_RATE_LIMITS)
+  - 適応的な同時実行数:   成功かつ遅延が平常なら +1、エラー・遅延増大で縮小 (AIMD)
+  - リトライ:             429 / 5xx / タイムアウト / 接続エラーをジッター付き指数バックオフで再試行
+  - サーキットブレーカー: 連続失敗が閾値を超えたら一定時間即座に失敗させる
+
+を適用する。source はホスト単位 (fangraphs = www.fangraphs.com、
+baseball_savant = baseballsavant.mlb.com) なので、同じホストへの呼び出しは
+データセットやスレッドをまたいで1つの制限を共有する。
+
+制限はプロセス単位で、別プロセス (Step Functions の Map で並列に動く各ワーカーの Lambda) とは
+共有しない。並列に動くプロセス数を set_processes() で渡すと、各プロセスはレート・バースト・
+同時実行数をその数で割った分だけ使う (全プロセスの合計が設定値に収まる)。
+プロセス間で連携するわけではないので、バックオフやサーキットブレーカーは各プロセスで独立に働く。
+
+    gateway = get_gateway()
+    data = gateway.call('fangraphs', pybaseball.batting_stats, 2024, qual=100)
+"""
+
+import os
+import random
+import threading
+import time
+
+import metrics
+from fetch_engine import parse_source_limits
+
+DEFAULT_RATE_PER_SECOND = 1.0
+DEFAULT_BURST = 2
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 2.0
+DEFAULT_MAX_BACKOFF_SECONDS = 60.0
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 60.0
+
+EMPTY_STATS = {'calls': 0, 'retries': 0, 'failures': 0, 'throttled_seconds': 0.0}
+
+# 平常時の遅延 (EWMA) に対してこの倍率を超えたら混雑とみなす
+LATENCY_DEGRADED_FACTOR = 2.0
+# これより速い応答はばらつきとみなして混雑判定しない
+LATENCY_DEGRADED_MIN_SECONDS = 1.0
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いている (取得元が連続で失敗している)"""
+
+
+def is_retryable(error):
+    """
+    一時的なエラーかどうか (取得元の混雑・ネットワーク)
+
+    データが存在しない等の恒久的なエラーは再試行しない。
+    """
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__
+    if name in ('Timeout', 'ReadTimeout', 'ConnectTimeout', 'ConnectionError',
+                'ChunkedEncodingError', 'ProtocolError', 'RemoteDisconnected'):
+        return True
+    message = str(error)
+    return any(marker in message for marker in ('429', 'Too Many Requests', 'timed out', '503'))
+
+
+class TokenBucket:
+    """
+    rate 個/秒で補充され、最大 burst 個まで貯まるトークンバケット
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        トークンを1つ取得 (なければ補充されるまで待つ)
+
+        Returns:
+            待った秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveLimiter:
+    """
+    同時実行数の上限を観測した遅延とエラーで調整 (加算増加・乗算減少)
+    """
+
+    def __init__(self, maximum, minimum=1):
+        self.maximum = max(minimum, maximum)
+        self.minimum = minimum
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self.baseline = None  # 成功時の遅延の EWMA
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, latency, ok):
+        with self._cond:
+            self.in_flight -= 1
+            if not ok:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif (self.baseline is not None and latency > LATENCY_DEGRADED_MIN_SECONDS
+                  and latency > self.baseline * LATENCY_DEGRADED_FACTOR):
+                self.limit = max(self.minimum, self.limit * 0.75)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            if ok:
+                self.baseline = latency if self.baseline is None else 0.8 * self.baseline + 0.2 * latency
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """
+    連続 failure_threshold 回の失敗で open、reset_seconds 後に1回だけ試行 (half-open)
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self, source):
+        with self._lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self._probing):
+                raise CircuitOpenError(
+                    f"{source}: circuit open after {self.failures} consecutive failures")
+            if state == 'half-open':
+                self._probing = True
+
+    def record(self, ok):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    self.opened_at = time.monotonic()
+
+
+class SourceGateway:
+    """1つの取得元 (ホスト) の制限一式"""
+
+    def __init__(self, rate, burst, max_concurrency, failure_threshold, reset_seconds):
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.stats = dict(EMPTY_STATS)
+
+
+class FetchGateway:
+    """
+    取得元ごとの SourceGateway を遅延生成して共有する
+    """
+
+    def __init__(self, rate_limits=None, retries=None, backoff=None, max_backoff=None,
+                 concurrency=None, failure_threshold=None, reset_seconds=None):
+        env = os.environ
+        self.rate_limits = rate_limits if rate_limits is not None else _parse_float_limits(
+            env.get('FETCH_RATE_LIMITS', ''))
+        self.concurrency = concurrency if concurrency is not None else parse_source_limits(
+            env.get('SOURCE_CONCURRENCY', ''))
+        self.retries = retries if retries is not None else int(env.get('FETCH_RETRIES', DEFAULT_RETRIES))
+        self.backoff = backoff if backoff is not None else float(
+            env.get('FETCH_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS))
+        self.max_backoff = max_backoff or DEFAULT_MAX_BACKOFF_SECONDS
+        self.failure_threshold = failure_threshold or int(
+            env.get('CIRCUIT_FAILURE_THRESHOLD', DEFAULT_FAILURE_THRESHOLD))
+        self.reset_seconds = reset_seconds or float(env.get('CIRCUIT_RESET_SECONDS', DEFAULT_RESET_SECONDS))
+        self.processes = 1
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def set_processes(self, processes):
+        """
+        同じ取得元に並列でアクセスするプロセス数を設定 (制限をこの数で割る)
+
+        数が変わった場合は取得元ごとの状態を作り直す。
+        """
+        processes = max(1, int(processes or 1))
+        with self._lock:
+            if processes != self.processes:
+                self.processes = processes
+                self._sources = {}
+
+    def source(self, name):
+        with self._lock:
+            if name not in self._sources:
+                rate = self.rate_limits.get(name, DEFAULT_RATE_PER_SECOND)
+                self._sources[name] = SourceGateway(
+                    rate=rate / self.processes,
+                    burst=max(1.0, max(DEFAULT_BURST, rate) / self.processes),
+                    max_concurrency=max(1, self.concurrency.get(name, DEFAULT_MAX_CONCURRENCY)
+                                        // self.processes),
+                    failure_threshold=self.failure_threshold,
+                    reset_seconds=self.reset_seconds,
+                )
+            return self._sources[name]
+
+    def call(self, source, func, *args, **kwargs):
+        """
+        func(*args, **kwargs) を取得元の制限下で実行 (一時的なエラーは再試行)
+        """
+        gateway = self.source(source)
+        for attempt in range(self.retries + 1):
+            gateway.breaker.before_call(source)
+            gateway.limiter.acquire()
+            waited = gateway.bucket.acquire()
+            start = time.time()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                # 恒久的なエラー (データなし等) は取得元が応答しているので混雑扱いにしない
+                retryable = is_retryable(e)
+                gateway.limiter.release(time.time() - start, ok=not retryable)
+                gateway.breaker.record(ok=not retryable)
+                with self._lock:
+                    gateway.stats['calls'] += 1
+                    gateway.stats['throttled_seconds'] += waited
+                    gateway.stats['failures'] += 1
+                if attempt == self.retries or not retryable:
+                    raise
+                # full jitter: 0 〜 base * 2^attempt
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+                with self._lock:
+                    gateway.stats['retries'] += 1
+                metrics.current().count('Retries')
+                print(f"  ↻ {source}: {type(e).__name__} ({str(e)[:60]}), "
+                      f"retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            gateway.limiter.release(time.time() - start, ok=True)
+            gateway.breaker.record(ok=True)
+            with self._lock:
+                gateway.stats['calls'] += 1
+                gateway.stats['throttled_seconds'] += waited
+            return result
+
+    def reset_stats(self):
+        """
+        呼び出し統計だけを0に戻す (実行の開始時に呼ぶ)
+
+        ゲートウェイはウォームスタート間で共有するため、戻さないと前回までの実行の分も集計される。
+        レート制限・同時実行数・サーキットブレーカーの状態はそのまま引き継ぐ。
+        """
+        with self._lock:
+            for gateway in self._sources.values():
+                gateway.stats = dict(EMPTY_STATS)
+
+    def summary(self):
+        """
+        取得元ごとの呼び出し統計 (前回の reset_stats() 以降)
+        """
+        with self._lock:
+            return {
+                name: dict(g.stats,
+                           throttled_seconds=round(g.stats['throttled_seconds'], 2),
+                           concurrency=round(g.limiter.limit, 2),
+                           circuit=g.breaker.state)
+                for name, g in self._sources.items()
+            }
+
+
+def _parse_float_limits(spec):
+    """
+    "fangraphs=0.5,baseball_savant=2" 形式 (小数可) を {source: rate} に変換
+    """
+    limits = {}
+    for item in (spec or '').split(','):
+        name, _, value = item.strip().partition('=')
+        if name and value:
+            limits[name.strip()] = float(value)
+    return limits
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """
+    プロセス内で共有するゲートウェイ (Lambda のウォームスタート間でも状態を引き継ぐ)
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = FetchGateway()
+        return _gateway
@@ -0,0 +1,127 @@
+"""
+インクリメンタルエクスポートの取得計画
+
+各 year= プレフィックスの既存オブジェクトを HEAD で確認し、
+再取得が必要な年度だけを返す。
+
+再取得条件:
+  - 当年度 (CURRENT_SEASON 以降)
+  - オブジェクトが存在しない / 空
+  - content-sha256 メタデータがない (旧形式。マルチパートアップロード分は除く)
+  - シーズン確定前に取得されたデータ (fetched-at がシーズン確定日より前)
+  - データセットのスキーマが変わった (schema-version がレジストリと異なる)
+  - 明示的に無効化された年度 (invalidate_years)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+# この日以降に取得したデータはシーズン確定版とみなす (ポストシーズン終了後)
+SEASON_FINAL_MONTH = 12
+SEASON_FINAL_DAY = 1
+
+HASH_METADATA_KEY = 'content-sha256'
+FETCHED_AT_METADATA_KEY = 'fetched-at'
+SCHEMA_METADATA_KEY = 'schema-version'
+
+
+def current_season(end_year):
+    """
+    当年度 (CURRENT_SEASON 環境変数 or 現在の年、END_YEAR を上限)
+    """
+    season = int(os.environ.get('CURRENT_SEASON', datetime.now().year))
+    return min(season, end_year)
+
+
+def season_final_at(year):
+    return datetime(year, SEASON_FINAL_MONTH, SEASON_FINAL_DAY)
+
+
+def head_object(s3_client, s3_bucket, s3_key):
+    """
+    オブジェクトのメタデータを取得 (存在しなければ None)
+    """
+    try:
+        return s3_client.head_object(Bucket=s3_bucket, Key=s3_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+
+def object_metadata(fetched_at, schema_version=None):
+    """
+    インクリメンタル判定用のオブジェクトメタデータ (取得時刻・スキーマの指紋)
+    """
+    metadata = {FETCHED_AT_METADATA_KEY: fetched_at.isoformat(timespec='seconds')}
+    if schema_version:
+        metadata[SCHEMA_METADATA_KEY] = schema_version
+    return metadata
+
+
+def stale_reason(head, year, season, schema_version=None):
+    """
+    既存オブジェクトを再取得すべき理由を返す (最新なら None)
+    """
+    if year >= season:
+        return 'current season'
+    if head is None:
+        return 'missing'
+    if head.get('ContentLength', 0) == 0:
+        return 'empty object'
+
+    metadata = head.get('Metadata', {})
+    # マルチパートで書いたオブジェクトは完了時にしか現れないのでETagで代用する
+    multipart = '-' in head.get('ETag', '')
+    if not metadata.get(HASH_METADATA_KEY) and not multipart:
+        return 'no content hash'
+
+    if schema_version and metadata.get(SCHEMA_METADATA_KEY) != schema_version:
+        return 'schema changed'
+
+    fetched_at = metadata.get(FETCHED_AT_METADATA_KEY)
+    if not fetched_at:
+        return 'no fetch timestamp'
+    try:
+        if datetime.fromisoformat(fetched_at) < season_final_at(year):
+            return 'fetched before season end'
+    except ValueError:
+        return 'invalid fetch timestamp'
+    return None
+
+
+def plan_incremental(s3_client, s3_bucket, specs, years, season, invalidate_years=()):
+    """
+    データセットごとに再取得が必要な年度を決定
+
+    Returns:
+        {spec.key: [year, ...]}  (再取得する年度のみ)
+    """
+    invalidated = set(invalidate_years)
+    # 年度内の進捗を自前で管理するデータセット (Statcast) は常に実行し、内部で未完了分だけ取得する
+    targets = [(spec, year) for spec in specs if not spec.manages_own_state for year in years]
+
+    # HEAD は I/O 待ちのみなので並列に投げる
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        heads = list(executor.map(
+            lambda t: None if t[1] >= season or t[1] in invalidated
+            else head_object(s3_client, s3_bucket, t[0].s3_key(t[1])),
+            targets,
+        ))
+
+    print(f"\n[Incremental] current season={season}, invalidated={sorted(invalidated)}")
+    plan = {spec.key: (list(years) if spec.manages_own_state else []) for spec in specs}
+    for (spec, year), head in zip(targets, heads):
+        reason = 'invalidated' if year in invalidated else stale_reason(
+            head, year, season, spec.schema_version())
+        if reason:
+            plan[spec.key].append(year)
+            print(f"  ↻ [{spec.label}] {year}: refetch ({reason})")
+
+    fetch_count = sum(len(plan[spec.key]) for spec in specs if not spec.manages_own_state)
+    print(f"  {fetch_count}/{len(targets)} units need refetch, "
+          f"{len(targets) - fetch_count} up to date")
+    return plan
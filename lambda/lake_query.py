@@ -0,0 +1,292 @@
+"""
+データレイクのローカル分析クエリ (pyarrow.dataset)
+
+Athena を経由せずに、エクスポート済みの <prefix>/year=YYYY/ レイアウトを
+pyarrow.dataset で直接読む社内ツール向けのモジュール。
+
+  - year= パーティションによる枝刈り (S3 の場合は対象年度のファイルだけ取得)
+  - フィルタ条件のプッシュダウン (行グループの min/max 統計で読み飛ばし)
+  - S3 から取得したファイルはローカルディスクにキャッシュ (内容が変わった時のみ再取得)
+
+root には S3 (s3://bucket) またはレイクをコピーしたローカルディレクトリを指定する。
+
+    lake = Lake('s3://my-bucket')                   # or Lake('/data/lake-copy')
+    lake.leaderboard('batting', 'hr', years=(2015, 2025), career=True)
+    lake.player_history('Shohei Ohtani')              # or lake.player_history(660271)
+    lake.team_splits('LAD', years=(2020, 2025))
+
+コマンドライン:
+    python lambda/lake_query.py --root /data/lake-copy leaderboard batting hr --years 2015-2025
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from datasets import get_spec
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'baseball-lake')
+INDEX_FILE = '.index.json'
+
+# team_splits で結合するデータセットと列名の接頭辞
+TEAM_SPLIT_DATASETS = (('team_batting', 'batting_'), ('team_pitching', 'pitching_'),
+                       ('team_fielding', 'fielding_'))
+
+
+def year_range(years):
+    """
+    years: None / 2024 / (2015, 2025) / [2019, 2021] → (最小, 最大) または None
+    """
+    if years is None:
+        return None
+    if isinstance(years, int):
+        return years, years
+    years = list(years)
+    return min(years), max(years)
+
+
+class FileCache:
+    """
+    S3 オブジェクトのローカルキャッシュ (キー → cache_dir/キー)
+
+    取得時のトークン (マニフェストの sha256 または ETag) を index に記録し、
+    一致する間は再取得しない。
+    """
+
+    def __init__(self, s3_client, s3_bucket, cache_dir=None):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.cache_dir = os.path.join(cache_dir or os.environ.get('LAKE_CACHE_DIR', DEFAULT_CACHE_DIR),
+                                      s3_bucket)
+        self.index_path = os.path.join(self.cache_dir, INDEX_FILE)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'downloads': 0, 'bytes': 0}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def path(self, s3_key):
+        return os.path.join(self.cache_dir, *s3_key.split('/'))
+
+    def fetch(self, s3_key, token):
+        """
+        ローカルパスを返す (キャッシュがなければ / トークンが変わっていればダウンロード)
+        """
+        path = self.path(s3_key)
+        if token and self.index.get(s3_key) == token and os.path.exists(path):
+            with self._lock:
+                self.stats['hits'] += 1
+            return path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        self.s3_client.download_file(self.s3_bucket, s3_key, tmp)
+        os.replace(tmp, path)
+        with self._lock:
+            self.index[s3_key] = token
+            self.stats['downloads'] += 1
+            self.stats['bytes'] += os.path.getsize(path)
+        return path
+
+    def save(self):
+        with self._lock:
+            tmp = f"{self.index_path}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump(self.index, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.index_path)
+
+
+class Lake:
+    """
+    データレイクへのクエリ窓口
+    """
+
+    def __init__(self, root=None, cache_dir=None, s3_client=None):
+        root = root or f"s3://{os.environ['S3_BUCKET']}"
+        self.root = root
+        self.cache = None
+        if root.startswith('s3://'):
+            if s3_client is None:
+                import boto3
+                s3_client = boto3.client('s3')
+            self.s3_client = s3_client
+            self.s3_bucket = root[len('s3://'):].strip('/')
+            self.cache = FileCache(s3_client, self.s3_bucket, cache_dir)
+
+    # ---------- Dataset ----------
+
+    def schema(self, spec):
+        """
+        宣言したカラム + パーティションキー (古いスキーマのファイルも読み込み時にこの型に揃える)
+        """
+        import pyarrow as pa
+        fields = list(spec.arrow_schema())
+        fields.extend(pa.field(c.name, pa.int32()) for c in spec.partition_keys)
+        return pa.schema(fields)
+
+    def _remote_files(self, spec, years):
+        """
+        対象年度のファイル一覧 [(key, token)] (マニフェスト latest.json → なければ S3 LIST)
+        """
+        from manifest import list_files
+
+        bounds = year_range(years)
+        wanted = None if bounds is None else set(range(bounds[0], bounds[1] + 1))
+        files = [(f['key'], f.get('sha256')) for f in list_files(
+            self.s3_client, self.s3_bucket, dataset=spec.key, years=wanted)]
+        if files:
+            return files
+
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=f"{spec.prefix}/year="):
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                if not key.endswith('.parquet'):
+                    continue
+                year = int(key[len(spec.prefix) + len('/year='):].split('/', 1)[0])
+                if wanted is None or year in wanted:
+                    files.append((key, obj['ETag'].strip('"')))
+        return files
+
+    def dataset(self, key, years=None):
+        """
+        pyarrow.dataset.Dataset (S3 の場合は対象年度のファイルだけをローカルに取得して開く)
+        """
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        spec = get_spec(key)
+        schema = self.schema(spec)
+        partitioning = ds.partitioning(
+            pa.schema([schema.field(c.name) for c in spec.partition_keys]), flavor='hive')
+
+        if self.cache is None:
+            return ds.dataset(os.path.join(self.root, spec.prefix), format='parquet',
+                              partitioning=partitioning, schema=schema)
+
+        files = self._remote_files(spec, years)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            paths = list(executor.map(lambda f: self.cache.fetch(*f), files))
+        self.cache.save()
+        return ds.dataset(sorted(paths), format='parquet', partitioning=partitioning,
+                          partition_base_dir=self.cache.path(spec.prefix), schema=schema)
+
+    def query(self, key, columns=None, filter=None, years=None):
+        """
+        条件に合う行を pandas.DataFrame で返す
+
+        Args:
+            filter: pyarrow.dataset の式 (例: ds.field('hr') >= 30)。行グループ統計で読み飛ばす
+            years: 2024 / (2015, 2025)。year パーティションで枝刈りする
+        """
+        import pyarrow.dataset as ds
+
+        bounds = year_range(years)
+        if bounds is not None:
+            year_filter = (ds.field('year') >= bounds[0]) & (ds.field('year') <= bounds[1])
+            filter = year_filter if filter is None else filter & year_filter
+        table = self.dataset(key, years).to_table(columns=columns, filter=filter)
+        return table.to_pandas()
+
+    # ---------- よく使うクエリ ----------
+
+    def leaderboard(self, key, stat, years=None, limit=10, ascending=False, career=False,
+                    min_value=None):
+        """
+        stat の上位 (career=True: 期間通算で集計)
+
+        Args:
+            min_value: stat の下限 (プッシュダウンされる)
+        """
+        import pyarrow.dataset as ds
+
+        spec = get_spec(key)
+        name = spec.lookup_columns[0]
+        filter = None if min_value is None else ds.field(stat) >= min_value
+        df = self.query(key, columns=[name, 'year', stat], filter=filter, years=years)
+        if career:
+            df = (df.groupby(name, observed=True)
+                    .agg(**{stat: (stat, 'sum'), 'seasons': ('year', 'nunique')})
+                    .reset_index())
+        df = df.sort_values([stat, name], ascending=[ascending, True], kind='stable')
+        return df.head(limit).reset_index(drop=True)
+
+    def player_history(self, name, key='batting', years=None):
+        """
+        1選手の年度別成績 (name に整数を渡すと player_id で検索する。同名の別選手が混ざらない)
+        """
+        import pyarrow.dataset as ds
+
+        spec = get_spec(key)
+        column = 'player_id' if isinstance(name, int) else spec.lookup_columns[0]
+        df = self.query(key, filter=ds.field(column) == name, years=years)
+        return df.sort_values('year', kind='stable').reset_index(drop=True)
+
+    def team_splits(self, team, years=None):
+        """
+        1チームの年度別 打撃 / 投手 / 守備 成績を1つの表にまとめる (列名は batting_ などの接頭辞付き)
+        """
+        import pandas as pd
+        import pyarrow.dataset as ds
+
+        merged = None
+        for key, prefix in TEAM_SPLIT_DATASETS:
+            spec = get_spec(key)
+            columns = [c.name for c in spec.columns if c.name not in spec.sort_columns]
+            df = self.query(key, columns=['year'] + columns,
+                            filter=ds.field(spec.lookup_columns[0]) == team, years=years)
+            df = df.rename(columns={c: f"{prefix}{c}" for c in columns})
+            merged = df if merged is None else pd.merge(merged, df, on='year', how='outer')
+        return merged.sort_values('year', kind='stable').reset_index(drop=True)
+
+
+def _parse_years(value):
+    if not value:
+        return None
+    start, _, end = value.partition('-')
+    return int(start), int(end or start)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Query the exported baseball data lake')
+    parser.add_argument('--root', help='s3://bucket or local directory (default: s3://$S3_BUCKET)')
+    parser.add_argument('--cache-dir')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--years', type=_parse_years, help='2024 or 2015-2025')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    board = sub.add_parser('leaderboard', parents=[common])
+    board.add_argument('dataset')
+    board.add_argument('stat')
+    board.add_argument('--limit', type=int, default=10)
+    board.add_argument('--ascending', action='store_true')
+    board.add_argument('--career', action='store_true')
+
+    player = sub.add_parser('player', parents=[common])
+    player.add_argument('name')
+    player.add_argument('--dataset', default='batting')
+
+    team = sub.add_parser('team', parents=[common])
+    team.add_argument('team')
+
+    args = parser.parse_args(argv)
+    lake = Lake(args.root, cache_dir=args.cache_dir)
+    if args.command == 'leaderboard':
+        df = lake.leaderboard(args.dataset, args.stat, years=args.years, limit=args.limit,
+                              ascending=args.ascending, career=args.career)
+    elif args.command == 'player':
+        name = int(args.name) if args.name.isdigit() else args.name
+        df = lake.player_history(name, key=args.dataset, years=args.years)
+    else:
+        df = lake.team_splits(args.team, years=args.years)
+    print(df.to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
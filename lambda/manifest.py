@@ -0,0 +1,186 @@
+"""
+実行マニフェスト (S3)
+
+(dataset, year) ユニットごとに、状態・行数・出力キー・チェックサム・所要時間を記録する。
+
+  _manifests/runs/<run_id>/units/<dataset>/year=YYYY.json   ユニット完了ごとに即時保存
+  _manifests/runs/<run_id>/manifest.json                    実行終了時にまとめたもの
+  _manifests/latest.json                                    全ユニットの最新の完了記録
+
+同じ run_id で再実行すると、完了済み (done) のユニットは取得せずに記録を引き継ぐ。
+ユニットごとに別オブジェクトにしているので、fan-out のワーカーが並列に書いても競合しない。
+
+下流の読み手は latest.json を1回読むだけで、各プレフィックスを LIST せずに
+現在のファイル一覧 (キー・行数・sha256) を得られる (list_files)。
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+MANIFEST_PREFIX = '_manifests'
+LATEST_KEY = f"{MANIFEST_PREFIX}/latest.json"
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def unit_id(dataset, year):
+    return f"{dataset}/{year}"
+
+
+def _get_json(s3_client, s3_bucket, s3_key):
+    try:
+        response = s3_client.get_object(Bucket=s3_bucket, Key=s3_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return json.loads(response['Body'].read())
+
+
+def _put_json(s3_client, s3_bucket, s3_key, data):
+    s3_client.put_object(Bucket=s3_bucket, Key=s3_key,
+                         Body=json.dumps(data, indent=1, sort_keys=True).encode('utf-8'),
+                         ContentType='application/json')
+
+
+class RunManifest:
+    """
+    1回の実行 (run_id) のユニット記録
+
+        manifest = RunManifest(s3_client, bucket, run_id).load()
+        if not manifest.is_done('batting', 2024):
+            ...
+            manifest.record('batting', 2024, STATUS_DONE, files=[...], duration=12.3)
+        manifest.finalize()
+    """
+
+    def __init__(self, s3_client, s3_bucket, run_id):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.run_id = run_id
+        self.prefix = f"{MANIFEST_PREFIX}/runs/{run_id}"
+        self.units = {}
+        self.loaded = False
+
+    def unit_key(self, dataset, year):
+        return f"{self.prefix}/units/{dataset}/year={year}.json"
+
+    def load(self):
+        """
+        この run_id で記録済みのユニットを読み込む (LIST 1回 + 並列 GET)
+        """
+        keys = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.s3_bucket, Prefix=f"{self.prefix}/units/"):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+
+        if keys:
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                entries = executor.map(
+                    lambda key: _get_json(self.s3_client, self.s3_bucket, key), keys)
+            for entry in entries:
+                if entry:
+                    self.units[unit_id(entry['dataset'], entry['year'])] = entry
+            print(f"\n[Manifest] run {self.run_id}: {len(self.done_units())} units already done")
+        self.loaded = True
+        return self
+
+    def get(self, dataset, year):
+        """
+        1ユニットの記録 (読み込み済みでなければ S3 から取得)
+        """
+        uid = unit_id(dataset, year)
+        if uid not in self.units and not self.loaded:
+            entry = _get_json(self.s3_client, self.s3_bucket, self.unit_key(dataset, year))
+            if entry:
+                self.units[uid] = entry
+        return self.units.get(uid)
+
+    def is_done(self, dataset, year):
+        entry = self.get(dataset, year)
+        return bool(entry) and entry['status'] == STATUS_DONE
+
+    def done_units(self):
+        return [entry for entry in self.units.values() if entry['status'] == STATUS_DONE]
+
+    def record(self, dataset, year, status, files=(), duration=0.0, error=None, change=None):
+        """
+        ユニットの結果を即座に保存 (中断時の再開ポイント)
+
+        Args:
+            files: [{'key', 'rows', 'bytes', 'sha256', 'change'}]
+            change: ユニットの変更状態 (new / updated / unchanged)
+        """
+        files = sorted(files, key=lambda f: f['key'])
+        entry = {
+            'run_id': self.run_id,
+            'dataset': dataset,
+            'year': year,
+            'status': status,
+            'rows': sum(f.get('rows', 0) for f in files),
+            'files': files,
+            'duration': round(duration, 2),
+            'error': error,
+            'change': change,
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        _put_json(self.s3_client, self.s3_bucket, self.unit_key(dataset, year), entry)
+        self.units[unit_id(dataset, year)] = entry
+        return entry
+
+    def finalize(self):
+        """
+        実行全体のマニフェストを保存し、完了ユニットを latest.json にマージ
+        """
+        entries = sorted(self.units.values(), key=lambda e: (e['dataset'], e['year']))
+        _put_json(self.s3_client, self.s3_bucket, f"{self.prefix}/manifest.json", {
+            'run_id': self.run_id,
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'units': entries,
+        })
+
+        latest = read_latest(self.s3_client, self.s3_bucket)
+        for entry in entries:
+            if entry['status'] != STATUS_DONE:
+                continue
+            uid = unit_id(entry['dataset'], entry['year'])
+            # 年度内で一部のファイルだけ書き直すデータセット (Statcast) があるので、キー単位でマージする
+            files = {f['key']: f for f in latest.get(uid, {}).get('files', [])}
+            files.update({f['key']: f for f in entry['files']})
+            merged = dict(entry, files=sorted(files.values(), key=lambda f: f['key']))
+            merged['rows'] = sum(f.get('rows', 0) for f in merged['files'])
+            latest[uid] = merged
+        _put_json(self.s3_client, self.s3_bucket, LATEST_KEY, {
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+            'run_id': self.run_id,
+            'units': latest,
+        })
+
+
+def read_latest(s3_client, s3_bucket):
+    """
+    latest.json のユニット記録 {'dataset/year': entry} (なければ空)
+    """
+    data = _get_json(s3_client, s3_bucket, LATEST_KEY)
+    return data.get('units', {}) if data else {}
+
+
+def list_files(s3_client, s3_bucket, dataset=None, years=None):
+    """
+    最新のデータファイル一覧を latest.json から取得 (S3 LIST 不要)
+
+    Returns:
+        [{'dataset', 'year', 'key', 'rows', 'bytes', 'sha256'}]
+    """
+    files = []
+    for entry in read_latest(s3_client, s3_bucket).values():
+        if dataset and entry['dataset'] != dataset:
+            continue
+        if years and entry['year'] not in years:
+            continue
+        files.extend(dict(f, dataset=entry['dataset'], year=entry['year']) for f in entry['files'])
+    return sorted(files, key=lambda f: f['key'])
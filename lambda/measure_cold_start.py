@@ -0,0 +1,176 @@
+"""
+コールドスタートの計測
+
+  local:  新しいプロセスで `import baseball_lambda` を runs 回実行し、
+          import 時間 (-X importtime) と重い依存を読み込んでいないかを測る
+  lambda: デプロイ済みの関数を runs 回コールドスタートさせ (環境変数を書き換えて実行環境を作り直す)、
+          {"action": "ping"} の REPORT 行から Init Duration を取得する
+
+    python lambda/measure_cold_start.py local --runs 10
+    # ビルドしたイメージ内で計測
+    docker run --rm -v "$PWD/lambda:/mnt" --entrypoint python baseball-lambda \\
+        /mnt/measure_cold_start.py local --path /var/task
+    python lambda/measure_cold_start.py lambda --function-name <DataFetchFunction名> --runs 5
+
+--json で結果を JSON 出力 (イメージ変更前後の比較用)。
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+# 初期化時に読み込んでいないことを確認するモジュール
+HEAVY_MODULES = ('pandas', 'pyarrow', 'numpy', 'pybaseball', 'matplotlib', 'scipy')
+
+NONCE_ENV = 'COLD_START_NONCE'
+REPORT_PATTERN = re.compile(r'REPORT .*?Duration: ([\d.]+) ms.*?Init Duration: ([\d.]+) ms', re.S)
+
+IMPORT_CODE = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import baseball_lambda\n"
+    "seconds = time.perf_counter() - start\n"
+    f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+    "print(json.dumps({'seconds': seconds, 'heavy': heavy}))\n"
+)
+
+
+def summarize(values):
+    return {
+        'median': round(statistics.median(values), 4),
+        'min': round(min(values), 4),
+        'max': round(max(values), 4),
+    }
+
+
+def parse_importtime(stderr, top):
+    """
+    -X importtime の出力から、累積時間の大きいパッケージ (boto3, botocore, ...) 上位 top 件
+
+    パッケージを最初に読み込んだ行の累積時間 (配下の import を含む) を使う。
+    """
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        package = name.strip().split('.')[0]
+        totals[package] = max(totals.get(package, 0), int(cumulative_us))
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{'module': name, 'ms': round(us / 1000, 1)} for name, us in ranked]
+
+
+def measure_local(path, runs, top):
+    env = dict(os.environ, PYTHONPATH=path, S3_BUCKET=os.environ.get('S3_BUCKET', 'cold-start-probe'),
+               AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'ap-northeast-1'))
+    wall, imports, heavy, modules = [], [], [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', IMPORT_CODE], cwd=path,
+                                env=env, capture_output=True, text=True, check=True)
+        wall.append(time.perf_counter() - start)
+        output = json.loads(result.stdout.strip().splitlines()[-1])
+        imports.append(output['seconds'])
+        heavy = output['heavy']
+        modules = parse_importtime(result.stderr, top)
+    return {
+        'mode': 'local',
+        'python': sys.version.split()[0],
+        'runs': runs,
+        'process_seconds': summarize(wall),
+        'import_seconds': summarize(imports),
+        'heavy_modules_at_init': heavy,
+        'slowest_imports': modules,
+    }
+
+
+def measure_lambda(function_name, runs):
+    """
+    環境変数 COLD_START_NONCE を書き換えるたびに新しい実行環境になるので、毎回コールドスタートになる
+    (関数の設定を変更するため、本番の実行中には使わない)
+    """
+    import boto3
+
+    client = boto3.client('lambda')
+    waiter = client.get_waiter('function_updated_v2')
+    variables = client.get_function_configuration(FunctionName=function_name)['Environment']['Variables']
+    init, duration = [], []
+    try:
+        for _ in range(runs):
+            client.update_function_configuration(
+                FunctionName=function_name,
+                Environment={'Variables': dict(variables, **{NONCE_ENV: uuid.uuid4().hex})})
+            waiter.wait(FunctionName=function_name)
+            response = client.invoke(FunctionName=function_name, LogType='Tail',
+                                     Payload=json.dumps({'action': 'ping'}).encode('utf-8'))
+            log = base64.b64decode(response['LogResult']).decode('utf-8', 'replace')
+            match = REPORT_PATTERN.search(log)
+            if match is None:
+                print(f"⚠️  No Init Duration in log tail (warm start?):\n{log[-500:]}", file=sys.stderr)
+                continue
+            duration.append(float(match.group(1)))
+            init.append(float(match.group(2)))
+    finally:
+        variables.pop(NONCE_ENV, None)
+        client.update_function_configuration(FunctionName=function_name,
+                                             Environment={'Variables': variables})
+    return {
+        'mode': 'lambda',
+        'function': function_name,
+        'runs': len(init),
+        'init_duration_ms': summarize(init) if init else None,
+        'duration_ms': summarize(duration) if duration else None,
+    }
+
+
+def print_report(result):
+    if result['mode'] == 'local':
+        print(f"Python {result['python']}, {result['runs']} runs")
+        print(f"  import baseball_lambda: {result['import_seconds']['median']:.3f}s median "
+              f"({result['import_seconds']['min']:.3f}-{result['import_seconds']['max']:.3f}s)")
+        print(f"  process start + import: {result['process_seconds']['median']:.3f}s median")
+        print(f"  heavy modules loaded at init: {result['heavy_modules_at_init'] or 'none'}")
+        for item in result['slowest_imports']:
+            print(f"    {item['ms']:8.1f} ms  {item['module']}")
+    else:
+        print(f"{result['function']}: {result['runs']} cold starts")
+        if result['init_duration_ms']:
+            print(f"  Init Duration: {result['init_duration_ms']['median']:.0f} ms median "
+                  f"({result['init_duration_ms']['min']:.0f}-{result['init_duration_ms']['max']:.0f} ms)")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Measure import time and Lambda init duration')
+    sub = parser.add_subparsers(dest='mode', required=True)
+    local = sub.add_parser('local')
+    local.add_argument('--path', default=os.path.dirname(os.path.abspath(__file__)),
+                       help='directory containing baseball_lambda.py and its dependencies')
+    local.add_argument('--runs', type=int, default=5)
+    local.add_argument('--top', type=int, default=10)
+    remote = sub.add_parser('lambda')
+    remote.add_argument('--function-name', required=True)
+    remote.add_argument('--runs', type=int, default=3)
+    for p in (local, remote):
+        p.add_argument('--json', action='store_true')
+
+    args = parser.parse_args(argv)
+    if args.mode == 'local':
+        result = measure_local(args.path, args.runs, args.top)
+    else:
+        result = measure_lambda(args.function_name, args.runs)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
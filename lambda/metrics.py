@@ -0,0 +1,207 @@
+"""
+パイプライン計測 (CloudWatch Embedded Metric Format)
+
+(dataset, year) ユニットごとに、ステージ別の処理時間・行数・バイト数・
+リトライ回数・キャッシュヒット数を集計し、終了時に EMF 形式のJSONを1行ログ出力する。
+Lambda のログに出力された EMF 行は CloudWatch が自動でメトリクスに変換する。
+
+    with unit_metrics('batting', 2024) as m:
+        with m.stage('fetch'):
+            data = ...
+        m.record_write(writer.stats, s3_key)   # serialize / upload の時間・行数・バイト数
+
+ユニット内の深い処理 (キャッシュ・ネットワーク層) からは current() で
+実行中スレッドのユニットに加算する (ユニットがなければ何もしない)。
+ユニット内で別スレッドを起動する場合は bind(current()) で引き継ぐ。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_NAMESPACE = 'BaseballPipeline'
+
+STAGES = ('fetch', 'transform', 'serialize', 'upload')
+COUNTERS = ('Retries', 'CacheHits', 'CacheMisses', 'UnchangedFiles')
+
+_local = threading.local()
+
+
+def namespace():
+    return os.environ.get('METRICS_NAMESPACE', DEFAULT_NAMESPACE)
+
+
+def enabled():
+    return os.environ.get('METRICS', 'on') != 'off'
+
+
+def emf_line(metrics, dimensions, properties=None):
+    """
+    EMF 形式のログ行を組み立てる
+
+    Args:
+        metrics: {name: (value, unit)}
+        dimensions: {name: value} (ディメンションなしの集計も同時に出す)
+        properties: メトリクスにしない付加情報 (Logs Insights 用)
+    """
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace(),
+                'Dimensions': [list(dimensions), []] if dimensions else [[]],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in metrics.items()],
+            }],
+        },
+    }
+    record.update(properties or {})
+    record.update(dimensions)
+    record.update({name: value for name, (value, _) in metrics.items()})
+    return json.dumps(record, default=str)
+
+
+def emit(metrics, dimensions=None, properties=None):
+    if enabled():
+        # print は本文と改行を別々に書くため、並列ユニットの行が混ざらないよう1回で書く
+        sys.stdout.write(emf_line(metrics, dimensions or {}, properties) + '\n')
+        sys.stdout.flush()
+
+
+class UnitMetrics:
+    """
+    1ユニット (dataset, year) 分の計測値
+    """
+
+    def __init__(self, dataset, year):
+        self.dataset = dataset
+        self.year = year
+        self.seconds = {stage: 0.0 for stage in STAGES}
+        self.rows = 0
+        self.bytes = 0
+        self.counters = {name: 0 for name in COUNTERS}
+        # 書き出したファイル (実行マニフェスト用): [{'key', 'rows', 'bytes', 'sha256', 'change'}]
+        self.files = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        ブロックの経過時間をステージに加算
+        """
+        start = time.time()
+        try:
+            yield self
+        finally:
+            self.record(name, seconds=time.time() - start)
+
+    def record(self, stage, seconds=0.0, rows=0, bytes=0):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.rows += rows
+            self.bytes += bytes
+
+    def record_write(self, stats, s3_key, change=None):
+        """
+        StreamingParquetWriter.stats を serialize / upload に振り分けて加算し、出力ファイルを記録
+        """
+        self.record('serialize', seconds=stats['seconds'] - stats['upload_seconds'],
+                    rows=stats['rows'], bytes=stats['bytes'])
+        self.record('upload', seconds=stats['upload_seconds'])
+        entry = {'key': s3_key, 'rows': stats['rows'], 'bytes': stats['bytes'], 'sha256': stats['sha256']}
+        if change:
+            entry['change'] = change
+        with self._lock:
+            self.files.append(entry)
+
+    def record_unchanged(self, s3_key, rows, bytes, sha256):
+        """
+        内容が同じため書き込まなかったファイルを記録 (既存オブジェクトの値をマニフェストに残す)
+        """
+        self.count('UnchangedFiles')
+        with self._lock:
+            self.files.append({'key': s3_key, 'rows': rows, 'bytes': bytes, 'sha256': sha256,
+                               'change': 'unchanged'})
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def emit(self, duration, error=None):
+        metrics = {f"{stage.capitalize()}Time": (round(seconds * 1000, 1), 'Milliseconds')
+                   for stage, seconds in self.seconds.items()}
+        metrics.update({
+            'UnitTime': (round(duration * 1000, 1), 'Milliseconds'),
+            'Rows': (self.rows, 'Count'),
+            'Bytes': (self.bytes, 'Bytes'),
+            'Failures': (0 if error is None else 1, 'Count'),
+        })
+        metrics.update({name: (value, 'Count') for name, value in self.counters.items()})
+        properties = {'Year': self.year, 'Status': 'failed' if error else 'ok'}
+        if error:
+            properties['Error'] = str(error)[:200]
+        emit(metrics, {'Dataset': self.dataset}, properties)
+
+
+class _NullMetrics(UnitMetrics):
+    """ユニット外で呼ばれた場合の受け皿 (記録しない)"""
+
+    def __init__(self):
+        super().__init__(None, None)
+
+    def record(self, stage, seconds=0.0, rows=0, bytes=0):
+        pass
+
+    def record_write(self, stats, s3_key, change=None):
+        pass
+
+    def record_unchanged(self, s3_key, rows, bytes, sha256):
+        pass
+
+    def count(self, name, value=1):
+        pass
+
+
+_NULL = _NullMetrics()
+
+
+def current():
+    """
+    実行中スレッドのユニット計測 (ユニット外なら記録しないダミー)
+    """
+    return getattr(_local, 'unit', None) or _NULL
+
+
+@contextmanager
+def unit_metrics(dataset, year):
+    """
+    ブロックを1ユニットとして計測し、終了時 (例外時も) に EMF を出力
+    """
+    metrics = UnitMetrics(dataset, year)
+    previous = getattr(_local, 'unit', None)
+    _local.unit = metrics
+    start = time.time()
+    try:
+        yield metrics
+    except Exception as e:
+        metrics.emit(time.time() - start, error=e)
+        raise
+    else:
+        metrics.emit(time.time() - start)
+    finally:
+        _local.unit = previous
+
+
+@contextmanager
+def bind(metrics):
+    """
+    別スレッドの処理をユニットの計測に加算する (ユニット内で起動したワーカー用)
+    """
+    previous = getattr(_local, 'unit', None)
+    _local.unit = None if metrics is _NULL else metrics
+    try:
+        yield metrics
+    finally:
+        _local.unit = previous
@@ -0,0 +1,349 @@
+"""
+コーディネーター / ワーカー方式のファンアウト実行
+
+同じLambda (同じDockerイメージ) を action ごとに3つの役割で呼び出す。
+
+  1. plan:      取得計画を立て、(dataset, year) ユニットの一覧を返す
+  2. unit:      1ユニットを取得してS3に保存し、結果を返す (Step Functions の Map で並列実行)
+  3. summarize: 全ユニットの結果を集計し、Slackに1回だけ通知する
+
+ローカルでは run_local() でワーカーをプロセス内のスレッドとして実行できる
+(s3_client に moto などを渡せば AWS なしでスケジューリングを確認できる)。
+"""
+
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Dict, List
+
+from availability import AvailabilityCache
+from change_detection import CHANGE_UPDATED, CHANGES
+from compaction import compact_datasets
+from datasets import DERIVED_REGISTRY, PLAYERS, get_spec, select_specs
+from derived import derive_datasets, pending_years
+from fetch_engine import FetchEngine, WorkUnit
+from incremental import current_season, head_object, plan_incremental
+from manifest import STATUS_DONE, RunManifest
+from pipeline import DatasetResult, run_unit
+from players import write_players_table
+from response_cache import ResponseCache
+
+CACHE_COUNTERS = ('local_hits', 's3_hits', 'misses', 'expired', 'evictions', 'errors')
+
+
+@dataclass
+class RunConfig:
+    """1回の実行設定 (イベント + 環境変数から組み立て、ワーカーにもそのまま渡す)"""
+    s3_bucket: str
+    start_year: int
+    end_year: int
+    run_id: str
+    mode: str = 'full'
+    skip_years: List[int] = field(default_factory=list)             # 明示的に除外する年度
+    unavailable: Dict[str, List[int]] = field(default_factory=dict)  # 取得元で提供なしの年度 (dataset別)
+    invalidate_years: List[int] = field(default_factory=list)
+    datasets: List[str] = field(default_factory=list)
+    created_at: str = ''  # 全ユニットの created_at (ISO形式、計画時に1回だけ決める)
+
+    @classmethod
+    def from_event(cls, event, run_id=None):
+        """
+        mode:     event.mode > EXPORT_MODE > full
+        datasets: event.datasets > EXPORT_DATASETS > 既定 (Statcast以外)
+        run_id:   event.run_id (中断した実行の再開) > 引数 > 現在時刻
+        skip_years: event.skip_years (通常は不要。取得元の提供状況は probe_availability で確認する)
+        """
+        return cls(
+            s3_bucket=os.environ['S3_BUCKET'],
+            start_year=int(os.environ.get('START_YEAR', 2015)),
+            end_year=int(os.environ.get('END_YEAR', 2025)),
+            run_id=str(event.get('run_id') or run_id or time.strftime('%Y%m%dT%H%M%S')),
+            mode=event.get('mode', os.environ.get('EXPORT_MODE', 'full')),
+            skip_years=[int(y) for y in event.get('skip_years', [])],
+            invalidate_years=[int(y) for y in event.get('invalidate_years', [])],
+            datasets=list(event.get('datasets') or [
+                k.strip() for k in os.environ.get('EXPORT_DATASETS', '').split(',') if k.strip()]),
+            created_at=datetime.now().isoformat(timespec='seconds'),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def specs(self):
+        return select_specs(self.datasets)
+
+    def years(self):
+        return [y for y in range(self.start_year, self.end_year + 1) if y not in self.skip_years]
+
+    def created_time(self):
+        return datetime.fromisoformat(self.created_at) if self.created_at else None
+
+    def skips(self, spec, year):
+        """この年度を取得しないか (明示的な除外 or 取得元で提供なし)"""
+        return year in self.skip_years or year in self.unavailable.get(spec.key, ())
+
+    def manifest(self, s3_client):
+        return RunManifest(s3_client, self.s3_bucket, self.run_id)
+
+
+def make_cache(s3_client, config):
+    """
+    pybaseballレスポンスキャッシュ (RESPONSE_CACHE=off で無効)
+    """
+    if os.environ.get('RESPONSE_CACHE', 'on') == 'off':
+        return None
+    return ResponseCache(s3_client, config.s3_bucket, current_season(config.end_year))
+
+
+def probe_availability(config, s3_client, cache=None):
+    """
+    対象データセットの (dataset, year) の提供状況を確定し、config.unavailable に設定
+
+    AVAILABILITY=off で確認しない (全年度を取得する)。
+
+    Returns:
+        実行サマリー用の確認結果 (無効時は None)
+    """
+    if os.environ.get('AVAILABILITY', 'on') == 'off':
+        return None
+    availability = AvailabilityCache(s3_client, config.s3_bucket).load()
+    config.unavailable = availability.check(config.specs(), config.years(),
+                                            season=current_season(config.end_year), cache=cache)
+    availability.save()
+    return availability.summary(config.unavailable)
+
+
+def plan_run(config, s3_client):
+    """
+    コーディネーター: 実行するユニットと最新のためスキップするユニットを決める
+
+    取得元で提供なしの年度はユニットにしない。
+    同じ run_id のマニフェストで完了済みのユニットは resumed に回す。
+
+    Returns:
+        {'config', 'units': [{dataset, year, refresh}], 'up_to_date': [[dataset, year]],
+         'resumed': [[dataset, year]], 'availability', 'started_at'}
+    """
+    started_at = time.time()
+    specs = config.specs()
+    availability = probe_availability(config, s3_client, make_cache(s3_client, config))
+    manifest = config.manifest(s3_client).load()
+    plan = None
+    if config.mode == 'incremental':
+        plan = plan_incremental(s3_client, config.s3_bucket, specs, config.years(),
+                                current_season(config.end_year), config.invalidate_years)
+
+    units, up_to_date, resumed = [], [], []
+    for spec in specs:
+        for year in config.years():
+            if config.skips(spec, year):
+                continue
+            if plan is not None and year not in plan.get(spec.key, ()):
+                up_to_date.append([spec.key, year])
+                continue
+            if manifest.is_done(spec.key, year):
+                resumed.append([spec.key, year])
+                continue
+            units.append({'dataset': spec.key, 'year': year,
+                          'refresh': year in config.invalidate_years})
+
+    print(f"\n[Plan] run {config.run_id}: {len(units)} units to run, {len(up_to_date)} up to date, "
+          f"{len(resumed)} already done (mode={config.mode})")
+    return {
+        'config': config.to_dict(),
+        'units': units,
+        'up_to_date': up_to_date,
+        'resumed': resumed,
+        'availability': availability,
+        'started_at': started_at,
+    }
+
+
+def run_worker(unit, config, s3_client, cache=None):
+    """
+    ワーカー: 1ユニットを実行 (例外は結果に記録し、Map 全体は止めない)
+
+    Returns:
+        {'dataset', 'year', 'records', 'files', 'change', 'error', 'duration', 'cache'}
+    """
+    spec = get_spec(unit['dataset'])
+    year = int(unit['year'])
+    own_cache = cache is None
+    if own_cache:
+        cache = make_cache(s3_client, config)
+
+    start = time.time()
+    result = {'dataset': spec.key, 'year': year, 'records': 0, 'files': [], 'error': None}
+
+    # Map のリトライ等で同じユニットが再実行された場合は記録を返すだけ
+    manifest = config.manifest(s3_client)
+    entry = manifest.get(spec.key, year)
+    if entry and entry['status'] == STATUS_DONE:
+        print(f"  ↺ [{spec.label}] {year}: already done in run {config.run_id}")
+        result.update(records=entry['rows'], files=[f['key'] for f in entry['files']],
+                      change=entry.get('change') or CHANGE_UPDATED, duration=0.0, cache=None)
+        return result
+
+    try:
+        records, files, change = run_unit(spec, s3_client, config.s3_bucket, year,
+                                          cache=cache, refresh=bool(unit.get('refresh')),
+                                          manifest=manifest, created_at=config.created_time())
+        result.update(records=records, files=files, change=change)
+        print(f"  ✓ [{spec.label}] {year}: {records} {spec.unit_name} ({len(files)} files, {change})")
+    except Exception as e:
+        result['error'] = str(e)
+        print(f"  ✗ [{spec.label}] {year}: FAILED - {e}")
+    result['duration'] = round(time.time() - start, 2)
+    # 共有キャッシュの場合は集計側で1回だけ数える
+    result['cache'] = cache.summary() if cache and own_cache else None
+    return result
+
+
+def aggregate(config, unit_results, up_to_date=(), manifest=None):
+    """
+    ワーカーの結果を run_pipeline() と同じ形に集計
+
+    manifest を渡すと、計画時点で完了済みだったユニット (plan の resumed) も計上する。
+
+    Returns:
+        ({spec.key: DatasetResult}, cache_stats or None)
+    """
+    specs = config.specs()
+    summary = {spec.key: DatasetResult() for spec in specs}
+    for spec in specs:
+        for year in range(config.start_year, config.end_year + 1):
+            if config.skips(spec, year):
+                summary[spec.key].skipped_years.append(year)
+    for key, year in up_to_date:
+        summary[key].up_to_date_years.append(year)
+
+    ran = {(r['dataset'], r['year']) for r in unit_results}
+    for entry in (manifest.done_units() if manifest else []):
+        if entry['dataset'] in summary and (entry['dataset'], entry['year']) not in ran:
+            summary[entry['dataset']].add_resumed(entry)
+
+    cache_stats = None
+    for result in unit_results:
+        totals = summary[result['dataset']]
+        if result.get('error') is None:
+            totals.records += result['records']
+            totals.files.extend(result['files'])
+            totals.completed_years.append(result['year'])
+            totals.add_change(result['year'], result.get('change') or CHANGE_UPDATED)
+        else:
+            totals.failed_years.append(result['year'])
+
+        if result.get('cache'):
+            cache_stats = cache_stats or {name: 0 for name in CACHE_COUNTERS}
+            for name in CACHE_COUNTERS:
+                cache_stats[name] += result['cache'].get(name, 0)
+
+    for totals in summary.values():
+        totals.failed_years.sort()
+        totals.completed_years.sort()
+        for change in CHANGES:
+            getattr(totals, f"{change}_years").sort()
+    if cache_stats:
+        lookups = cache_stats['local_hits'] + cache_stats['s3_hits'] + cache_stats['misses']
+        hits = cache_stats['local_hits'] + cache_stats['s3_hits']
+        cache_stats['hit_rate'] = round(hits / lookups, 3) if lookups else 0.0
+    return summary, cache_stats
+
+
+def compact_outputs(config, s3_client, results):
+    """
+    今回書き込みがあったデータセット (またはまだ全年度テーブルがないもの) をコンパクション
+    (内容が変わらず書き込まなかった年度は対象にしない)
+
+    COMPACTION=off で無効。
+
+    Returns:
+        {spec.key: stats} (対象がなければ None)
+    """
+    if os.environ.get('COMPACTION', 'on') == 'off':
+        return None
+    specs = [
+        spec for spec in config.specs()
+        if spec.compact and (results[spec.key].changed_years
+                             or head_object(s3_client, config.s3_bucket, spec.compact_key()) is None)
+    ]
+    return compact_datasets(specs, s3_client, config.s3_bucket) or None
+
+
+def player_outputs(config, s3_client):
+    """
+    選手IDを解決するデータセットを実行した場合、選手ID索引から players テーブルを書き出す
+
+    Returns:
+        {'rows', 'change'} / {'error': ...} (対象外・索引がなければ None)
+    """
+    if not any(spec.player_id_source for spec in config.specs()):
+        return None
+    try:
+        return write_players_table(PLAYERS, s3_client, config.s3_bucket, config.created_time())
+    except Exception as e:
+        print(f"  ✗ [{PLAYERS.label}] FAILED - {e}")
+        return {'error': str(e)}
+
+
+def derive_outputs(config, s3_client, results):
+    """
+    入力データセットに書き込みがあった年度 (または派生テーブルがまだない年度) の派生テーブルと
+    players テーブルを計算
+
+    DERIVED=off で派生テーブルは無効 (players テーブルは PLAYER_IDS=off で無効)。
+
+    Returns:
+        {spec.key: stats} (対象がなければ None)
+    """
+    outputs = {}
+    player_stats = player_outputs(config, s3_client)
+    if player_stats:
+        outputs[PLAYERS.key] = player_stats
+    if os.environ.get('DERIVED', 'on') == 'off':
+        return outputs or None
+    jobs = []
+    for spec in DERIVED_REGISTRY:
+        inputs = [results[key] for key in spec.inputs if key in results]
+        if not inputs:
+            continue
+        changed = {year for result in inputs for year in result.changed_years}
+        jobs.append((spec, pending_years(spec, s3_client, config.s3_bucket, changed)))
+    outputs.update(derive_datasets(jobs, s3_client, config.s3_bucket, config.created_time()))
+    return outputs or None
+
+
+def run_local(event, s3_client, max_workers=None):
+    """
+    plan → unit (プロセス内で並列) → 集計 をローカルで実行
+
+    Returns:
+        (config, {spec.key: DatasetResult}, cache_stats, availability, compaction, derived)
+    """
+    config = RunConfig.from_event(event or {}, run_id=f"local-{time.strftime('%Y%m%dT%H%M%S')}")
+    planned = plan_run(config, s3_client)
+    cache = make_cache(s3_client, config)
+
+    engine = FetchEngine(max_workers=max_workers)
+    results = engine.run([
+        WorkUnit(
+            dataset=unit['dataset'],
+            year=unit['year'],
+            source=get_spec(unit['dataset']).source,
+            func=lambda unit=unit: run_worker(unit, config, s3_client, cache=cache),
+        )
+        for unit in planned['units']
+    ])
+    unit_results = [r.value for r in results]
+    manifest = config.manifest(s3_client).load()
+    summary, _ = aggregate(config, unit_results, planned['up_to_date'], manifest)
+    manifest.finalize()
+    derived = derive_outputs(config, s3_client, summary)
+    compaction = compact_outputs(config, s3_client, summary)
+    return (config, summary, cache.summary() if cache else None, planned['availability'], compaction,
+            derived)
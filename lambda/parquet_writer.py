@@ -0,0 +1,228 @@
+"""
+ストリーミングParquetライター
+
+pyarrow.parquet.ParquetWriter で行グループ単位に書き出し、
+S3マルチパートアップロードにパート単位で流し込む。
+メモリ上に保持するのは「変換中の行グループ1つ + 未送信パート1つ」だけになる。
+
+出力がパートサイズ未満で終わった場合は通常の put_object で1回だけ送る。
+"""
+
+import hashlib
+import io
+import os
+import time
+
+DEFAULT_ROW_GROUP_ROWS = 100_000
+DEFAULT_COMPRESSION = 'snappy'
+DEFAULT_PART_SIZE_MB = 8
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3マルチパートの最小パートサイズ (最終パート除く)
+
+
+def writer_options_from_env():
+    """
+    環境変数からライター設定を取得
+    """
+    return {
+        'row_group_rows': int(os.environ.get('PARQUET_ROW_GROUP_ROWS', DEFAULT_ROW_GROUP_ROWS)),
+        'compression': os.environ.get('PARQUET_COMPRESSION', DEFAULT_COMPRESSION),
+        'use_dictionary': os.environ.get('PARQUET_DICTIONARY', 'true').lower() == 'true',
+        'part_size': max(MIN_PART_SIZE,
+                         int(os.environ.get('S3_PART_SIZE_MB', DEFAULT_PART_SIZE_MB)) * 1024 * 1024),
+    }
+
+
+class S3MultipartSink(io.RawIOBase):
+    """
+    書き込まれたバイト列をパートサイズごとにS3へアップロードするファイルライクオブジェクト
+    """
+
+    def __init__(self, s3_client, s3_bucket, s3_key, part_size, metadata=None, hash_metadata_key=None):
+        super().__init__()
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.s3_key = s3_key
+        self.part_size = part_size
+        self.metadata = metadata or {}
+        self.hash_metadata_key = hash_metadata_key
+        self.upload_id = None
+        self.parts = []
+        self.bytes_written = 0
+        self.upload_seconds = 0.0
+        self.sha256 = hashlib.sha256()
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        data = bytes(data)
+        self._buffer += data
+        self.sha256.update(data)
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def _upload_part(self, body):
+        start = time.time()
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.s3_bucket, Key=self.s3_key, Metadata=self.metadata)
+            self.upload_id = response['UploadId']
+        part_number = len(self.parts) + 1
+        response = self.s3_client.upload_part(
+            Bucket=self.s3_bucket, Key=self.s3_key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=body)
+        self.parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        self.upload_seconds += time.time() - start
+
+    def commit(self):
+        """
+        残りのバッファを送信してアップロードを確定
+
+        内容ハッシュ (hash_metadata_key) は単発 put_object の場合のみ付与できる
+        (マルチパートのメタデータは開始時に確定するため)。
+        """
+        start = time.time()
+        if self.upload_id is None:
+            metadata = dict(self.metadata)
+            if self.hash_metadata_key:
+                metadata[self.hash_metadata_key] = self.sha256.hexdigest()
+            self.s3_client.put_object(
+                Bucket=self.s3_bucket, Key=self.s3_key, Body=bytes(self._buffer),
+                Metadata=metadata)
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.s3_bucket, Key=self.s3_key, UploadId=self.upload_id,
+                MultipartUpload={'Parts': self.parts})
+        self.upload_seconds += time.time() - start
+        self._buffer = bytearray()
+
+    def abort(self):
+        if self.upload_id is not None:
+            try:
+                self.s3_client.abort_multipart_upload(
+                    Bucket=self.s3_bucket, Key=self.s3_key, UploadId=self.upload_id)
+            except Exception as e:
+                print(f"  ⚠️  Failed to abort multipart upload {self.s3_key}: {e}")
+        self._buffer = bytearray()
+
+
+class StreamingParquetWriter:
+    """
+    行グループ単位でS3に書き出すParquetライター
+
+        with StreamingParquetWriter(s3_client, bucket, key) as writer:
+            writer.write_frame(df)
+        writer.stats  # rows / row_groups / bytes / parts / sha256 / seconds / upload_seconds
+    """
+
+    def __init__(self, s3_client, s3_bucket, s3_key, schema=None, row_group_rows=None,
+                 compression=None, use_dictionary=None, part_size=None, metadata=None,
+                 hash_metadata_key=None, writer_options=None):
+        options = writer_options_from_env()
+        self.row_group_rows = row_group_rows or options['row_group_rows']
+        self.compression = compression or options['compression']
+        self.use_dictionary = options['use_dictionary'] if use_dictionary is None else use_dictionary
+        self.schema = schema
+        # ParquetWriter への追加オプション (sorting_columns / write_page_index / bloom_filter_options 等)
+        self.writer_options = writer_options or {}
+        self.sink = S3MultipartSink(s3_client, s3_bucket, s3_key,
+                                    part_size or options['part_size'], metadata, hash_metadata_key)
+        self._writer = None
+        self.rows = 0
+        self.row_groups = 0
+        self.seconds = 0.0
+        self.stats = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            if self.stats is None:
+                self.close()
+        else:
+            self.abort()
+        return False
+
+    def _open(self, schema):
+        import pyarrow.parquet as pq
+        self.schema = schema
+        self._writer = pq.ParquetWriter(
+            self.sink, schema,
+            compression=self.compression,
+            use_dictionary=self.use_dictionary,
+            write_statistics=True,
+            **self.writer_options,
+        )
+
+    def write_table(self, table):
+        """
+        Arrowテーブルを row_group_rows 行ごとの行グループで書き込み
+        """
+        start = time.time()
+        if self._writer is None:
+            self._open(self.schema or table.schema)
+        elif table.schema != self.schema:
+            table = table.cast(self.schema)
+        for offset in range(0, table.num_rows, self.row_group_rows):
+            chunk = table.slice(offset, self.row_group_rows)
+            self._writer.write_table(chunk, row_group_size=self.row_group_rows)
+            self.rows += chunk.num_rows
+            self.row_groups += 1
+        self.seconds += time.time() - start
+
+    def write_frame(self, df):
+        """
+        DataFrameを行グループ単位でArrowに変換しながら書き込み
+        (DataFrame全体のArrowコピーを作らない)
+        """
+        import pyarrow as pa
+        if self.schema is None:
+            self.schema = pa.Schema.from_pandas(df, preserve_index=False)
+        for offset in range(0, len(df), self.row_group_rows):
+            start = time.time()
+            chunk = df.iloc[offset:offset + self.row_group_rows]
+            table = pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+            self.seconds += time.time() - start
+            self.write_table(table)
+
+    def close(self):
+        """
+        フッターを書き込んでアップロードを確定し、統計を返す
+        """
+        start = time.time()
+        if self._writer is None:
+            if self.schema is None:
+                raise ValueError("No schema: nothing was written")
+            self._open(self.schema)
+        try:
+            self._writer.close()
+            self.sink.commit()
+        except Exception:
+            self.sink.abort()
+            raise
+        self.seconds += time.time() - start
+        self.stats = {
+            'rows': self.rows,
+            'row_groups': self.row_groups,
+            'bytes': self.sink.bytes_written,
+            'parts': len(self.sink.parts),
+            'multipart': self.sink.upload_id is not None,
+            'sha256': self.sink.sha256.hexdigest(),
+            # seconds は変換+送信の合計、upload_seconds はそのうちS3送信にかかった時間
+            'seconds': self.seconds,
+            'upload_seconds': self.sink.upload_seconds,
+        }
+        return self.stats
+
+    def abort(self):
+        self.sink.abort()
@@ -0,0 +1,437 @@
+"""
+players_historical へのバルクロード
+
+players_historical は season のレンジパーティションテーブル
+(1シーズン = 1パーティション: players_historical_yYYYY)。
+
+ロードモード:
+  - partition: シーズンごとに新パーティションへCOPYし、旧パーティションと DETACH/ATTACH で入れ替え
+  - upsert:    一時テーブルへCOPYし、(player_id, season, team) で INSERT ... ON CONFLICT
+               (player_id を解決できなかった行は (player_name, season, team))
+  - full:      全体をステージングテーブルに作り直して入れ替え (初回・旧形式テーブルからの移行)
+
+player_id (MLBAM ID、players.py で解決) は後から追加したカラムで、既存テーブルには
+upgrade_schema() が ALTER TABLE で追加し、一意キーも名前から player_id に移す。
+
+型変換は pandas/numpy のベクトル演算で行い、データ投入はすべて COPY FROM STDIN。
+入れ替えは1トランザクション内で行うので、読み手が空テーブルを見ることはない。
+モードごとの手順の組み立ては sinks.PostgresSink が行う。
+"""
+
+import io
+
+TABLE_NAME = 'players_historical'
+
+# (カラム名, PostgreSQL型, 変換種別)  id: 解決できなければ NULL の整数
+COLUMNS = [
+    ('player_name', 'VARCHAR(100)', 'str'),
+    ('player_id', 'INT', 'id'),
+    ('season', 'INT', 'int'),
+    ('team', 'VARCHAR(50)', 'str'),
+    ('position', 'VARCHAR(10)', 'str'),
+    ('games_played', 'INT', 'int'),
+    ('at_bats', 'INT', 'int'),
+    ('runs', 'INT', 'int'),
+    ('hits', 'INT', 'int'),
+    ('doubles', 'INT', 'int'),
+    ('triples', 'INT', 'int'),
+    ('home_runs', 'INT', 'int'),
+    ('rbi', 'INT', 'int'),
+    ('stolen_bases', 'INT', 'int'),
+    ('batting_avg', 'DECIMAL(5,3)', 'float'),
+    ('obp', 'DECIMAL(5,3)', 'float'),
+    ('slg', 'DECIMAL(5,3)', 'float'),
+    ('ops', 'DECIMAL(5,3)', 'float'),
+]
+COLUMN_NAMES = [name for name, _, _ in COLUMNS]
+
+# 一意キー (upsert の競合判定 / パーティションキー season を含む必要がある)
+KEY_COLUMNS = ('player_id', 'season', 'team')
+
+# player_id を解決できなかった行だけの一意キー
+NAME_KEY_COLUMNS = ('player_name', 'season', 'team')
+
+# (インデックス名の接尾辞, カラム, 対象行の条件)。部分一意インデックスで2つのキーを両立させる
+UNIQUE_KEYS = (
+    ('player_key', KEY_COLUMNS, 'player_id IS NOT NULL'),
+    ('name_key', NAME_KEY_COLUMNS, 'player_id IS NULL'),
+)
+
+# 以前のバージョンのインデックス (upgrade_schema で削除する)
+#   key: (player_name, season, team) の一意キー / player_idx: player_key と重複
+LEGACY_INDEXES = ('key', 'player_idx')
+
+# 作成後に追加したカラム (upgrade_schema で既存テーブルに追加する)
+ADDED_COLUMNS = ('player_id',)
+
+LOAD_MODES = ('partition', 'upsert', 'full')
+
+
+class DuplicateKeyError(ValueError):
+    """一意キーで行を区別できない (同じ player_id・ID未解決の同名選手・チーム未設定など)"""
+
+
+# ---------- スキーマ ----------
+
+def parent_ddl(table):
+    """
+    season でレンジパーティションする親テーブル
+    """
+    columns = ',\n            '.join(f"{name} {pg_type}" for name, pg_type, _ in COLUMNS)
+    return f"""
+        CREATE TABLE {table} (
+            id BIGSERIAL,
+            {columns},
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT {table}_pkey PRIMARY KEY (id, season)
+        ) PARTITION BY RANGE (season)
+    """
+
+
+def index_ddl(table):
+    """
+    親テーブル・パーティション共通のインデックス
+
+    (season, home_runs) はシーズン別サマリー (GROUP BY season の COUNT/AVG/MAX)
+    をインデックスオンリースキャンで返すためのもの。
+    player_key は選手IDでの結合・選手別の年度推移にも使う。
+    """
+    return [
+        f"CREATE UNIQUE INDEX {table}_{suffix} ON {table} ({', '.join(columns)}) WHERE {predicate}"
+        for suffix, columns, predicate in UNIQUE_KEYS
+    ] + [
+        f"CREATE INDEX {table}_season_hr_idx ON {table} (season, home_runs)",
+    ]
+
+
+def partition_name(table, season):
+    return f"{table}_y{season}"
+
+
+def relation_kind(cur, name):
+    """
+    'p' (パーティションテーブル) / 'r' (通常テーブル) / None (存在しない)
+    """
+    cur.execute("""
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema() AND c.relname = %s
+    """, (name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def create_parent(cur, table):
+    cur.execute(parent_ddl(table))
+    for ddl in index_ddl(table):
+        cur.execute(ddl)
+
+
+def create_partition_table(cur, parent, name, season):
+    """
+    ATTACH 前提の単独テーブルを作成
+
+    親と同じインデックスと season のCHECK制約を先に作っておくことで、
+    ATTACH 時の全件検証とインデックス再構築を省く。
+    """
+    cur.execute(f"CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS)")
+    cur.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_pkey PRIMARY KEY (id, season)")
+    cur.execute(f"ALTER TABLE {name} ADD CONSTRAINT {name}_season_check "
+                f"CHECK (season >= {season} AND season < {season + 1})")
+    for ddl in index_ddl(name):
+        cur.execute(ddl)
+
+
+def attach_partition(cur, parent, name, season):
+    cur.execute(f"ALTER TABLE {parent} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ({season}) TO ({season + 1})")
+
+
+def rename_prefix(cur, old_prefix, new_prefix):
+    """
+    old_prefix で始まるテーブル・インデックス・シーケンス・制約名を new_prefix に付け替え
+    """
+    cur.execute("""
+        SELECT c.relname, c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema() AND left(c.relname, %s) = %s
+        ORDER BY c.relkind DESC
+    """, (len(old_prefix), old_prefix))
+    statements = {'r': 'TABLE', 'p': 'TABLE', 'i': 'INDEX', 'I': 'INDEX', 'S': 'SEQUENCE'}
+    for relname, relkind in cur.fetchall():
+        if relkind not in statements:
+            continue
+        new_name = new_prefix + relname[len(old_prefix):]
+        cur.execute(f"ALTER {statements[relkind]} {relname} RENAME TO {new_name}")
+
+    cur.execute("""
+        SELECT t.relname, con.conname FROM pg_constraint con
+        JOIN pg_class t ON t.oid = con.conrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        WHERE n.nspname = current_schema() AND con.contype = 'c' AND left(con.conname, %s) = %s
+    """, (len(old_prefix), old_prefix))
+    for relname, conname in cur.fetchall():
+        new_name = new_prefix + conname[len(old_prefix):]
+        cur.execute(f"ALTER TABLE {relname} RENAME CONSTRAINT {conname} TO {new_name}")
+
+
+# ---------- データ ----------
+
+def coerce_frame(df):
+    """
+    COPY用に型を揃えたDataFrameを返す (ベクトル演算)
+
+    欠損カラムは既定値 ('' / 0)、数値は欠損・変換不可を 0 にする (id は NULL)。
+
+    Raises:
+        DuplicateKeyError: 一意キーが空・重複する行がある (黙って捨てると別の選手の行が消えるため)
+    """
+    import pandas as pd
+
+    out = pd.DataFrame(index=df.index)
+    for name, pg_type, kind in COLUMNS:
+        if name in df.columns:
+            column = df[name]
+        else:
+            column = pd.Series('' if kind == 'str' else None if kind == 'id' else 0, index=df.index)
+
+        if kind == 'id':
+            out[name] = pd.to_numeric(column, errors='coerce').astype('Int64')
+        elif kind == 'int':
+            out[name] = pd.to_numeric(column, errors='coerce').fillna(0).astype('int64')
+        elif kind == 'float':
+            out[name] = pd.to_numeric(column, errors='coerce').fillna(0.0).round(3)
+        else:
+            width = int(pg_type[pg_type.index('(') + 1:-1])
+            out[name] = column.where(column.notna(), '').astype(str).str.slice(0, width)
+
+    check_keys(out)
+    return out
+
+
+def check_keys(df):
+    """
+    一意キーに空の値・重複がないことを確認
+
+    player_id のある行は (player_id, season, team)、ない行は (player_name, season, team) で確認する
+    (ID があれば同名の別選手は区別できる)。
+    """
+    columns = list(dict.fromkeys(KEY_COLUMNS + NAME_KEY_COLUMNS))
+    text_keys = [name for name, _, kind in COLUMNS if name in columns and kind == 'str']
+    empty = (df[text_keys] == '').any(axis=1)
+    if empty.any():
+        raise DuplicateKeyError(f"{int(empty.sum())} rows have an empty {'/'.join(text_keys)} "
+                                f"(e.g. {df[empty].head(3)[columns].to_dict('records')})")
+    resolved = df['player_id'].notna()
+    for rows, key in ((df[resolved], KEY_COLUMNS), (df[~resolved], NAME_KEY_COLUMNS)):
+        duplicated = rows.duplicated(subset=list(key), keep=False)
+        if duplicated.any():
+            raise DuplicateKeyError(f"{int(duplicated.sum())} rows share a ({', '.join(key)}) key "
+                                    f"(e.g. {rows[duplicated].head(3)[columns].to_dict('records')})")
+
+
+def copy_frame(cur, table, df):
+    """
+    DataFrameをCSVバッファ経由で COPY FROM STDIN
+    """
+    buffer = io.StringIO()
+    df[COLUMN_NAMES].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    # 空文字を NULL にしない (NULL 同士は一意キーで競合しないため)
+    text_columns = ', '.join(name for name, _, kind in COLUMNS if kind == 'str')
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(COLUMN_NAMES)}) FROM STDIN "
+        f"WITH (FORMAT csv, FORCE_NOT_NULL ({text_columns}))",
+        buffer
+    )
+    return len(df)
+
+
+def vacuum_analyze(conn, tables):
+    """
+    インデックスオンリースキャン用に可視性マップを更新 (トランザクション外で実行)
+    """
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for table in tables:
+                cur.execute(f"VACUUM (ANALYZE) {table}")
+    finally:
+        conn.autocommit = autocommit
+
+
+# ---------- ロード手順 (シーズン単位) ----------
+#
+# 各手順は独立したトランザクションで、別コネクションから並列に呼べる。
+# 親テーブルを変更する手順は最初に親のロックを取得し、ロック昇格によるデッドロックを避ける。
+
+def table_kind(conn, table=TABLE_NAME):
+    with conn.cursor() as cur:
+        kind = relation_kind(cur, table)
+    conn.commit()
+    return kind
+
+
+def upgrade_schema(conn, table=TABLE_NAME):
+    """
+    既存のパーティションテーブルに後から追加したカラムとインデックスを作成し、以前の一意キーを削除
+    (親テーブルへの変更は全パーティションに反映される。作成済みなら何もしない)
+
+    既存の行は player_id が NULL なので名前の一意キー (name_key) の対象になり、
+    upsert で ID を解決した行が来たときに player_id が設定される (upsert_frame)。
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        for name, pg_type, _ in COLUMNS:
+            if name in ADDED_COLUMNS:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {name} {pg_type}")
+        for ddl in index_ddl(table):
+            cur.execute(ddl.replace('INDEX', 'INDEX IF NOT EXISTS', 1))
+        for suffix in LEGACY_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {table}_{suffix}")
+    conn.commit()
+
+
+def prepare_partition(conn, parent, season, frame, name=None):
+    """
+    ATTACH 前の単独テーブルにシーズン分をCOPY (コミット済みで返す)
+
+    Returns:
+        作成したテーブル名
+    """
+    name = name or f"{partition_name(parent, season)}_new"
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {name}")
+        create_partition_table(cur, parent, name, season)
+        copy_frame(cur, name, frame)
+        cur.execute(f"ANALYZE {name}")
+    conn.commit()
+    return name
+
+
+def swap_partition(conn, table, season, name):
+    """
+    準備済みテーブルを旧パーティションと DETACH/ATTACH で入れ替え
+    """
+    part = partition_name(table, season)
+    with conn.cursor() as cur:
+        cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        if relation_kind(cur, part):
+            cur.execute(f"ALTER TABLE {table} DETACH PARTITION {part}")
+            cur.execute(f"DROP TABLE {part}")
+        rename_prefix(cur, name, part)
+        attach_partition(cur, table, part, season)
+    conn.commit()
+
+
+def ensure_partitions(conn, table, seasons):
+    """
+    存在しないシーズンの空パーティションを作成
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"LOCK TABLE {table} IN SHARE UPDATE EXCLUSIVE MODE")
+        for season in seasons:
+            part = partition_name(table, season)
+            if not relation_kind(cur, part):
+                create_partition_table(cur, table, part, season)
+                attach_partition(cur, table, part, season)
+    conn.commit()
+
+
+def upsert_frame(conn, table, frame):
+    """
+    (player_id, season, team) で冪等にマージ (値が変わった行のみ更新)
+
+    player_id のない行は (player_name, season, team) でマージする。その前に
+
+      - ID のない行は、名前・シーズン・チームが一致する既存行が1行だけならその player_id を使う
+      - ID のある行は、名前・シーズン・チームが一致する ID のない既存行 (ID 追加前のロード分) に ID を設定する
+
+    ので、ID の解決状況が実行ごとに変わっても同じ選手の行が2行にならない。
+
+    Returns:
+        {'inserted', 'updated', 'unchanged'}
+    """
+    incoming = f"{table}_incoming"
+    name_key = ', '.join(NAME_KEY_COLUMNS)
+    columns = ', '.join(f"{name} {pg_type}" for name, pg_type, _ in COLUMNS)
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE {incoming} ({columns}) ON COMMIT DROP")
+        copy_frame(cur, incoming, frame)
+        cur.execute(f"""
+            UPDATE {incoming} i SET player_id = t.player_id
+            FROM (
+                SELECT {name_key}, MIN(player_id) AS player_id FROM {table}
+                WHERE player_id IS NOT NULL AND season IN (SELECT DISTINCT season FROM {incoming})
+                GROUP BY {name_key} HAVING COUNT(*) = 1
+            ) t
+            WHERE i.player_id IS NULL AND ({', '.join(f'i.{c}' for c in NAME_KEY_COLUMNS)})
+                = ({', '.join(f't.{c}' for c in NAME_KEY_COLUMNS)})
+        """)
+        adopt_columns = [c for c in COLUMN_NAMES if c not in NAME_KEY_COLUMNS]
+        cur.execute(f"""
+            UPDATE {table} t SET
+                {', '.join(f'{c} = i.{c}' for c in adopt_columns)},
+                updated_at = CURRENT_TIMESTAMP
+            FROM {incoming} i
+            WHERE t.player_id IS NULL AND i.player_id IS NOT NULL
+                AND ({', '.join(f't.{c}' for c in NAME_KEY_COLUMNS)})
+                    = ({', '.join(f'i.{c}' for c in NAME_KEY_COLUMNS)})
+        """)
+        adopted = cur.rowcount
+
+        existing = written = 0
+        for _, key, predicate in UNIQUE_KEYS:
+            value_columns = [c for c in COLUMN_NAMES if c not in key]
+            cur.execute(f"""
+                SELECT COUNT(*) FROM {incoming} i JOIN {table} t USING ({', '.join(key)})
+                WHERE i.{predicate} AND t.{predicate}
+            """)
+            existing += cur.fetchone()[0]
+            cur.execute(f"""
+                INSERT INTO {table} ({', '.join(COLUMN_NAMES)})
+                SELECT {', '.join(COLUMN_NAMES)} FROM {incoming} WHERE {predicate}
+                ON CONFLICT ({', '.join(key)}) WHERE {predicate} DO UPDATE SET
+                    {', '.join(f'{c} = EXCLUDED.{c}' for c in value_columns)},
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE ({', '.join(f'{table}.{c}' for c in value_columns)})
+                    IS DISTINCT FROM ({', '.join(f'EXCLUDED.{c}' for c in value_columns)})
+            """)
+            written += cur.rowcount
+    conn.commit()
+    inserted = len(frame) - existing
+    updated = written - inserted
+    return {'inserted': inserted, 'updated': updated + adopted,
+            'unchanged': existing - updated - adopted}
+
+
+def create_staging(conn, table=TABLE_NAME):
+    """
+    全体入れ替え用のステージング親テーブルを作り直す
+
+    Returns:
+        ステージングテーブル名
+    """
+    staging = f"{table}_staging"
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {staging} CASCADE")
+        create_parent(cur, staging)
+    conn.commit()
+    return staging
+
+
+def publish_staging(conn, table, seasons):
+    """
+    準備済みのステージングパーティションを ATTACH し、テーブル全体を入れ替え
+    (同一トランザクション内なのでコミットまで読み手は旧テーブルを見る)
+    """
+    staging = f"{table}_staging"
+    with conn.cursor() as cur:
+        for season in seasons:
+            attach_partition(cur, staging, partition_name(staging, season), season)
+        cur.execute(f"ANALYZE {staging}")
+        cur.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+        rename_prefix(cur, staging, table)
+    conn.commit()
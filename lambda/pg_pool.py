@@ -0,0 +1,144 @@
+"""
+PostgreSQL コネクションプール
+
+接続設定は環境変数 (libpq 互換の PGHOST / PGPORT / PGDATABASE / PGUSER / PGPASSWORD / PGSSLMODE)
+または PG_SECRET_ID (Secrets Manager の RDS 形式シークレット) から取得する。
+sslmode の既定は require (SSL なしの接続は許可しない)。SSL なしのローカル/CI の PostgreSQL には
+PGSSLMODE=disable を指定して接続する。
+
+プールが空のときはエラーにせず空きを待ち、接続系のエラーではそのコネクションを
+破棄して新しいコネクションで指数バックオフ付きリトライする。
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class PgConfig:
+    """接続設定"""
+    host: str
+    database: str = 'postgres'
+    user: str = 'postgres'
+    password: str = ''
+    port: int = 5432
+    sslmode: str = 'require'
+
+    @classmethod
+    def from_env(cls):
+        """
+        PG_SECRET_ID があればシークレットを、なければ PG* 環境変数を使う
+        (環境変数で個別に上書き可能)
+        """
+        values = {}
+        secret_id = os.environ.get('PG_SECRET_ID')
+        if secret_id:
+            import boto3
+            secret = json.loads(
+                boto3.client('secretsmanager').get_secret_value(SecretId=secret_id)['SecretString'])
+            values = {
+                'host': secret.get('host'),
+                'database': secret.get('dbname', 'postgres'),
+                'user': secret.get('username', 'postgres'),
+                'password': secret.get('password', ''),
+                'port': int(secret.get('port', 5432)),
+                'sslmode': 'require',
+            }
+
+        for field_name, env in (('host', 'PGHOST'), ('database', 'PGDATABASE'), ('user', 'PGUSER'),
+                                ('password', 'PGPASSWORD'), ('port', 'PGPORT'), ('sslmode', 'PGSSLMODE')):
+            if os.environ.get(env):
+                values[field_name] = int(os.environ[env]) if field_name == 'port' else os.environ[env]
+
+        if not values.get('host'):
+            raise ValueError("PostgreSQL host is not configured (set PGHOST or PG_SECRET_ID)")
+        return cls(**values)
+
+    def connect_kwargs(self):
+        return {
+            'host': self.host,
+            'dbname': self.database,
+            'user': self.user,
+            'password': self.password,
+            'port': self.port,
+            'sslmode': self.sslmode,
+        }
+
+
+class PgPool:
+    """
+    スレッドセーフなコネクションプール
+
+        pool = PgPool(PgConfig.from_env(), size=4)
+        pool.run(lambda conn: ...)   # 接続エラー時は新しいコネクションでリトライ
+        pool.close()
+    """
+
+    def __init__(self, config, size=None, retries=None, backoff=None):
+        from psycopg2.pool import ThreadedConnectionPool
+
+        self.size = size or int(os.environ.get('PG_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.retries = DEFAULT_RETRIES if retries is None else retries
+        self.backoff = DEFAULT_BACKOFF_SECONDS if backoff is None else backoff
+        self._pool = ThreadedConnectionPool(0, self.size, **config.connect_kwargs())
+        # ThreadedConnectionPool は枯渇時に例外を投げるので、空きが出るまでここで待つ
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.retry_count = 0
+
+    @contextmanager
+    def connection(self):
+        """
+        プールからコネクションを借りる
+
+        接続系のエラーで抜けた場合はコネクションを破棄し、プールには戻さない。
+        """
+        import psycopg2
+
+        with self._slots:
+            conn = self._pool.getconn()
+            broken = False
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                self._pool.putconn(conn, close=broken or bool(conn.closed))
+
+    def run(self, func):
+        """
+        func(conn) を実行 (接続系のエラーは retries 回までバックオフしてリトライ)
+        """
+        import psycopg2
+
+        for attempt in range(self.retries + 1):
+            try:
+                with self.connection() as conn:
+                    return func(conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if attempt == self.retries:
+                    raise
+                # run はプールの複数スレッドから呼ばれる
+                with self._lock:
+                    self.retry_count += 1
+                delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                print(f"  ↻ PostgreSQL connection error, retry {attempt + 1}/{self.retries} "
+                      f"in {delay:.1f}s: {str(e).strip().splitlines()[0][:80]}")
+                time.sleep(delay)
+
+    def close(self):
+        self._pool.closeall()
@@ -0,0 +1,250 @@
+"""
+データセットレジストリ駆動のエクスポートパイプライン
+
+REGISTRY の全 (dataset, year) をフェッチエンジンに投入し、
+取得 → 変換 → Parquet化 → S3保存 を1ユニットとして実行する。
+"""
+
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List
+
+import change_detection
+import metrics
+import players
+from datasets import REGISTRY
+from fetch_engine import FetchEngine, WorkUnit
+from incremental import HASH_METADATA_KEY, head_object, object_metadata
+from manifest import STATUS_DONE, STATUS_FAILED
+from parquet_writer import StreamingParquetWriter
+
+
+@dataclass
+class DatasetResult:
+    """1データセット分の集計"""
+    records: int = 0
+    failed_years: List[int] = field(default_factory=list)
+    files: List[str] = field(default_factory=list)
+    completed_years: List[int] = field(default_factory=list)
+    up_to_date_years: List[int] = field(default_factory=list)
+    resumed_years: List[int] = field(default_factory=list)
+    skipped_years: List[int] = field(default_factory=list)  # 取得元で提供なし / 明示的に除外
+    # 完了したユニットの変更状態 (change_detection)。unchanged は書き込みなし
+    new_years: List[int] = field(default_factory=list)
+    updated_years: List[int] = field(default_factory=list)
+    unchanged_years: List[int] = field(default_factory=list)
+
+    def add_change(self, year, change):
+        getattr(self, f"{change}_years").append(year)
+
+    @property
+    def changed_years(self):
+        """書き込みがあった年度 (派生テーブル・コンパクションの対象)"""
+        return sorted(self.new_years + self.updated_years)
+
+    def add_resumed(self, entry):
+        """マニフェストで完了済みのユニットを完了扱いで計上"""
+        self.records += entry['rows']
+        self.files.extend(f['key'] for f in entry['files'])
+        self.completed_years.append(entry['year'])
+        self.resumed_years.append(entry['year'])
+        # 変更状態のない旧形式の記録は書き込みありとみなす
+        self.add_change(entry['year'], entry.get('change', change_detection.CHANGE_UPDATED))
+
+
+def put_parquet(s3_client, s3_bucket, s3_key, data, fetched_at, schema_version=None, metadata=None,
+                row_group_rows=None):
+    """
+    DataFrame / Arrowテーブルを行グループ単位でParquetに変換しながらS3に保存
+
+    インクリメンタル判定用に取得時刻と内容ハッシュをメタデータに記録する
+    (マルチパートになった場合、ハッシュは開始時に確定できないため付与しない)。
+    metadata は追加のオブジェクトメタデータ。
+    """
+    is_table = hasattr(data, 'num_rows')
+    with StreamingParquetWriter(
+        s3_client, s3_bucket, s3_key,
+        schema=data.schema if is_table else None,
+        row_group_rows=row_group_rows,
+        metadata=dict(object_metadata(fetched_at, schema_version), **(metadata or {})),
+        hash_metadata_key=HASH_METADATA_KEY,
+    ) as writer:
+        if is_table:
+            writer.write_table(data)
+        else:
+            writer.write_frame(data)
+    return writer.stats
+
+
+def put_parquet_if_changed(s3_client, s3_bucket, s3_key, table, fetched_at, schema_version=None,
+                           year=None, row_group_rows=None):
+    """
+    内容 (created_at を除く) が既存オブジェクトと同じなら書き込まない (change_detection 参照)
+
+    書き込まない場合も、インクリメンタル判定に必要なメタデータ (取得時刻・スキーマ) が古ければ
+    サーバー側コピーで差し替える (内容は送らない)。実行中のユニットにはファイルと変更状態を記録する。
+
+    Returns:
+        (change, stats)  stats は書き込まなかった場合 None
+    """
+    unit = metrics.current()
+    digest = change_detection.data_digest(table, schema_version)
+    head = head_object(s3_client, s3_bucket, s3_key)
+    change = change_detection.change_status(head, digest)
+
+    if change == change_detection.CHANGE_UNCHANGED and change_detection.enabled():
+        if change_detection.needs_metadata_refresh(head, year, fetched_at, schema_version):
+            metadata = dict(head.get('Metadata', {}), **object_metadata(fetched_at, schema_version))
+            # REPLACE ではメタデータと一緒に Content-Type も置き換わるので元の値を渡す
+            headers = {'ContentType': head['ContentType']} if head.get('ContentType') else {}
+            s3_client.copy_object(Bucket=s3_bucket, Key=s3_key, Metadata=metadata,
+                                  CopySource={'Bucket': s3_bucket, 'Key': s3_key},
+                                  MetadataDirective='REPLACE', **headers)
+        unit.record_unchanged(s3_key, table.num_rows, head.get('ContentLength', 0),
+                              head.get('Metadata', {}).get(HASH_METADATA_KEY) or head.get('ETag', '').strip('"'))
+        return change, None
+
+    if change == change_detection.CHANGE_UNCHANGED:
+        change = change_detection.CHANGE_UPDATED
+    stats = put_parquet(s3_client, s3_bucket, s3_key, table, fetched_at, schema_version,
+                        metadata={change_detection.DATA_HASH_METADATA_KEY: digest},
+                        row_group_rows=row_group_rows)
+    unit.record_write(stats, s3_key, change=change)
+    return change, stats
+
+
+def export_unit(spec, s3_client, s3_bucket, year, cache=None, refresh=False, created_at=None):
+    """
+    1データセット × 1年度 を取得してS3に保存 (内容が変わっていなければ書き込まない)
+
+    created_at: 実行単位で共通の作成時刻 (未指定なら取得時刻)
+
+    Returns:
+        (record_count, [s3_key])
+    """
+    unit = metrics.current()
+    fetched_at = datetime.now()
+    with unit.stage('fetch'):
+        data = spec.fetch(year, cache=cache, refresh=refresh)
+        # 選手ID索引はプロセスで1回だけ読み込む (2回目以降はメモリ上の索引)
+        index = players.get_index(s3_client, s3_bucket) if spec.player_id_source else None
+        if index is None and spec.player_id_source and players.enabled():
+            # 索引を読み込めなかった場合は既存ファイルの ID を引き継ぐ (null で上書きしない)
+            index = players.previous_ids(s3_client, s3_bucket, spec.s3_key(year))
+    with unit.stage('transform'):
+        table = spec.conform(spec.transform(data, year, created_at or fetched_at, players=index))
+    del data
+
+    s3_key = spec.s3_key(year)
+    put_parquet_if_changed(s3_client, s3_bucket, s3_key, table, fetched_at, spec.schema_version(), year)
+    return table.num_rows, [s3_key]
+
+
+def run_unit(spec, s3_client, s3_bucket, year, cache=None, refresh=False, manifest=None,
+             created_at=None):
+    """
+    データセット独自のエクスポート処理 (spec.export) があればそちらを使う
+    (どちらもステージ別の計測値を EMF で出力し、manifest があれば結果を記録する)
+
+    Returns:
+        (record_count, [s3_key], change)
+    """
+    start = time.time()
+    with metrics.unit_metrics(spec.key, year) as unit:
+        try:
+            exporter = getattr(spec, 'export', None)
+            if exporter is not None:
+                result = exporter(s3_client, s3_bucket, year, cache=cache, refresh=refresh,
+                                  created_at=created_at)
+            else:
+                result = export_unit(spec, s3_client, s3_bucket, year, cache=cache, refresh=refresh,
+                                     created_at=created_at)
+        except Exception as e:
+            if manifest is not None:
+                manifest.record(spec.key, year, STATUS_FAILED, files=unit.files,
+                                duration=time.time() - start, error=str(e))
+            raise
+        change = change_detection.unit_change(
+            f.get('change', change_detection.CHANGE_UPDATED) for f in unit.files)
+        if manifest is not None:
+            manifest.record(spec.key, year, STATUS_DONE, files=unit.files,
+                            duration=time.time() - start, change=change)
+        return result + (change,)
+
+
+def run_pipeline(s3_client, s3_bucket, start_year, end_year, skip_years=(), specs=REGISTRY,
+                 engine=None, plan=None, cache=None, refresh_years=(), manifest=None,
+                 unavailable=None, created_at=None):
+    """
+    全 (dataset, year) を並列実行してS3に保存
+
+    Args:
+        skip_years: 全データセットで取得しない年度
+        unavailable: {spec.key: [year, ...]} 取得元で提供なしの年度 (probe_availability の結果)
+        plan: {spec.key: [year, ...]} を渡すとその年度だけ取得する (インクリメンタル)。
+              計画に含まれない年度は up_to_date_years に記録する。
+        cache: ResponseCache。refresh_years の年度はキャッシュを読まずに取得する。
+        manifest: RunManifest。完了済みのユニットは取得せずに記録を引き継ぐ。
+        created_at: 全ユニットの created_at に入れる実行時刻 (未指定なら開始時刻)
+
+    Returns:
+        {spec.key: DatasetResult}
+    """
+    engine = engine or FetchEngine()
+    created_at = created_at or datetime.now().replace(microsecond=0)
+    years = list(range(start_year, end_year + 1))
+    print(f"\n[Pipeline] {len(specs)} datasets x {len(years)} years "
+          f"(workers={engine.max_workers})")
+
+    summary = {spec.key: DatasetResult() for spec in specs}
+    by_key = {spec.key: spec for spec in specs}
+    units = []
+    for spec in specs:
+        for year in years:
+            if year in skip_years:
+                print(f"  ⊘ [{spec.label}] {year}: SKIPPED")
+                summary[spec.key].skipped_years.append(year)
+                continue
+            if year in (unavailable or {}).get(spec.key, ()):
+                print(f"  ⊘ [{spec.label}] {year}: SKIPPED (unavailable at {spec.source})")
+                summary[spec.key].skipped_years.append(year)
+                continue
+            if plan is not None and year not in plan.get(spec.key, ()):
+                summary[spec.key].up_to_date_years.append(year)
+                continue
+            if manifest is not None and manifest.is_done(spec.key, year):
+                print(f"  ↺ [{spec.label}] {year}: already done in run {manifest.run_id}")
+                summary[spec.key].add_resumed(manifest.get(spec.key, year))
+                continue
+            units.append(WorkUnit(
+                dataset=spec.key,
+                year=year,
+                source=spec.source,
+                func=lambda spec=spec, year=year: run_unit(
+                    spec, s3_client, s3_bucket, year, cache=cache, refresh=year in refresh_years,
+                    manifest=manifest, created_at=created_at),
+            ))
+
+    for result in engine.run(units):
+        spec = by_key[result.dataset]
+        totals = summary[result.dataset]
+        if result.ok:
+            record_count, s3_keys, change = result.value
+            totals.records += record_count
+            totals.files.extend(s3_keys)
+            totals.completed_years.append(result.year)
+            totals.add_change(result.year, change)
+            location = s3_keys[0] if len(s3_keys) == 1 else f"{spec.s3_key(result.year)} ({len(s3_keys)} files)"
+            print(f"  ✓ [{spec.label}] {result.year}: {record_count} {spec.unit_name} → "
+                  f"s3://{s3_bucket}/{location} ({change}, {result.duration:.1f}s)")
+        else:
+            print(f"  ✗ [{spec.label}] {result.year}: FAILED - {result.error}")
+            totals.failed_years.append(result.year)
+
+    for totals in summary.values():
+        totals.failed_years.sort()
+        totals.completed_years.sort()
+        for change in change_detection.CHANGES:
+            getattr(totals, f"{change}_years").sort()
+    return summary
@@ -0,0 +1,340 @@
+"""
+選手IDの解決 (FanGraphs ID / 名前 → MLBAM ID)
+
+pybaseball.chadwick_register() (Chadwick Bureau の選手台帳) から MLB 出場歴のある選手だけを残した
+小さな索引を作り、S3 (_state/players/register.parquet、S3 を使わない場合は /tmp) に保存して実行間で再利用する
+(PLAYER_INDEX_TTL_DAYS 日ごとに取り直す)。プロセス内では1回だけ読み込み、全データセット・全年度で共有する。
+
+  player_id = MLBAM ID (Statcast の batter / pitcher と同じ値)
+
+FanGraphs のデータは IDfg で解決し、IDfg で見つからない行は正規化した名前で解決する
+(そのシーズンに出場した同名選手が1人の場合のみ。決まらなければ null)。
+解決は pandas の map (ハッシュ引き) で列単位に行う。
+
+    index = get_index(s3_client, bucket)
+    df['player_id'] = index.resolve(fangraphs_ids=data['IDfg'], names=data['Name'], year=2024).array
+
+索引を読み込めなかった場合は、既存ファイルの player_id を名前で引き継ぐ (previous_ids)。
+null のまま書き込むと、内容の変更として解決済みの ID を上書きしてしまうため。
+
+PLAYER_IDS=off で解決しない (player_id は null)。
+"""
+
+import io
+import os
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+STATE_KEY = '_state/players/register.parquet'
+DEFAULT_LOCAL_PATH = '/tmp/.players/register.parquet'
+DEFAULT_TTL_DAYS = 7
+
+# 取得に失敗した場合、この秒数は再取得しない (ユニットごとに台帳を取りに行かないため)
+RETRY_AFTER_SECONDS = 600
+
+# 名前の末尾から除く接尾辞
+NAME_SUFFIX_PATTERN = r'\s+(jr|sr|ii|iii|iv)\.?$'
+
+_lock = threading.Lock()
+_index = None
+_loaded_at = 0.0
+_failed_at = None
+
+
+def enabled():
+    return os.environ.get('PLAYER_IDS', 'on') != 'off'
+
+
+def ttl_seconds():
+    return float(os.environ.get('PLAYER_INDEX_TTL_DAYS', DEFAULT_TTL_DAYS)) * 86400
+
+
+def normalize_names(names):
+    """
+    名前 → 照合キー (アクセント・大文字小文字・記号・空白・Jr. などの接尾辞を除く)
+
+    'J.D. Martinez' と 'J. D. Martinez'、'Ronald Acuña Jr.' と 'Ronald Acuna' は同じキーになる。
+    """
+    import pandas as pd
+
+    return (pd.Series(names, dtype='string')
+            .str.normalize('NFKD')
+            .str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.lower()
+            .str.strip()
+            .str.replace(NAME_SUFFIX_PATTERN, '', regex=True)
+            .str.replace(r'[^a-z0-9]', '', regex=True))
+
+
+def build_index_frame(register):
+    """
+    chadwick_register() の結果 → MLB 出場歴のある選手の索引 (1選手1行)
+    """
+    import pandas as pd
+
+    def ids(column):
+        values = pd.to_numeric(register[column], errors='coerce')
+        return values.where(values > 0).astype('Int64')
+
+    frame = pd.DataFrame({
+        'player_id': ids('key_mlbam'),
+        'key_fangraphs': ids('key_fangraphs'),
+        'key_bbref': register['key_bbref'].astype('string').replace('', pd.NA),
+        'name_first': register['name_first'].astype('string'),
+        'name_last': register['name_last'].astype('string'),
+        'first_year': pd.to_numeric(register['mlb_played_first'], errors='coerce').astype('Int64'),
+        'last_year': pd.to_numeric(register['mlb_played_last'], errors='coerce').astype('Int64'),
+    })
+    frame = frame[frame['player_id'].notna() & frame['first_year'].notna()]
+    return (frame.drop_duplicates('player_id')
+            .sort_values('player_id', kind='stable')
+            .reset_index(drop=True))
+
+
+class PlayerIndex:
+    """
+    MLB 選手の ID 索引 (FanGraphs ID / 名前 → MLBAM ID)
+    """
+
+    def __init__(self, frame):
+        import pandas as pd
+
+        self.frame = frame.reset_index(drop=True)
+        self.names = normalize_names(
+            self.frame['name_first'].fillna('') + ' ' + self.frame['name_last'].fillna(''))
+        fangraphs = self.frame[self.frame['key_fangraphs'].notna()].drop_duplicates('key_fangraphs')
+        self.by_fangraphs = pd.Series(fangraphs['player_id'].to_numpy(dtype='int64'),
+                                      index=fangraphs['key_fangraphs'].to_numpy(dtype='int64'))
+        self._by_name = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.frame)
+
+    def by_name(self, year=None):
+        """
+        照合キー → player_id (year を指定するとそのシーズンに出場した選手のみ。同名が複数いるキーは除く)
+        """
+        import pandas as pd
+
+        with self._lock:
+            if year not in self._by_name:
+                mask = pd.Series(True, index=self.frame.index)
+                if year is not None:
+                    mask = (self.frame['first_year'] <= year) & (self.frame['last_year'] >= year)
+                keys = self.names[mask.fillna(False).astype(bool)]
+                keys = keys[keys.notna() & (keys != '')]
+                unique = keys.map(keys.value_counts()) == 1
+                self._by_name[year] = pd.Series(
+                    self.frame.loc[keys[unique].index, 'player_id'].to_numpy(dtype='int64'),
+                    index=keys[unique].to_numpy())
+            return self._by_name[year]
+
+    def resolve(self, fangraphs_ids=None, names=None, year=None):
+        """
+        行ごとの player_id (解決できない行は <NA>)
+
+        Returns:
+            Int32 の Series (0 から始まる位置インデックス)
+        """
+        import pandas as pd
+
+        size = len(fangraphs_ids if fangraphs_ids is not None else names)
+        result = pd.Series(pd.NA, index=pd.RangeIndex(size), dtype='Int64')
+        if fangraphs_ids is not None:
+            ids = pd.to_numeric(pd.Series(fangraphs_ids).reset_index(drop=True), errors='coerce')
+            result = ids.map(self.by_fangraphs).astype('Int64')
+
+        if names is not None and result.isna().any():
+            keys = normalize_names(pd.Series(names).reset_index(drop=True))
+            # そのシーズンの出場選手で決まらなければ全期間で1人に決まる名前を使う
+            for lookup in (self.by_name(year), self.by_name()):
+                missing = result.isna()
+                if not missing.any():
+                    break
+                result[missing] = keys[missing].map(lookup).astype('Int64')
+
+        unresolved = int(result.isna().sum())
+        if unresolved and names is not None:
+            sample = list(pd.Series(names).reset_index(drop=True)[result.isna()].head(3))
+            print(f"  ⚠️  {unresolved}/{size} players not resolved to an ID (e.g. {sample})")
+        return result.astype('Int32')
+
+    def dimension(self, created_at):
+        """
+        players ディメンションテーブル用の DataFrame
+        """
+        df = self.frame.copy()
+        df['created_at'] = created_at
+        return df
+
+
+class PreviousIds:
+    """
+    既存ファイルの player_id を名前で引き継ぐ (PlayerIndex の代わりに transform へ渡す)
+
+    ファイル内で同名の選手が複数いる名前は引き継がない (null)。
+    """
+
+    def __init__(self, frame):
+        import pandas as pd
+
+        keys = normalize_names(frame['name']).reset_index(drop=True)
+        ids = pd.Series(frame['player_id']).reset_index(drop=True)
+        valid = keys.notna() & (keys != '') & ids.notna()
+        keys, ids = keys[valid], ids[valid]
+        unique = keys.map(keys.value_counts()) == 1
+        self.by_name = pd.Series(ids[unique].to_numpy(dtype='int64'), index=keys[unique].to_numpy())
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def resolve(self, fangraphs_ids=None, names=None, year=None):
+        import pandas as pd
+
+        keys = normalize_names(pd.Series(names).reset_index(drop=True))
+        return keys.map(self.by_name).astype('Int64').astype('Int32')
+
+
+def previous_ids(s3_client, s3_bucket, s3_key):
+    """
+    既存ファイルの player_id (索引を読み込めなかった場合に使う)
+
+    Returns:
+        PreviousIds (ファイルがない・player_id 列がない場合は None)
+    """
+    import pyarrow.parquet as pq
+
+    try:
+        body = s3_client.get_object(Bucket=s3_bucket, Key=s3_key)['Body'].read()
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    parquet = pq.ParquetFile(io.BytesIO(body))
+    if 'player_id' not in parquet.schema_arrow.names:
+        return None
+    frame = parquet.read(columns=['name', 'player_id']).to_pandas()
+    print(f"  ⚠️  Player index unavailable, keeping player_id from s3://{s3_bucket}/{s3_key}")
+    return PreviousIds(frame)
+
+
+def _read_s3(s3_client, s3_bucket):
+    """
+    S3 の索引 (なければ None)。Returns: (DataFrame, 保存からの経過秒)
+    """
+    import pyarrow.parquet as pq
+
+    try:
+        response = s3_client.get_object(Bucket=s3_bucket, Key=STATE_KEY)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    age = time.time() - response['LastModified'].timestamp()
+    return pq.read_table(io.BytesIO(response['Body'].read())).to_pandas(), age
+
+
+def _read_local(path):
+    import pyarrow.parquet as pq
+
+    if not os.path.exists(path):
+        return None
+    return pq.read_table(path).to_pandas(), time.time() - os.path.getmtime(path)
+
+
+def _save(frame, s3_client, s3_bucket, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    if s3_client is not None:
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression='zstd')
+        s3_client.put_object(Bucket=s3_bucket, Key=STATE_KEY, Body=buffer.getvalue())
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(table, path, compression='zstd')
+
+
+def fetch_register():
+    """
+    Chadwick の選手台帳を取得 (GitHub から ZIP をダウンロードするので数十秒かかる)
+    """
+    import pybaseball
+    from fetch_gateway import get_gateway
+
+    return get_gateway().call('chadwick', pybaseball.chadwick_register)
+
+
+def load_index_frame(s3_client=None, s3_bucket=None, path=None):
+    """
+    保存済みの索引 (TTL 以内) を読み、なければ台帳を取得して作り直す
+    (取得に失敗した場合は古い索引でも使う)
+    """
+    path = path or os.environ.get('PLAYER_INDEX_PATH', DEFAULT_LOCAL_PATH)
+    cached = _read_s3(s3_client, s3_bucket) if s3_client is not None else _read_local(path)
+    if cached is not None and cached[1] < ttl_seconds():
+        return cached[0]
+
+    try:
+        start = time.time()
+        frame = build_index_frame(fetch_register())
+    except Exception as e:
+        if cached is None:
+            raise
+        print(f"  ⚠️  Failed to refresh player register ({e}); using index from "
+              f"{cached[1] / 86400:.1f} days ago")
+        return cached[0]
+    _save(frame, s3_client, s3_bucket, path)
+    print(f"  ✓ Player register: {len(frame)} MLB players ({time.time() - start:.1f}s)")
+    return frame
+
+
+def get_index(s3_client=None, s3_bucket=None):
+    """
+    プロセスで共有する索引 (初回・TTL 経過後に読み込む)
+
+    Returns:
+        PlayerIndex (PLAYER_IDS=off・取得失敗時は None)
+    """
+    global _index, _loaded_at, _failed_at
+    if not enabled():
+        return None
+    # 初回は他のスレッドを待たせて1回だけ読み込む
+    with _lock:
+        if _index is not None and time.time() - _loaded_at < ttl_seconds():
+            return _index
+        if _failed_at is not None and time.time() - _failed_at < RETRY_AFTER_SECONDS:
+            return None
+        try:
+            _index = PlayerIndex(load_index_frame(s3_client, s3_bucket))
+        except Exception as e:
+            print(f"  ⚠️  Player index unavailable: {e}")
+            _failed_at = time.time()
+            return None
+        _loaded_at, _failed_at = time.time(), None
+        return _index
+
+
+def write_players_table(spec, s3_client, s3_bucket, created_at):
+    """
+    players ディメンションテーブルを保存 (内容が変わっていなければ書き込まない)
+
+    Returns:
+        {'rows', 'change'} (索引がなければ None)
+    """
+    from datetime import datetime
+
+    from pipeline import put_parquet_if_changed
+
+    index = get_index(s3_client, s3_bucket)
+    if index is None:
+        return None
+    table = spec.conform(index.dimension(created_at))
+    change, _ = put_parquet_if_changed(s3_client, s3_bucket, spec.table_key(), table, datetime.now(),
+                                       spec.schema_version())
+    print(f"\n[Players] {table.num_rows} players → s3://{s3_bucket}/{spec.table_key()} ({change})")
+    return {'rows': table.num_rows, 'change': change}
@@ -0,0 +1,247 @@
+"""
+pybaseballレスポンスの2層キャッシュ
+
+  L1: /tmp (コンテナ再利用時のみ有効、サイズ上限付きLRU)
+  L2: S3  (永続・全コンテナで共有)
+
+キーは (関数名, 引数) のハッシュ。値はDataFrameをParquetで保存する。
+TTL: 確定済みシーズン (シーズン確定後に保存したもの) は無期限、
+     それ以外は CACHE_CURRENT_SEASON_TTL_HOURS 時間。
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+import metrics
+from incremental import season_final_at
+
+CACHE_VERSION = 'v1'
+DEFAULT_LOCAL_DIR = '/tmp/.pybaseball-cache'
+DEFAULT_S3_PREFIX = '_cache/pybaseball'
+DEFAULT_MAX_LOCAL_MB = 512
+DEFAULT_CURRENT_SEASON_TTL_HOURS = 6
+
+CACHED_AT_METADATA_KEY = 'cached-at'
+
+
+def cache_key(func_name, args, kwargs):
+    """
+    (関数名, 引数) から決定的なキャッシュキーを生成
+    """
+    payload = json.dumps([CACHE_VERSION, func_name, list(args), kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    /tmp + S3 の2層キャッシュ (スレッドセーフ)
+    """
+
+    def __init__(self, s3_client, s3_bucket, current_season, s3_prefix=DEFAULT_S3_PREFIX,
+                 local_dir=None, max_local_bytes=None, current_season_ttl=None):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.s3_prefix = s3_prefix.rstrip('/')
+        self.current_season = current_season
+        self.local_dir = local_dir or os.environ.get('RESPONSE_CACHE_DIR', DEFAULT_LOCAL_DIR)
+        self.max_local_bytes = max_local_bytes or int(
+            os.environ.get('RESPONSE_CACHE_MAX_MB', DEFAULT_MAX_LOCAL_MB)) * 1024 * 1024
+        self.current_season_ttl = current_season_ttl or float(
+            os.environ.get('CACHE_CURRENT_SEASON_TTL_HOURS', DEFAULT_CURRENT_SEASON_TTL_HOURS)) * 3600
+
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> (path, size, cached_at)  古い順
+        self._local_bytes = 0
+        self.stats = {'local_hits': 0, 's3_hits': 0, 'misses': 0, 'expired': 0,
+                      'evictions': 0, 'errors': 0}
+        os.makedirs(self.local_dir, exist_ok=True)
+        self._scan_local()
+
+    # ---------- TTL ----------
+
+    def ttl_for(self, season, cached_at):
+        """
+        シーズンごとのTTL秒数 (None = 無期限)
+        """
+        if season is None or season >= self.current_season:
+            return self.current_season_ttl
+        if cached_at < season_final_at(season).timestamp():
+            # シーズン確定前に保存したレスポンスは確定版ではない
+            return self.current_season_ttl
+        return None
+
+    def _fresh(self, cached_at, season):
+        ttl = self.ttl_for(season, cached_at)
+        return ttl is None or time.time() - cached_at < ttl
+
+    # ---------- L1: /tmp ----------
+
+    def _scan_local(self):
+        """
+        既存の /tmp キャッシュを読み込み (ウォームスタート時)
+        ファイル名: <key>.<cached_at>.parquet / mtime = 最終アクセス時刻
+        """
+        entries = []
+        for name in os.listdir(self.local_dir):
+            parts = name.split('.')
+            if len(parts) != 3 or parts[2] != 'parquet':
+                continue
+            path = os.path.join(self.local_dir, name)
+            try:
+                st = os.stat(path)
+                entries.append((st.st_mtime, parts[0], path, st.st_size, float(parts[1])))
+            except (OSError, ValueError):
+                continue
+        for _, key, path, size, cached_at in sorted(entries):
+            self._index[key] = (path, size, cached_at)
+            self._local_bytes += size
+
+    def _local_get(self, key, season):
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            path, size, cached_at = entry
+            if not self._fresh(cached_at, season):
+                self._drop_local(key)
+                self.stats['expired'] += 1
+                return None
+            self._index.move_to_end(key)
+        try:
+            os.utime(path)
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                self._drop_local(key)
+            return None
+
+    def _local_put(self, key, body, cached_at):
+        if len(body) > self.max_local_bytes:
+            return
+        path = os.path.join(self.local_dir, f"{key}.{int(cached_at)}.parquet")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._drop_local(key)
+            self._index[key] = (path, len(body), cached_at)
+            self._local_bytes += len(body)
+            self._evict()
+
+    def _drop_local(self, key):
+        """ロック保持中に呼ぶこと"""
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        path, size, _ = entry
+        self._local_bytes -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """ロック保持中に呼ぶこと: 上限を超えた分を LRU で削除"""
+        while self._local_bytes > self.max_local_bytes and self._index:
+            key = next(iter(self._index))
+            self._drop_local(key)
+            self.stats['evictions'] += 1
+
+    # ---------- L2: S3 ----------
+
+    def _s3_key(self, key):
+        return f"{self.s3_prefix}/{key[:2]}/{key}.parquet"
+
+    def _s3_get(self, key, season):
+        try:
+            response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=self._s3_key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None, None
+            raise
+        cached_at = float(response.get('Metadata', {}).get(CACHED_AT_METADATA_KEY, 0))
+        if not self._fresh(cached_at, season):
+            with self._lock:
+                self.stats['expired'] += 1
+            return None, None
+        return response['Body'].read(), cached_at
+
+    def _s3_put(self, key, body, cached_at):
+        self.s3_client.put_object(
+            Bucket=self.s3_bucket,
+            Key=self._s3_key(key),
+            Body=body,
+            Metadata={CACHED_AT_METADATA_KEY: str(int(cached_at))}
+        )
+
+    # ---------- public ----------
+
+    def get_or_fetch(self, func_name, args, kwargs, season, fetch, refresh=False):
+        """
+        キャッシュから取得、なければ fetch() を実行して両層に保存
+
+        refresh=True の場合はキャッシュを読まずに取得し直して上書きする。
+        """
+        import pandas as pd
+
+        key = cache_key(func_name, args, kwargs)
+
+        body = None if refresh else self._local_get(key, season)
+        if body is not None:
+            with self._lock:
+                self.stats['local_hits'] += 1
+            metrics.current().count('CacheHits')
+            return pd.read_parquet(io.BytesIO(body))
+
+        if not refresh:
+            try:
+                body, cached_at = self._s3_get(key, season)
+            except Exception as e:
+                print(f"  ⚠️  Cache read failed ({func_name}{tuple(args)}): {e}")
+                body = None
+                with self._lock:
+                    self.stats['errors'] += 1
+        if body is not None:
+            with self._lock:
+                self.stats['s3_hits'] += 1
+            metrics.current().count('CacheHits')
+            try:
+                self._local_put(key, body, cached_at)
+            except OSError as e:
+                print(f"  ⚠️  Local cache write failed: {e}")
+            return pd.read_parquet(io.BytesIO(body))
+
+        with self._lock:
+            self.stats['misses'] += 1
+        metrics.current().count('CacheMisses')
+        data = fetch()
+
+        try:
+            cached_at = time.time()
+            body = data.to_parquet(index=False, engine='pyarrow')
+            self._local_put(key, body, cached_at)
+            self._s3_put(key, body, cached_at)
+        except Exception as e:
+            # シリアライズ不可な列などはキャッシュせずに返す
+            print(f"  ⚠️  Cache write failed ({func_name}{tuple(args)}): {e}")
+            with self._lock:
+                self.stats['errors'] += 1
+        return data
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['local_entries'] = len(self._index)
+            stats['local_bytes'] = self._local_bytes
+        lookups = stats['local_hits'] + stats['s3_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['local_hits'] + stats['s3_hits']) / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,284 @@
+"""
+シーズン単位の書き込み先 (シンク)
+
+取得・整形済みのシーズンごとのDataFrameを、複数のシンクへ並列に書き込む。
+
+  - PostgresSink:    players_historical (プール上の別コネクションでシーズンを並列ロード)
+  - S3ParquetSink:   <prefix>/year=YYYY/<prefix>_YYYY.parquet
+
+    sinks = [PostgresSink(pool, mode='partition'), S3ParquetSink(s3, bucket)]
+    write_seasons(sinks, {2015: df_2015, 2016: df_2016})
+
+    # 取得しながら書き込む (取得できたシーズンから順にシンクへ流す)
+    stream_seasons(sinks, range(2015, 2026), fetch_season, fetch_workers=4)
+"""
+
+import abc
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import pg_loader
+from fetch_engine import UnitResult
+from pipeline import put_parquet
+
+DEFAULT_S3_CONCURRENCY = 4
+DEFAULT_FETCH_WORKERS = 4
+
+
+class Sink(abc.ABC):
+    """
+    シンクの基底クラス
+
+    open(seasons) → write_season(season, df) (シーズンごとに並列) → close() / abort()
+    """
+    name = 'sink'
+    concurrency = 1
+
+    def open(self, seasons):
+        pass
+
+    @abc.abstractmethod
+    def write_season(self, season, df):
+        """
+        Returns:
+            書き込んだ行数
+        """
+
+    def close(self):
+        """
+        Returns:
+            シンク固有の集計 (dict)
+        """
+        return {}
+
+    def abort(self):
+        pass
+
+
+class PostgresSink(Sink):
+    """
+    players_historical へのロード
+
+    mode:
+      - partition: シーズンごとに準備テーブルへCOPY → パーティション差し替え
+      - upsert:    シーズンごとに INSERT ... ON CONFLICT
+      - full:      ステージングへシーズンごとにCOPY → close() で全体を入れ替え
+    テーブル未作成・旧形式 (非パーティション) の場合は full になる。
+    """
+    name = 'postgres'
+
+    def __init__(self, pool, mode='partition', table=pg_loader.TABLE_NAME):
+        if mode not in pg_loader.LOAD_MODES:
+            raise ValueError(f"Unknown load mode: {mode} (expected one of {pg_loader.LOAD_MODES})")
+        self.pool = pool
+        self.mode = mode
+        self.table = table
+        self.concurrency = pool.size
+        self.seasons = []
+        self.written = set()
+        self.upserted = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        self._lock = threading.Lock()
+
+    def open(self, seasons):
+        self.seasons = sorted(seasons)
+        self.written = set()
+        kind = self.pool.run(lambda conn: pg_loader.table_kind(conn, self.table))
+        if kind != 'p' and self.mode != 'full':
+            print(f"  {self.table} is {'missing' if kind is None else 'not partitioned'}; "
+                  f"running full load")
+            self.mode = 'full'
+        elif kind == 'p':
+            self.pool.run(lambda conn: pg_loader.upgrade_schema(conn, self.table))
+
+        if self.mode == 'full':
+            self.pool.run(lambda conn: pg_loader.create_staging(conn, self.table))
+        elif self.mode == 'upsert':
+            self.pool.run(lambda conn: pg_loader.ensure_partitions(conn, self.table, self.seasons))
+
+    def write_season(self, season, df):
+        frame = pg_loader.coerce_frame(df)
+        if self.mode == 'full':
+            staging = f"{self.table}_staging"
+            self.pool.run(lambda conn: pg_loader.prepare_partition(
+                conn, staging, season, frame, name=pg_loader.partition_name(staging, season)))
+        elif self.mode == 'partition':
+            def load(conn):
+                name = pg_loader.prepare_partition(conn, self.table, season, frame)
+                pg_loader.swap_partition(conn, self.table, season, name)
+            self.pool.run(load)
+        else:
+            counts = self.pool.run(lambda conn: pg_loader.upsert_frame(conn, self.table, frame))
+            with self._lock:
+                for key, value in counts.items():
+                    self.upserted[key] += value
+        with self._lock:
+            self.written.add(season)
+        return len(frame)
+
+    def close(self):
+        # 取得できなかった (書き込みのない) シーズンは公開・VACUUM の対象から外す
+        seasons = sorted(self.written)
+        if self.mode == 'full':
+            self.pool.run(lambda conn: pg_loader.publish_staging(conn, self.table, seasons))
+        self.pool.run(lambda conn: pg_loader.vacuum_analyze(
+            conn, [pg_loader.partition_name(self.table, s) for s in seasons]))
+
+        stats = {'mode': self.mode, 'retries': self.pool.retry_count}
+        if self.mode == 'upsert':
+            stats.update(self.upserted)
+        return stats
+
+    def abort(self):
+        # full モードのステージングは次回の open() で作り直されるので、旧テーブルは無変更のまま
+        pass
+
+
+class S3ParquetSink(Sink):
+    """
+    シーズンごとのParquetファイルをS3に保存
+    """
+    name = 's3'
+
+    def __init__(self, s3_client, s3_bucket, prefix=pg_loader.TABLE_NAME, concurrency=None):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.prefix = prefix
+        self.concurrency = concurrency or int(
+            os.environ.get('S3_SINK_CONCURRENCY', DEFAULT_S3_CONCURRENCY))
+        self.files = []
+
+    def s3_key(self, season):
+        return f"{self.prefix}/year={season}/{self.prefix}_{season}.parquet"
+
+    def write_season(self, season, df):
+        s3_key = self.s3_key(season)
+        # シーズン間でスキーマを揃えるため、Postgres と同じ型変換を通す
+        frame = pg_loader.coerce_frame(df)
+        put_parquet(self.s3_client, self.s3_bucket, s3_key, frame, datetime.now())
+        self.files.append(s3_key)
+        return len(frame)
+
+    def close(self):
+        return {'files': sorted(self.files)}
+
+
+def write_seasons(sinks, frames):
+    """
+    取得済みの全シーズンを各シンクへ書き込み (stream_seasons の取得なし版)
+
+    Returns:
+        {sink.name: {'rows', 'failed_seasons', ...close() の集計}}
+    """
+    summary, _ = stream_seasons(sinks, sorted(frames), frames.get, fetch_workers=1,
+                                max_buffered=len(frames) or 1)
+    return summary
+
+
+def stream_seasons(sinks, seasons, produce, fetch_workers=None, max_buffered=None):
+    """
+    シーズンの取得 (produce) と書き込みを並行に実行する producer / consumer
+
+    produce(season) → DataFrame (データなしは None) をシーズンごとに並列に呼び、
+    取得できたシーズンから全シンクへ書き込む (シンクごとの並列度で)。全シンクへの書き込みが
+    終わったフレームは破棄するので、メモリに載るのは取得中・書き込み待ちの max_buffered シーズンまで。
+
+    シンクごとに1シーズンでも書き込みに失敗した場合は close() せず abort() する
+    (full モードで欠けたテーブルを公開しないため)。取得の失敗はシンクの失敗にしない。
+
+    Returns:
+        (summary, fetch)
+          summary: {sink.name: {'rows', 'failed_seasons', ...close() の集計}}
+          fetch:   {'rows', 'seasons', 'empty_seasons', 'failed_seasons', 'seconds'}
+    """
+    seasons = sorted(seasons)
+    fetch_workers = fetch_workers or int(os.environ.get('IMPORT_FETCH_WORKERS', DEFAULT_FETCH_WORKERS))
+    max_buffered = max_buffered or fetch_workers
+    for sink in sinks:
+        sink.open(seasons)
+
+    start = time.time()
+    buffered = threading.BoundedSemaphore(max_buffered)
+    lock = threading.Lock()
+    fetch = {'rows': 0, 'seasons': [], 'empty_seasons': [], 'failed_seasons': []}
+    write_results = []
+
+    writers = {sink.name: ThreadPoolExecutor(max_workers=max(1, sink.concurrency),
+                                             thread_name_prefix=f"sink-{sink.name}")
+               for sink in sinks}
+
+    def write(sink, season, frame, remaining):
+        unit_start = time.time()
+        try:
+            result = UnitResult(sink.name, season, value=sink.write_season(season, frame),
+                                duration=time.time() - unit_start)
+        except Exception as e:
+            result = UnitResult(sink.name, season, error=str(e), duration=time.time() - unit_start)
+        if result.ok:
+            print(f"  ✓ [{result.dataset}] {result.year}: {result.value} rows ({result.duration:.1f}s)")
+        else:
+            print(f"  ✗ [{result.dataset}] {result.year}: FAILED - {result.error}")
+        with lock:
+            write_results.append(result)
+            remaining[0] -= 1
+            done = remaining[0] == 0
+        if done:
+            buffered.release()
+
+    def produce_season(season):
+        # 書き込み待ちが max_buffered を超えないよう、枠が空くまで取得を始めない
+        buffered.acquire()
+        try:
+            frame = produce(season)
+        except Exception as e:
+            buffered.release()
+            print(f"  ✗ {season}: fetch FAILED - {str(e)[:100]}")
+            with lock:
+                fetch['failed_seasons'].append(season)
+            return []
+        if frame is None or len(frame) == 0:
+            buffered.release()
+            print(f"  - {season}: no data")
+            with lock:
+                fetch['empty_seasons'].append(season)
+            return []
+
+        with lock:
+            fetch['rows'] += len(frame)
+            fetch['seasons'].append(season)
+        if not sinks:
+            buffered.release()
+            return []
+        remaining = [len(sinks)]
+        return [writers[sink.name].submit(write, sink, season, frame, remaining) for sink in sinks]
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(fetch_workers, len(seasons) or 1)),
+                                thread_name_prefix='season') as producers:
+            produced = list(producers.map(produce_season, seasons))
+        wait([future for futures in produced for future in futures])
+    finally:
+        for executor in writers.values():
+            executor.shutdown(wait=True)
+    fetch['seconds'] = round(time.time() - start, 2)
+    for key in ('seasons', 'empty_seasons', 'failed_seasons'):
+        fetch[key].sort()
+
+    summary = {sink.name: {'rows': 0, 'failed_seasons': []} for sink in sinks}
+    for result in write_results:
+        if result.ok:
+            summary[result.dataset]['rows'] += result.value
+        else:
+            summary[result.dataset]['failed_seasons'].append(result.year)
+
+    for sink in sinks:
+        totals = summary[sink.name]
+        totals['failed_seasons'].sort()
+        # 1シーズンも取得できなかった場合も公開しない (full モードで空のテーブルに入れ替えないため)
+        if totals['failed_seasons'] or not fetch['seasons']:
+            sink.abort()
+        else:
+            totals.update(sink.close())
+    return summary, fetch
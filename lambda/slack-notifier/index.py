@@ -1,75 +1,123 @@
 import json
-import urllib3
-import os
 from datetime import datetime
 
-http = urllib3.PoolManager()
+import notifications
 
-def lambda_handler(event, context):
+# 状態ごとの色と絵文字
+STATE_STYLES = {
+    'ALARM': ('danger', ':rotating_light:'),
+    'OK': ('good', ':white_check_mark:'),
+}
+DEFAULT_STYLE = ('warning', ':warning:')
+
+
+def parse_timestamp(value):
     """
-    SNSからのCloudWatchアラーム通知をSlackに転送
+    ISO 8601 (SNS) / エポックミリ秒 (SQS の SentTimestamp) → Unix timestamp
     """
-    
-    webhook_url = os.environ['SLACK_WEBHOOK_URL']
-    
-    # SNSメッセージを解析
-    sns_message = json.loads(event['Records'][0]['Sns']['Message'])
-    
-    alarm_name = sns_message.get('AlarmName', 'Unknown Alarm')
-    new_state = sns_message.get('NewStateValue', 'UNKNOWN')
-    reason = sns_message.get('NewStateReason', 'No reason provided')
-    
-    # Slackメッセージ作成
-    if new_state == 'ALARM':
-        color = 'danger'
-        emoji = ':rotating_light:'
-    elif new_state == 'OK':
-        color = 'good'
-        emoji = ':white_check_mark:'
-    else:
-        color = 'warning'
-        emoji = ':warning:'
-    
-    # タイムスタンプ処理 (ISO 8601 → Unix timestamp)
-    timestamp_str = event['Records'][0]['Sns']['Timestamp']
     try:
-        # ISO 8601形式をパース
-        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        unix_timestamp = int(dt.timestamp())
-    except:
+        if str(value).isdigit():
+            return int(value) // 1000
+        return int(datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp())
+    except Exception:
         # パース失敗時は現在時刻
-        unix_timestamp = int(datetime.now().timestamp())
-    
-    slack_message = {
-        'attachments': [{
-            'color': color,
-            'title': f'{emoji} CloudWatch Alarm: {alarm_name}',
-            'fields': [
-                {
-                    'title': 'Status',
-                    'value': new_state,
-                    'short': True
-                },
-                {
-                    'title': 'Reason',
-                    'value': reason,
-                    'short': False
-                }
-            ],
-            'footer': 'Baseball DB Monitoring',
-            'ts': unix_timestamp
-        }]
+        return int(datetime.now().timestamp())
+
+
+def parse_record(record):
+    """
+    1レコード → (アラーム通知の dict, Unix timestamp)
+
+    SNS から直接 (Records[].Sns) と、SNS → SQS 経由 (Records[].body に SNS のエンベロープ) の両方に対応
+    """
+    if 'Sns' in record:
+        message, timestamp = record['Sns']['Message'], record['Sns'].get('Timestamp')
+    else:
+        body = record['body']
+        try:
+            envelope = json.loads(body)
+        except ValueError:
+            envelope = None
+        if isinstance(envelope, dict) and 'Message' in envelope:
+            message, timestamp = envelope['Message'], envelope.get('Timestamp')
+        else:
+            # raw message delivery
+            message, timestamp = body, record.get('attributes', {}).get('SentTimestamp')
+
+    try:
+        alarm = json.loads(message)
+    except (TypeError, ValueError):
+        alarm = None
+    if not isinstance(alarm, dict):
+        alarm = {'AlarmName': 'Notification', 'NewStateValue': 'UNKNOWN', 'NewStateReason': str(message)}
+    return alarm, parse_timestamp(timestamp or '')
+
+
+def coalesce(alarms):
+    """
+    同じアラームの通知をまとめる (最新の状態を表示し、途中の遷移は Transitions に残す)
+
+    Args:
+        alarms: [(alarm, timestamp)]
+
+    Returns:
+        [(最新の alarm, timestamp, [状態, ...])] (最初に出現したアラームの順)
+    """
+    grouped = {}
+    for alarm, timestamp in sorted(alarms, key=lambda item: item[1]):
+        name = alarm.get('AlarmName', 'Unknown Alarm')
+        _, _, states = grouped.get(name, (None, None, []))
+        grouped[name] = (alarm, timestamp, states + [alarm.get('NewStateValue', 'UNKNOWN')])
+    return list(grouped.values())
+
+
+def alarm_attachment(alarm, timestamp, states):
+    alarm_name = alarm.get('AlarmName', 'Unknown Alarm')
+    new_state = alarm.get('NewStateValue', 'UNKNOWN')
+    reason = alarm.get('NewStateReason', 'No reason provided')
+    color, emoji = STATE_STYLES.get(new_state, DEFAULT_STYLE)
+
+    fields = [
+        {'title': 'Status', 'value': new_state, 'short': True},
+        {'title': 'Reason', 'value': reason, 'short': False},
+    ]
+    if len(states) > 1:
+        fields.insert(1, {'title': 'Transitions', 'value': ' → '.join(states), 'short': True})
+
+    return {
+        'color': color,
+        'title': f'{emoji} CloudWatch Alarm: {alarm_name}',
+        'fields': fields,
+        'footer': 'Baseball DB Monitoring',
+        'ts': timestamp,
     }
-    
-    # Slackに送信
-    response = http.request(
-        'POST',
-        webhook_url,
-        body=json.dumps(slack_message),
-        headers={'Content-Type': 'application/json'}
-    )
-    
+
+
+def lambda_handler(event, context):
+    """
+    CloudWatch アラーム通知を Slack に転送
+
+    SNS → SQS → この関数 (バッチ) で受け取り、バッチ内の全レコードを1つのダイジェストにまとめて送る。
+    送信に失敗した場合は SQS のレコードを全件失敗として返し、再配信させる。
+    """
+    records = event.get('Records', [])
+    alarms = [parse_record(record) for record in records]
+    attachments = [alarm_attachment(alarm, timestamp, states)
+                   for alarm, timestamp, states in coalesce(alarms)]
+
+    futures = [notifications.send(message)
+               for message in notifications.digest(attachments, title=':bell: CloudWatch Alarms')]
+    # このバッチで送ったものだけを待つ (前の呼び出しの送信は数えない)
+    result = notifications.flush(notifications.budget(context), futures)
+    print(f"{len(records)} records → {len(attachments)} alarms: {result}")
+
+    if result['failed'] or result['pending']:
+        sqs_ids = [record['messageId'] for record in records if 'messageId' in record]
+        if sqs_ids:
+            return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in sqs_ids]}
+        raise RuntimeError(f"Slack notification failed: {result}")
+
     return {
-        'statusCode': response.status,
-        'body': json.dumps('Notification sent to Slack')
-    }
\ No newline at end of file
+        'statusCode': 200,
+        'body': json.dumps(f'{len(attachments)} alarm(s) sent to Slack'),
+    }
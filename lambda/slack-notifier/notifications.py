@@ -0,0 +1,159 @@
+"""
+Slack通知 (データ取得Lambda と Slack通知Lambda で共通)
+
+  - urllib3 のコネクションプールはモジュールで1つだけ作り、ウォームスタート間でも再利用する
+  - 送信はバックグラウンドスレッドで行い、呼び出し側は待たない。
+    ハンドラーの最後に flush(budget) で残り時間の範囲だけ完了を待つ
+    (待つのはその呼び出しで送ったものだけ。時間内に終わらなかったものは次の呼び出しに持ち越さない)
+  - 複数の attachment は digest() で1メッセージにまとめる (アラームが同時に発生しても Webhook 呼び出しは1回)
+
+SLACK_WEBHOOK_URL が未設定なら何も送らない。
+ローカルでは http.server などの HTTP サーバーを SLACK_WEBHOOK_URL に指定すれば送信内容を確認できる。
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# 1リクエストのタイムアウト (接続, 読み取り)
+CONNECT_TIMEOUT_SECONDS = 2.0
+READ_TIMEOUT_SECONDS = 5.0
+
+# flush で待つ上限と、Lambda の残り時間から差し引く余裕
+DEFAULT_BUDGET_SECONDS = 10.0
+SAFETY_MARGIN_SECONDS = 1.0
+
+# 1メッセージあたりの attachments 数 (Slack の上限は 100、表示が長くなりすぎないよう抑える)
+MAX_ATTACHMENTS = 20
+
+_lock = threading.Lock()
+_http = None
+_executor = None
+_pending = []
+
+
+def http():
+    """
+    プロセスで共有する PoolManager (最初の送信時に作る)
+    """
+    global _http
+    with _lock:
+        if _http is None:
+            import urllib3
+            _http = urllib3.PoolManager(
+                num_pools=2, maxsize=4,
+                timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT_SECONDS, read=READ_TIMEOUT_SECONDS),
+                # 429 / 5xx と接続エラーは1回だけ再送する (Slack は 429 に Retry-After を返す)
+                retries=urllib3.Retry(total=1, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                                      allowed_methods=None, respect_retry_after_header=True,
+                                      raise_on_status=False))
+        return _http
+
+
+def post(message, webhook_url=None):
+    """
+    同期送信
+
+    Returns:
+        HTTP ステータス (Webhook 未設定なら None)
+    """
+    webhook_url = webhook_url or os.environ.get('SLACK_WEBHOOK_URL')
+    if not webhook_url:
+        print("⚠️  SLACK_WEBHOOK_URL not set, skipping notification")
+        return None
+    response = http().request('POST', webhook_url, body=json.dumps(message).encode('utf-8'),
+                              headers={'Content-Type': 'application/json'})
+    if response.status == 200:
+        print("✓ Slack notification sent successfully")
+    else:
+        print(f"⚠️  Slack notification failed: {response.status}")
+    return response.status
+
+
+def send(message, webhook_url=None):
+    """
+    非同期送信 (結果は flush で確認する)
+
+    Returns:
+        Future (flush(futures=[...]) に渡せる。Webhook 未設定なら None)
+    """
+    global _executor
+    webhook_url = webhook_url or os.environ.get('SLACK_WEBHOOK_URL')
+    if not webhook_url:
+        print("⚠️  SLACK_WEBHOOK_URL not set, skipping notification")
+        return None
+    with _lock:
+        if _executor is None:
+            # 送信順を保つため1スレッド
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slack')
+        future = _executor.submit(post, message, webhook_url)
+        _pending.append(future)
+    return future
+
+
+def budget(context=None, default=DEFAULT_BUDGET_SECONDS):
+    """
+    flush で待てる秒数 (Lambda の残り時間 - 余裕 と default の小さい方)
+    """
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return default
+    remaining = context.get_remaining_time_in_millis() / 1000 - SAFETY_MARGIN_SECONDS
+    return max(0.0, min(default, remaining))
+
+
+def flush(timeout=DEFAULT_BUDGET_SECONDS, futures=None):
+    """
+    送信待ちのメッセージを timeout 秒まで待つ (Lambda は返却後にスレッドが凍結されるため)
+
+    futures を渡すとそれだけを待つ (send() の戻り値。None は除く)。省略すると前回の flush 以降に
+    send() したものをすべて待つ。時間内に終わらなかったものはまだ始まっていなければ取り消し、
+    次の flush では数えない (ウォームスタートで次の呼び出しの結果に混ざらないように)。
+
+    Returns:
+        {'sent': 200 で完了, 'failed': 200 以外・例外, 'pending': 時間内に終わらなかった}
+    """
+    with _lock:
+        if futures is None:
+            futures = list(_pending)
+            _pending.clear()
+        else:
+            futures = [future for future in futures if future is not None]
+            _pending[:] = [future for future in _pending if future not in futures]
+    if not futures:
+        return {'sent': 0, 'failed': 0, 'pending': 0}
+
+    start = time.time()
+    done, not_done = wait(futures, timeout=timeout)
+    sent = 0
+    for future in done:
+        try:
+            sent += future.result() == 200
+        except Exception as e:
+            print(f"⚠️  Failed to send Slack notification: {e}")
+    if not_done:
+        cancelled = sum(future.cancel() for future in not_done)
+        print(f"⚠️  {len(not_done)} Slack notification(s) still pending after {time.time() - start:.1f}s "
+              f"({cancelled} cancelled)")
+    return {'sent': sent, 'failed': len(done) - sent, 'pending': len(not_done)}
+
+
+def digest(attachments, title=None, limit=MAX_ATTACHMENTS):
+    """
+    attachments を limit 件ずつのメッセージにまとめる (1件ならそのまま)
+
+    Returns:
+        [message, ...]
+    """
+    if not attachments:
+        return []
+    chunks = [attachments[i:i + limit] for i in range(0, len(attachments), limit)]
+    messages = []
+    for number, chunk in enumerate(chunks, 1):
+        message = {'attachments': chunk}
+        if title and len(attachments) > 1:
+            page = f" ({number}/{len(chunks)})" if len(chunks) > 1 else ""
+            message['text'] = f"{title}: {len(attachments)} notifications{page}"
+        messages.append(message)
+    return messages
@@ -0,0 +1,167 @@
+"""
+pybaseball の軽量化 (Docker ビルド時に実行)
+
+pybaseball/__init__.py は全サブモジュール (plotting → matplotlib、lahman → pygithub など) を
+読み込むため、import するだけでコールドスタートが数秒延びる。
+レジストリの fetch_func が使う関数だけを読み込む __init__.py に差し替え、
+それらから参照されないサブモジュールを削除する。
+
+    python slim_pybaseball.py /var/task            # Dockerfile から
+    python slim_pybaseball.py /var/task --dry-run  # 残す / 削除するファイルの一覧だけ表示
+
+pybaseball 本体は --no-deps で入れ、依存は requirements.txt に使う分だけを書いている。
+差し替え後に import して、不要な依存を読み込まないことを確認する (足りなければビルド失敗)。
+"""
+
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+from datasets import PLAYERS, REGISTRY
+
+# fetch_func → 定義しているサブモジュール
+FETCH_MODULES = {
+    'batting_stats': 'batting_leaders',
+    'pitching_stats': 'pitching_leaders',
+    'team_batting': 'team_batting',
+    'team_pitching': 'team_pitching',
+    'team_fielding': 'team_fielding',
+    'statcast': 'statcast',
+    'chadwick_register': 'playerid_lookup',
+}
+
+# 差し替え後に読み込まれていないことを確認するパッケージ
+EXCLUDED_PACKAGES = ('matplotlib', 'scipy', 'github')
+
+INIT_HEADER = "# slim_pybaseball.py で生成 (このイメージで使う関数のみ)\n"
+
+
+def module_path(package_dir, module):
+    """
+    'pybaseball.datasources.fangraphs' → ファイルパス (パッケージなら __init__.py)
+    """
+    path = os.path.join(os.path.dirname(package_dir), *module.split('.'))
+    if os.path.isdir(path):
+        return os.path.join(path, '__init__.py')
+    if os.path.exists(path + '.py'):
+        return path + '.py'
+    return None
+
+
+def imported_modules(path, module):
+    """
+    1ファイル内の import 文 (関数内を含む) が参照する pybaseball.* のモジュール名
+    """
+    package = module if path.endswith('__init__.py') else module.rpartition('.')[0]
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                base = package.split('.')[:len(package.split('.')) - node.level + 1]
+                base = '.'.join(base + ([node.module] if node.module else []))
+            else:
+                base = node.module
+            names.append(base)
+            # from .x import y の y がサブモジュールの場合もある
+            names.extend(f"{base}.{alias.name}" for alias in node.names)
+    return [name for name in names if name.startswith('pybaseball.')]
+
+
+def required_modules(package_dir, roots):
+    """
+    roots から import で辿れる pybaseball のサブモジュール (親パッケージを含む、トップの __init__ は除く)
+    """
+    seen = set()
+    stack = [f"pybaseball.{root}" for root in roots]
+    while stack:
+        module = stack.pop()
+        if module in seen:
+            continue
+        path = module_path(package_dir, module)
+        if path is None:
+            continue  # モジュールではなく関数・クラス名
+        seen.add(module)
+        for name in imported_modules(path, module):
+            parts = name.split('.')
+            stack.extend('.'.join(parts[:i]) for i in range(2, len(parts) + 1))
+    return seen
+
+
+def render_init(functions):
+    lines = [INIT_HEADER]
+    lines.extend(f"from .{FETCH_MODULES[func]} import {func}\n" for func in functions)
+    return ''.join(lines)
+
+
+def slim(target, dry_run=False):
+    package_dir = os.path.join(target, 'pybaseball')
+    # 選手ID索引 (players.py) の台帳も取得する
+    functions = sorted({spec.fetch_func for spec in REGISTRY + (PLAYERS,) if spec.fetch_func})
+    unknown = [func for func in functions if func not in FETCH_MODULES]
+    if unknown:
+        raise SystemExit(f"✗ Add the pybaseball module of {unknown} to FETCH_MODULES")
+
+    keep = required_modules(package_dir, sorted({FETCH_MODULES[func] for func in functions}))
+    keep_paths = {module_path(package_dir, module) for module in keep}
+    keep_paths.add(os.path.join(package_dir, '__init__.py'))
+
+    removed = []
+    for dirpath, dirnames, filenames in os.walk(package_dir):
+        if '__pycache__' in dirnames:
+            dirnames.remove('__pycache__')
+            removed.append(os.path.join(dirpath, '__pycache__'))
+        removed.extend(os.path.join(dirpath, name) for name in filenames
+                       if name.endswith('.py') and os.path.join(dirpath, name) not in keep_paths)
+
+    print(f"pybaseball: keeping {len(keep_paths)} modules for {', '.join(functions)}; "
+          f"removing {len(removed)} files")
+    if dry_run:
+        for path in sorted(removed):
+            print(f"  - {os.path.relpath(path, target)}")
+        return
+
+    for path in removed:
+        if os.path.isdir(path):
+            import shutil
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    with open(os.path.join(package_dir, '__init__.py'), 'w', encoding='utf-8') as f:
+        f.write(render_init(functions))
+    verify(target, functions)
+
+
+def verify(target, functions):
+    """
+    新しいプロセスで import し、全関数が使えて不要な依存を読み込まないことを確認
+    """
+    code = (
+        "import sys, pybaseball\n"
+        f"missing = [f for f in {functions!r} if not callable(getattr(pybaseball, f, None))]\n"
+        f"loaded = [p for p in {EXCLUDED_PACKAGES!r} if p in sys.modules]\n"
+        "assert not missing, f'missing functions: {missing}'\n"
+        "assert not loaded, f'unexpected imports: {loaded}'\n"
+    )
+    env = dict(os.environ, PYTHONPATH=target, PYBASEBALL_CACHE='/tmp/.pybaseball')
+    subprocess.run([sys.executable, '-c', code], check=True, env=env, cwd=target)
+    print("✓ pybaseball imports cleanly")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Strip pybaseball down to the modules this image uses')
+    parser.add_argument('target', help='directory pybaseball was installed into (--target)')
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+    slim(args.target, dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
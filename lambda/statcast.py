@@ -0,0 +1,190 @@
+"""
+Statcast (投球単位) データの取得
+
+1シーズンを月内に収まる日付ウィンドウに分割し、フェッチエンジンで並列取得する。
+ウィンドウごとに statcast/year=YYYY/month=MM/ 配下へ1ファイルとして書き出し、
+完了したウィンドウを _state/statcast/year=YYYY/progress.json に記録する。
+タイムアウト等で中断しても、次回実行は未完了のウィンドウから再開する。
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from botocore.exceptions import ClientError
+
+import metrics
+from fetch_engine import FetchEngine, WorkUnit
+from fetch_gateway import get_gateway
+from pipeline import put_parquet_if_changed
+
+STATE_PREFIX = '_state'
+
+# 試合日からこの日数が経過した後に取得したデータを確定版とみなす
+SETTLE_DAYS = 3
+
+DEFAULT_STATCAST_CONCURRENCY = 4
+
+
+def season_windows(spec, year, today=None):
+    """
+    シーズンを [start, end] の日付ウィンドウに分割 (月をまたがない)
+    """
+    today = today or date.today()
+    start = date(year, *spec.season_start)
+    end = min(date(year, *spec.season_end), today)
+
+    windows = []
+    while start <= end:
+        next_month = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+        window_end = min(start + timedelta(days=spec.window_days - 1),
+                         next_month - timedelta(days=1), end)
+        windows.append((start, window_end))
+        start = window_end + timedelta(days=1)
+    return windows
+
+
+def window_id(start, end):
+    return f"{start.isoformat()}_{end.isoformat()}"
+
+
+class SeasonProgress:
+    """
+    シーズン内の完了ウィンドウ記録 (S3上のJSON)
+    """
+
+    def __init__(self, s3_client, s3_bucket, spec, year):
+        self.s3_client = s3_client
+        self.s3_bucket = s3_bucket
+        self.key = f"{STATE_PREFIX}/{spec.prefix}/year={year}/progress.json"
+        self.schema_version = spec.schema_version()
+        self._lock = threading.Lock()
+        self.windows = self._load()
+
+    def _load(self):
+        try:
+            response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=self.key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return {}
+            raise
+        return json.loads(response['Body'].read()).get('windows', {})
+
+    def is_done(self, start, end):
+        """
+        記録済みかつ確定後に取得し、現在のスキーマで書いたウィンドウなら完了
+        """
+        entry = self.windows.get(window_id(start, end))
+        if not entry or entry.get('schema') != self.schema_version:
+            return False
+        fetched_at = datetime.fromisoformat(entry['fetched_at']).date()
+        return fetched_at >= end + timedelta(days=SETTLE_DAYS)
+
+    def mark_done(self, start, end, rows, s3_key, fetched_at):
+        """
+        ウィンドウ完了を記録して即座に保存 (中断時の再開ポイント)
+        """
+        with self._lock:
+            self.windows[window_id(start, end)] = {
+                'rows': rows,
+                'key': s3_key,
+                'fetched_at': fetched_at.isoformat(timespec='seconds'),
+                'schema': self.schema_version,
+            }
+            body = json.dumps({'windows': self.windows}, indent=1, sort_keys=True)
+            self.s3_client.put_object(Bucket=self.s3_bucket, Key=self.key,
+                                      Body=body.encode('utf-8'), ContentType='application/json')
+
+
+def export_window(spec, s3_client, s3_bucket, start, end, progress, created_at=None):
+    """
+    1ウィンドウを取得してParquetで保存
+
+    Returns:
+        (record_count, s3_key or None)
+    """
+    import pybaseball
+
+    unit = metrics.current()
+    fetched_at = datetime.now()
+    with unit.stage('fetch'):
+        data = get_gateway().call(
+            spec.source, getattr(pybaseball, spec.fetch_func),
+            start_dt=start.isoformat(), end_dt=end.isoformat(), **spec.fetch_kwargs)
+
+    if data is None or len(data) == 0:
+        progress.mark_done(start, end, 0, None, fetched_at)
+        return 0, None
+
+    # 古いシーズンに存在しないカラムは null で補う
+    for column in spec.columns:
+        if column.source not in data.columns:
+            data[column.source] = None
+
+    with unit.stage('transform'):
+        df = spec.transform(data, start.year, created_at or fetched_at)
+        sort_by = [c for c in spec.sort_by if c in df.columns]
+        if sort_by:
+            # 行グループの min/max 統計が日付・試合で効くように並べる
+            df = df.sort_values(sort_by, kind='stable')
+        table = spec.conform(df)
+    del data, df
+
+    # 確定前に取得し直したウィンドウは内容が同じことが多いので、変わっていなければ書き込まない
+    s3_key = spec.window_key(start, end)
+    put_parquet_if_changed(s3_client, s3_bucket, s3_key, table, fetched_at, progress.schema_version,
+                           row_group_rows=spec.row_group_rows)
+
+    progress.mark_done(start, end, table.num_rows, s3_key, fetched_at)
+    return table.num_rows, s3_key
+
+
+def export_season(spec, s3_client, s3_bucket, year, engine=None, refresh=False, created_at=None, **_):
+    """
+    1シーズン分のStatcastデータを未完了ウィンドウだけ並列取得 (refresh=True: 全ウィンドウ)
+
+    Returns:
+        (record_count, [s3_key, ...])
+    """
+    progress = SeasonProgress(s3_client, s3_bucket, spec, year)
+    windows = season_windows(spec, year)
+    pending = [(s, e) for s, e in windows if refresh or not progress.is_done(s, e)]
+    print(f"  [{spec.label}] {year}: {len(pending)}/{len(windows)} windows pending")
+    if not pending:
+        return 0, []
+
+    limit = int(os.environ.get('STATCAST_CONCURRENCY', DEFAULT_STATCAST_CONCURRENCY))
+    engine = engine or FetchEngine(max_workers=limit, source_limits={spec.source: limit})
+    unit = metrics.current()
+
+    def run_window(start, end):
+        # ウィンドウはエンジンの別スレッドで動くので、シーズン単位の計測に引き継ぐ
+        # (並列ウィンドウのステージ時間は合算されるため UnitTime を超えうる)
+        with metrics.bind(unit):
+            return export_window(spec, s3_client, s3_bucket, start, end, progress, created_at)
+
+    results = engine.run([
+        WorkUnit(
+            dataset=spec.key,
+            year=year,
+            source=spec.source,
+            func=lambda s=s, e=e: run_window(s, e),
+        )
+        for s, e in pending
+    ])
+
+    total, keys, failed = 0, [], []
+    for (s, e), result in zip(pending, results):
+        if result.ok:
+            rows, s3_key = result.value
+            total += rows
+            if s3_key:
+                keys.append(s3_key)
+        else:
+            failed.append(f"{window_id(s, e)}: {result.error}")
+
+    if failed:
+        # 完了分は記録済みなので、次回実行で失敗ウィンドウのみ再取得される
+        raise RuntimeError(f"{len(failed)} statcast window(s) failed: {failed[:3]}")
+    return total, keys
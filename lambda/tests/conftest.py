@@ -0,0 +1,47 @@
+"""
+テスト共通の設定
+
+pybaseball はテストでは読み込まない (取得関数はテストごとに偽物を差し込む)。
+S3 は moto、Postgres は PG* 環境変数がある場合のみ使う。
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+# Lambda の既定値のうち、テストでネットワークや CloudWatch に出ないようにするもの
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-northeast-1')
+os.environ.setdefault('METRICS', 'off')
+os.environ.pop('SLACK_WEBHOOK_URL', None)
+
+
+@pytest.fixture
+def aws_credentials(monkeypatch):
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'ap-northeast-1')
+
+
+@pytest.fixture
+def s3(aws_credentials):
+    """moto の S3 クライアントとバケット名"""
+    import boto3
+    from moto import mock_aws
+
+    with mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket='test-bucket',
+                             CreateBucketConfiguration={'LocationConstraint': 'ap-northeast-1'})
+        yield client, 'test-bucket'
+
+
+@pytest.fixture
+def fake_pybaseball(monkeypatch):
+    """
+    sys.modules に空の pybaseball を差し込む (テストで取得関数を setattr する)
+    """
+    module = types.ModuleType('pybaseball')
+    monkeypatch.setitem(sys.modules, 'pybaseball', module)
+    return module
@@ -0,0 +1,40 @@
+"""
+テスト用の取得結果 (pybaseball の戻り値と同じカラム名の小さな DataFrame)
+"""
+
+import pandas as pd
+
+TEAM_COLUMNS = ('G', 'AB', 'H', 'HR', 'RBI', 'AVG', 'OBP', 'SLG', 'wRC+', 'WAR', 'PA',
+                '1B', '2B', '3B', 'BB', 'IBB', 'HBP', 'SF', 'SO')
+BATTING_COLUMNS = ('G', 'AB', 'R', 'H', 'HR', 'RBI', 'SB', 'AVG', 'PA', '1B', '2B', '3B',
+                   'BB', 'IBB', 'HBP', 'SF', 'SO')
+
+
+class StubFetcher:
+    """年度ごとの固定データを返す取得関数 (呼び出しを記録し、fail_years は例外にする)"""
+
+    def __init__(self, frame, fail_years=()):
+        self.frame = frame
+        self.fail_years = set(fail_years)
+        self.calls = []
+
+    def __call__(self, start_season, end_season=None, **kwargs):
+        self.calls.append(start_season)
+        if start_season in self.fail_years:
+            raise ValueError(f"Error parsing table for {start_season}")
+        return self.frame(start_season)
+
+
+def team_frame(year):
+    data = {'teamIDfg': range(1, 4), 'Season': [year] * 3, 'Team': ['NYY', 'BOS', 'LAD']}
+    for i, column in enumerate(TEAM_COLUMNS):
+        data[column] = [i + year % 100] * 3
+    return pd.DataFrame(data)
+
+
+def batting_frame(year):
+    data = {'IDfg': range(1000, 1005), 'Name': [f"Player {i}" for i in range(5)],
+            'Team': ['NYY', 'BOS', 'LAD', 'NYY', 'BOS'], 'Season': [year] * 5}
+    for i, column in enumerate(BATTING_COLUMNS):
+        data[column] = [0.3 if column == 'AVG' else i + 10] * 5
+    return pd.DataFrame(data)
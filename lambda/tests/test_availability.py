@@ -0,0 +1,118 @@
+"""
+データセットの年度別提供状況の確認のテスト (取得関数は偽の pybaseball、保存先は moto の S3)
+"""
+
+import time
+
+import pandas as pd
+import pytest
+
+from availability import STATE_KEY, AvailabilityCache, savant_probe_dates
+from datasets import get_spec
+from sample_data import StubFetcher, batting_frame, team_frame
+
+HOUR = 3600
+
+
+class StubStatcast:
+    """opening_day より前の日は空を返す statcast()"""
+
+    def __init__(self, opening_day):
+        self.opening_day = opening_day
+        self.calls = []
+
+    def __call__(self, start_dt, end_dt, **kwargs):
+        self.calls.append(start_dt)
+        if start_dt < self.opening_day:
+            return pd.DataFrame()
+        return pd.DataFrame({'game_date': [start_dt], 'pitch_number': [1]})
+
+
+@pytest.fixture
+def probes(s3, fake_pybaseball, monkeypatch):
+    import fetch_gateway
+
+    monkeypatch.setattr(fetch_gateway, '_gateway', None)
+    monkeypatch.setenv('FETCH_RETRIES', '0')
+    monkeypatch.setenv('FETCH_RATE_LIMITS', 'fangraphs=100,baseball_savant=100')
+    # 2022 年は選手成績だけ取得できない (チーム成績は取得できる)
+    fake_pybaseball.team_batting = StubFetcher(team_frame)
+    fake_pybaseball.batting_stats = StubFetcher(batting_frame, fail_years={2022})
+    fake_pybaseball.statcast = StubStatcast(opening_day='2020-07-23')
+    return s3, fake_pybaseball
+
+
+def test_check_probes_each_dataset_with_its_own_fetch(probes):
+    (client, bucket), pybaseball = probes
+    specs = [get_spec('team_batting'), get_spec('batting')]
+    availability = AvailabilityCache(client, bucket).load()
+
+    unavailable = availability.check(specs, [2021, 2022, 2023], season=2023)
+    availability.save()
+
+    assert unavailable == {'batting': [2022]}
+    assert sorted(pybaseball.team_batting.calls) == [2021, 2022]
+    assert sorted(pybaseball.batting_stats.calls) == [2021, 2022]
+    assert availability.stats == {'cached': 0, 'probed': 4, 'unknown': 0}
+    assert availability.summary(unavailable)['unavailable']['batting']['2022'].startswith('ValueError')
+    assert client.head_object(Bucket=bucket, Key=STATE_KEY)['ContentType'] == 'application/json'
+
+
+def test_savant_probe_checks_dates_across_the_season(probes):
+    (client, bucket), pybaseball = probes
+    spec = get_spec('statcast')
+
+    # 2020 年は 7/23 開幕 (7/15 までは空でも提供あり)
+    unavailable = AvailabilityCache(client, bucket).check([spec], [2020], season=2024)
+
+    assert unavailable == {}
+    assert pybaseball.statcast.calls == ['2020-03-15', '2020-04-15', '2020-05-15', '2020-06-15',
+                                         '2020-07-15', '2020-08-15']
+
+    # どの日も空なら提供なし
+    pybaseball.statcast.opening_day = '2099-01-01'
+    unavailable = AvailabilityCache(client, bucket).check([spec], [2019], season=2024)
+    assert unavailable == {'statcast': [2019]}
+    assert len(savant_probe_dates(spec, 2019)) == 9
+
+
+def test_check_uses_saved_results_until_ttl_and_recheck(probes):
+    (client, bucket), pybaseball = probes
+    specs = [get_spec('batting')]
+    availability = AvailabilityCache(client, bucket, ttl=30 * 24 * HOUR, recheck=7 * 24 * HOUR).load()
+    availability.check(specs, [2021, 2022], season=2024)
+    availability.save()
+    pybaseball.batting_stats.calls.clear()
+
+    # 保存した結果を読み直す (期限内なので確認しない)
+    availability = AvailabilityCache(client, bucket, ttl=30 * 24 * HOUR, recheck=7 * 24 * HOUR).load()
+    assert availability.check(specs, [2021, 2022], season=2024) == {'batting': [2022]}
+    assert pybaseball.batting_stats.calls == []
+    assert availability.stats['cached'] == 2
+
+    # 8日後: 提供なしの 2022 年だけ再確認し、提供されるようになっていれば取得対象に戻す
+    for entry in availability.entries.values():
+        entry['checked_at'] -= 8 * 24 * HOUR
+    pybaseball.batting_stats.fail_years = set()
+    assert availability.check(specs, [2021, 2022], season=2024) == {}
+    assert pybaseball.batting_stats.calls == [2022]
+
+    # 31日後: 提供ありも TTL 切れで再確認する
+    for entry in availability.entries.values():
+        entry['checked_at'] = time.time() - 31 * 24 * HOUR
+    pybaseball.batting_stats.calls.clear()
+    availability.check(specs, [2021, 2022], season=2024)
+    assert sorted(pybaseball.batting_stats.calls) == [2021, 2022]
+
+
+def test_transient_errors_are_not_saved(probes):
+    (client, bucket), pybaseball = probes
+
+    def timing_out(*args, **kwargs):
+        raise TimeoutError('read timed out')
+
+    pybaseball.batting_stats = timing_out
+    availability = AvailabilityCache(client, bucket)
+
+    assert availability.check([get_spec('batting')], [2021], season=2024) == {}
+    assert availability.stats['unknown'] == 1 and availability.entries == {}
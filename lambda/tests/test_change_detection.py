@@ -0,0 +1,49 @@
+"""
+内容ハッシュによる変更検出のテスト (S3 は moto)
+"""
+
+from datetime import datetime
+
+import pyarrow as pa
+
+from change_detection import CHANGE_NEW, CHANGE_UNCHANGED, CHANGE_UPDATED, DATA_HASH_METADATA_KEY
+from incremental import FETCHED_AT_METADATA_KEY
+from pipeline import put_parquet_if_changed
+
+KEY = 'team_batting_stats/year=2016/team_batting.parquet'
+PARQUET_TYPE = 'application/vnd.apache.parquet'
+
+
+def frame(hr, created_at):
+    return pa.table({'Team': ['NYY', 'BOS'], 'HR': pa.array(hr, pa.int16()),
+                     'created_at': pa.array([created_at] * 2, pa.timestamp('us'))})
+
+
+def test_unchanged_frame_skips_put_and_changed_frame_writes(s3):
+    client, bucket = s3
+    change, stats = put_parquet_if_changed(client, bucket, KEY, frame([200, 180], datetime(2016, 9, 1)),
+                                           datetime(2016, 9, 1), 'v1', year=2016)
+    assert change == CHANGE_NEW and stats['rows'] == 2
+    # 別のツールで Content-Type を付けたオブジェクト
+    client.copy_object(Bucket=bucket, Key=KEY, CopySource={'Bucket': bucket, 'Key': KEY},
+                       Metadata=client.head_object(Bucket=bucket, Key=KEY)['Metadata'],
+                       MetadataDirective='REPLACE', ContentType=PARQUET_TYPE)
+    before = client.get_object(Bucket=bucket, Key=KEY)['Body'].read()
+
+    # created_at だけ違う (内容は同じ) → PUT しない。シーズン確定後の取得なのでメタデータだけ差し替える
+    change, stats = put_parquet_if_changed(client, bucket, KEY, frame([200, 180], datetime(2017, 1, 5)),
+                                           datetime(2017, 1, 5), 'v1', year=2016)
+
+    assert (change, stats) == (CHANGE_UNCHANGED, None)
+    response = client.get_object(Bucket=bucket, Key=KEY)
+    assert response['Body'].read() == before
+    assert response['ContentType'] == PARQUET_TYPE
+    assert response['Metadata'][FETCHED_AT_METADATA_KEY].startswith('2017-01-05')
+
+    # 内容が変わった → 書き込む
+    digest = response['Metadata'][DATA_HASH_METADATA_KEY]
+    change, stats = put_parquet_if_changed(client, bucket, KEY, frame([201, 180], datetime(2017, 1, 6)),
+                                           datetime(2017, 1, 6), 'v1', year=2016)
+
+    assert change == CHANGE_UPDATED and stats['rows'] == 2
+    assert client.head_object(Bucket=bucket, Key=KEY)['Metadata'][DATA_HASH_METADATA_KEY] != digest
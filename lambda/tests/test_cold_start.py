@@ -0,0 +1,85 @@
+"""
+コールドスタート対策のテスト
+
+  - baseball_lambda の import と plan / ping では pandas / pyarrow / pybaseball を読み込まない
+    (新しいプロセスで確認する。S3 は moto)
+  - slim_pybaseball は使う関数から辿れるサブモジュールだけを残す
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from datasets import PLAYERS, REGISTRY
+from measure_cold_start import HEAVY_MODULES
+from slim_pybaseball import EXCLUDED_PACKAGES, FETCH_MODULES, slim
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PLAN_CODE = textwrap.dedent(f"""
+    import json, sys
+    from moto import mock_aws
+
+    with mock_aws():
+        import boto3
+        boto3.client('s3').create_bucket(Bucket='test-bucket', CreateBucketConfiguration={{
+            'LocationConstraint': 'ap-northeast-1'}})
+        import baseball_lambda
+        loaded = {{'import': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}
+        assert baseball_lambda.lambda_handler({{'action': 'ping'}}, None)['statusCode'] == 200
+        planned = baseball_lambda.lambda_handler(
+            {{'action': 'plan', 'request': {{'mode': 'incremental'}}, 'execution': 'cold'}}, None)
+        loaded['plan'] = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+    print(json.dumps({{'loaded': loaded, 'units': len(planned['units'])}}))
+""")
+
+
+def test_import_and_plan_do_not_load_heavy_modules(aws_credentials):
+    env = dict(os.environ, S3_BUCKET='test-bucket', START_YEAR='2015', END_YEAR='2016',
+               AVAILABILITY='off', RESPONSE_CACHE='off', METRICS='off',
+               PYTHONPATH=os.pathsep.join([LAMBDA_DIR, os.path.join(LAMBDA_DIR, 'slack-notifier')]))
+    env.pop('SLACK_WEBHOOK_URL', None)
+    output = subprocess.run([sys.executable, '-c', PLAN_CODE], env=env, cwd=LAMBDA_DIR,
+                            capture_output=True, text=True, check=True).stdout
+
+    result = json.loads(output.strip().splitlines()[-1])
+    assert result['loaded'] == {'import': [], 'plan': []}
+    # 空のバケットなので全ユニットが取得対象
+    default_specs = [spec for spec in REGISTRY if spec.enabled_by_default]
+    assert result['units'] == 2 * len(default_specs)
+
+
+def write_module(root, module, source):
+    path = os.path.join(root, *module.split('.')) + '.py'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(textwrap.dedent(source))
+
+
+def test_slim_keeps_only_modules_reachable_from_fetch_functions(tmp_path):
+    target = str(tmp_path)
+    functions = sorted({spec.fetch_func for spec in REGISTRY + (PLAYERS,)})
+    modules = sorted(set(FETCH_MODULES.values()))
+    # 本物と同じく __init__ が全サブモジュール (描画 → matplotlib を含む) を読み込む偽の pybaseball
+    write_module(target, 'pybaseball.__init__', ''.join(
+        f"from .{FETCH_MODULES[func]} import {func}\n" for func in functions) + "from .plotting import plot\n")
+    for module in modules:
+        funcs = [func for func in functions if FETCH_MODULES[func] == module]
+        write_module(target, f"pybaseball.{module}",
+                     "from .datasources.fangraphs import fetch\n"
+                     + ''.join(f"def {func}(*args, **kwargs):\n    return fetch()\n" for func in funcs))
+    write_module(target, 'pybaseball.datasources.__init__', '')
+    write_module(target, 'pybaseball.datasources.fangraphs', "def fetch():\n    return []\n")
+    write_module(target, 'pybaseball.datasources.bref', "import scipy\n")
+    write_module(target, 'pybaseball.plotting', f"import {EXCLUDED_PACKAGES[0]}\ndef plot():\n    pass\n")
+
+    # 差し替え後に新しいプロセスで import できなければ例外になる
+    slim(target)
+
+    package = tmp_path / 'pybaseball'
+    remaining = sorted(str(p.relative_to(package)) for p in package.rglob('*.py'))
+    assert remaining == sorted(['__init__.py', 'datasources/__init__.py', 'datasources/fangraphs.py']
+                               + [f"{module}.py" for module in modules])
+    assert 'plotting' not in (package / '__init__.py').read_text()
@@ -0,0 +1,95 @@
+"""
+全年度コンパクションのテスト (S3 は moto)
+"""
+
+import io
+from datetime import datetime
+
+import pyarrow.parquet as pq
+import pytest
+
+import compaction
+from compaction import CompactionUnsupportedError, compact_dataset
+from datasets import get_spec
+from sample_data import batting_frame
+
+CREATED_AT = datetime(2024, 10, 1)
+
+
+def put_year(client, bucket, spec, year, drop=()):
+    table = spec.conform(spec.transform(batting_frame(year), year, CREATED_AT))
+    table = table.drop_columns(list(drop))
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    client.put_object(Bucket=bucket, Key=spec.s3_key(year), Body=buffer.getvalue())
+
+
+def read_compacted(client, bucket, spec):
+    body = client.get_object(Bucket=bucket, Key=spec.compact_key())['Body'].read()
+    return pq.ParquetFile(io.BytesIO(body))
+
+
+def test_compaction_fills_columns_missing_from_older_files(s3):
+    client, bucket = s3
+    spec = get_spec('batting')
+    # カラムを追加する前に書いた年度のファイル
+    added = ['pa', 'singles', 'doubles', 'triples', 'bb', 'ibb', 'hbp', 'sf', 'so', 'player_id']
+    put_year(client, bucket, spec, 2015, drop=added)
+    put_year(client, bucket, spec, 2016)
+
+    stats = compact_dataset(spec, client, bucket)
+
+    assert stats['rows'] == 10 and stats['source_files'] == 2
+    table = read_compacted(client, bucket, spec).read()
+    assert table.schema == spec.arrow_schema()
+    rows = table.to_pandas()
+    assert rows.loc[rows['season'] == 2015, 'so'].isna().all()
+    assert rows.loc[rows['season'] == 2016, 'so'].notna().all()
+
+
+def test_compaction_adds_column_missing_from_every_file(s3):
+    client, bucket = s3
+    spec = get_spec('batting')
+    for year in (2015, 2016):
+        put_year(client, bucket, spec, year, drop=['player_id'])
+
+    compact_dataset(spec, client, bucket)
+
+    table = read_compacted(client, bucket, spec).read()
+    assert table.schema == spec.arrow_schema()
+    assert table.column('player_id').null_count == 10
+
+
+def test_compacted_file_has_sorting_columns_and_bloom_filters(s3):
+    client, bucket = s3
+    spec = get_spec('batting')
+    for year in (2015, 2016, 2017):
+        put_year(client, bucket, spec, year)
+
+    stats = compact_dataset(spec, client, bucket)
+
+    metadata = read_compacted(client, bucket, spec).metadata
+    # シーズンごとに1行グループ
+    assert stats['row_groups'] == metadata.num_row_groups == 3
+    names = metadata.schema.names
+    season, name = names.index('season'), names.index('name')
+    for i in range(metadata.num_row_groups):
+        group = metadata.row_group(i)
+        assert [c.column_index for c in group.sorting_columns] == [season, name]
+        assert group.column(season).statistics.min == group.column(season).statistics.max == 2015 + i
+        bloom = {group.column(j).path_in_schema for j in range(group.num_columns)
+                 if group.column(j).bloom_filter_length}
+        assert bloom == set(spec.lookup_columns)
+        assert group.column(name).has_column_index
+
+
+def test_compaction_fails_without_bloom_filter_support(s3, monkeypatch):
+    client, bucket = s3
+    spec = get_spec('batting')
+    put_year(client, bucket, spec, 2015)
+    monkeypatch.setattr(compaction, 'bloom_filters_supported', lambda: False)
+
+    with pytest.raises(CompactionUnsupportedError):
+        compact_dataset(spec, client, bucket)
+    assert compaction.compact_datasets([spec], client, bucket)[spec.key]['error']
+    assert client.list_objects_v2(Bucket=bucket, Prefix=spec.compact_key()).get('KeyCount') == 0
@@ -0,0 +1,78 @@
+"""
+データセット定義 (transform / conform) のテスト
+"""
+
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from datasets import SchemaDriftError, get_spec
+from sample_data import batting_frame, team_frame
+
+CREATED_AT = datetime(2024, 10, 1)
+
+
+def test_transform_projects_and_renames():
+    spec = get_spec('batting')
+    df = spec.transform(batting_frame(2024), 2024, CREATED_AT)
+
+    assert list(df.columns[:3]) == ['name', 'games', 'at_bats']
+    assert set(df['season']) == {2024}
+    assert df['player_id'].isna().all()
+
+
+def test_transform_does_not_mutate_fetched_frame():
+    spec = get_spec('team_batting')   # project=False: 取得結果の全カラムを保持
+    data = team_frame(2024)
+    df = spec.transform(data, 2024, CREATED_AT)
+
+    assert 'created_at' in df.columns
+    assert 'created_at' not in data.columns
+
+
+def test_conform_casts_to_declared_schema():
+    spec = get_spec('team_batting')
+    data = team_frame(2024)
+    data['extra'] = 1.5   # 宣言外のカラムは型を推論して残す
+    table = spec.conform(spec.transform(data, 2024, CREATED_AT))
+
+    assert table.schema.field('HR').type == pa.int16()
+    assert table.schema.field('AVG').type == pa.float32()
+    assert pa.types.is_dictionary(table.schema.field('Team').type)
+    assert table.schema.field('created_at').type == pa.timestamp('us')
+    assert table.schema.field('extra').type == pa.float64()
+    assert table.column('HR').to_pylist() == data['HR'].tolist()
+
+
+@pytest.mark.parametrize('column, value, message', [
+    ('HR', 12.5, 'HR'),           # 小数 → 整数の切り捨て
+    ('HR', 70_000, 'HR'),         # smallint の桁あふれ
+    ('G', 'n/a', 'G'),            # 数値でない文字列
+])
+def test_conform_rejects_values_that_do_not_fit(column, value, message):
+    spec = get_spec('team_batting')
+    data = team_frame(2024)
+    data[column] = data[column].astype(object if isinstance(value, str) else float)
+    data.loc[0, column] = value
+
+    with pytest.raises(SchemaDriftError, match=message):
+        spec.conform(spec.transform(data, 2024, CREATED_AT))
+
+
+def test_conform_rejects_missing_columns():
+    spec = get_spec('team_batting')
+    df = spec.transform(team_frame(2024).drop(columns=['SO']), 2024, CREATED_AT)
+
+    with pytest.raises(SchemaDriftError, match=r"missing columns \['SO'\]"):
+        spec.conform(df)
+
+
+def test_conform_keeps_nulls_in_integer_columns():
+    spec = get_spec('batting')
+    df = spec.transform(batting_frame(2024), 2024, CREATED_AT)
+    df['hr'] = pd.array([None, 1, 2, 3, 4], dtype='Int64')
+
+    table = spec.conform(df)
+    assert table.column('hr').to_pylist() == [None, 1, 2, 3, 4]
@@ -0,0 +1,135 @@
+"""
+派生指標のテスト
+
+計算式は手計算の期待値と比べる (リーグは1球団だけにして、リーグ平均を手で追える値にしている)。
+派生テーブルの書き出しは moto の S3 で確認する。
+"""
+
+import io
+import math
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from datasets import DERIVED_REGISTRY, get_spec
+from derived import derive_batting, derive_datasets, derive_pitching, innings, pending_years
+from sample_data import batting_frame, team_frame
+
+NAN = float('nan')
+CREATED_AT = datetime(2024, 10, 1)
+
+# リーグ: OBP = (130+50+5)/(500+50+5+5) = 185/560, SLG = (80+50+15+80)/500 = 0.45
+# wOBA (尺度合わせ前) = (0.69*45 + 0.72*5 + 0.89*80 + 1.27*25 + 1.62*5 + 2.10*20)/555 = 187.7/555
+TEAM_BATTING = pd.DataFrame({'AB': [500], 'H': [130], 'HR': [20], 'BB': [50], 'IBB': [5], 'HBP': [5],
+                             'SF': [5], '1B': [80], '2B': [25], '3B': [5]})
+
+# A: 100打数30安打 (単打20, 二塁打4, 三塁打1, 本塁打5), 10四球, 20三振
+# B: 50打数10安打 (すべて本塁打), 8四球 (うち故意2), 1死球, 1犠飛, 15三振
+# C: 打席なし (率はすべて NaN)
+BATTING = pd.DataFrame({
+    'name': ['A', 'B', 'C'], 'player_id': [1, 2, 3], 'pa': [110, 60, 0],
+    'at_bats': [100, 50, 0], 'hits': [30, 10, 0], 'hr': [5, 10, 0], 'so': [20, 15, 0],
+    'bb': [10, 8, 0], 'ibb': [0, 2, 0], 'hbp': [0, 1, 0], 'sf': [0, 1, 0],
+    'singles': [20, 0, 0], 'doubles': [4, 0, 0], 'triples': [1, 0, 0],
+})
+
+# リーグ: 90回で自責点40 → ERA 4.00、FIP 定数 = 4.00 - (13*10 + 3*33 - 2*90)/90 = 4 - 49/90
+TEAM_PITCHING = pd.DataFrame({'IP': [90.0], 'ER': [40], 'HR': [10], 'BB': [30], 'HBP': [3], 'SO': [90]})
+
+# A: 10.1回 (31/3), B: 20.2回 (62/3), C: 0回 (率はすべて NaN)
+PITCHING = pd.DataFrame({
+    'name': ['A', 'B', 'C'], 'player_id': [1, 2, 3], 'innings_pitched': [10.1, 20.2, 0.0],
+    'strikeouts': [12, 15, 0], 'walks': [3, 8, 1], 'hit_batters': [1, 0, 0],
+    'home_runs': [1, 3, 0], 'earned_runs': [2, 10, 2],
+})
+
+FIP_CONSTANT = 4 - 49 / 90
+
+
+@pytest.mark.parametrize('column, expected', [
+    ('avg', [0.3, 0.2, NAN]),
+    ('obp', [40 / 110, 19 / 60, NAN]),
+    ('slg', [51 / 100, 40 / 50, NAN]),
+    ('ops', [40 / 110 + 0.51, 19 / 60 + 0.8, NAN]),
+    ('iso', [0.21, 0.6, NAN]),
+    # (H - HR) / (AB - SO - HR + SF)
+    ('babip', [25 / 75, 0 / 26, NAN]),
+    # 100 * (OBP / リーグOBP + SLG / リーグSLG - 1)
+    ('ops_plus', [100 * ((40 / 110) / (185 / 560) + 0.51 / 0.45 - 1),
+                  100 * ((19 / 60) / (185 / 560) + 0.8 / 0.45 - 1), NAN]),
+    # 尺度はリーグ wOBA = リーグ OBP となるように合わせる
+    ('woba', [41.9 / 110 * (185 / 560) / (187.7 / 555),
+              (0.69 * 6 + 0.72 * 1 + 2.10 * 10) / 58 * (185 / 560) / (187.7 / 555), NAN]),
+    # シーズン内のパーセンタイル (NaN は順位に入れない)
+    ('ops_pct', [50, 100, NAN]),
+    ('hr_pct', [200 / 3, 100, 100 / 3]),
+])
+def test_batting_formulas(column, expected):
+    df = derive_batting({'batting': BATTING, 'team_batting': TEAM_BATTING}, 2024)
+
+    np.testing.assert_allclose(df[column].to_numpy(dtype='float64'), expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize('column, expected', [
+    ('innings', [31 / 3, 62 / 3, 0]),
+    ('era', [9 * 2 / (31 / 3), 9 * 10 / (62 / 3), NAN]),
+    # (13*HR + 3*(BB+HBP) - 2*SO) / IP + FIP 定数
+    ('fip', [(13 + 12 - 24) / (31 / 3) + FIP_CONSTANT, (39 + 24 - 30) / (62 / 3) + FIP_CONSTANT, NAN]),
+    # 100 * リーグERA / ERA
+    ('era_plus', [400 / (18 / (31 / 3)), 400 / (90 / (62 / 3)), NAN]),
+    ('fip_minus', [100 * ((1 / (31 / 3)) + FIP_CONSTANT) / 4,
+                   100 * ((33 / (62 / 3)) + FIP_CONSTANT) / 4, NAN]),
+    ('k9', [9 * 12 / (31 / 3), 9 * 15 / (62 / 3), NAN]),
+    ('k_bb', [4, 15 / 8, 0]),
+    # ERA は低いほど上位
+    ('era_pct', [100, 50, NAN]),
+    ('k9_pct', [100, 50, NAN]),
+])
+def test_pitching_formulas(column, expected):
+    df = derive_pitching({'pitching': PITCHING, 'team_pitching': TEAM_PITCHING}, 2024)
+
+    np.testing.assert_allclose(df[column].to_numpy(dtype='float64'), expected, rtol=1e-9)
+
+
+@pytest.mark.parametrize('ip, expected', [
+    (180.0, 180), (180.1, 180 + 1 / 3), (180.2, 180 + 2 / 3), (0.1, 1 / 3), (0.0, 0),
+])
+def test_innings_notation(ip, expected):
+    assert math.isclose(float(innings(np.array([ip]))[0]), expected, rel_tol=1e-12, abs_tol=1e-12)
+
+
+def put_input(client, bucket, key, frame, year):
+    spec = get_spec(key)
+    buffer = io.BytesIO()
+    pq.write_table(spec.conform(spec.transform(frame(year), year, CREATED_AT)), buffer)
+    client.put_object(Bucket=bucket, Key=spec.s3_key(year), Body=buffer.getvalue())
+
+
+def test_derive_datasets_writes_missing_and_changed_years(s3):
+    client, bucket = s3
+    spec = next(s for s in DERIVED_REGISTRY if s.key == 'batting_advanced')
+    for year in (2015, 2016):
+        put_input(client, bucket, 'batting', batting_frame, year)
+        put_input(client, bucket, 'team_batting', team_frame, year)
+    # 2017 年はチーム成績がまだない
+    put_input(client, bucket, 'batting', batting_frame, 2017)
+
+    # 派生テーブルがない年度は、今回書き込みがなくても計算する
+    assert pending_years(spec, client, bucket, changed_years=[]) == [2015, 2016]
+    stats = derive_datasets([(spec, [2015, 2016, 2017])], client, bucket, CREATED_AT)[spec.key]
+
+    assert (stats['years'], stats['rows'], stats['missing_inputs']) == ([2015, 2016], 10, [2017])
+    body = client.get_object(Bucket=bucket, Key=spec.s3_key(2016))['Body'].read()
+    table = pq.read_table(io.BytesIO(body))
+    assert table.schema.equals(spec.arrow_schema())
+    df = table.to_pandas()
+    assert (df['season'] == 2016).all() and len(df) == 5
+    np.testing.assert_allclose(df['ops'], df['obp'] + df['slg'], rtol=1e-6)
+
+    # 入力が同じなら書き込まない
+    assert pending_years(spec, client, bucket, changed_years=[2016]) == [2016]
+    stats = derive_datasets([(spec, [2016])], client, bucket, CREATED_AT)[spec.key]
+    assert stats['unchanged_years'] == [2016]
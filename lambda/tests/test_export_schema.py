@@ -0,0 +1,63 @@
+"""
+エクスポートしたファイルのスキーマのテスト (取得関数は偽の pybaseball、S3 は moto)
+
+書き出したファイルを S3 から読み戻し、宣言した (Glue と同じ) 型になっていることを確認する。
+"""
+
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from datasets import SchemaDriftError, get_spec
+from incremental import SCHEMA_METADATA_KEY
+from sample_data import StubFetcher, batting_frame
+
+
+@pytest.fixture
+def batting_unit(s3, fake_pybaseball, monkeypatch):
+    import fetch_gateway
+
+    monkeypatch.setattr(fetch_gateway, '_gateway', None)
+    monkeypatch.setenv('FETCH_RETRIES', '0')
+    monkeypatch.setenv('FETCH_RATE_LIMITS', 'fangraphs=100')
+    fake_pybaseball.batting_stats = StubFetcher(batting_frame)
+    return s3, fake_pybaseball
+
+
+def test_exported_file_uses_declared_compact_types(batting_unit):
+    from pipeline import run_unit
+
+    (client, bucket), _ = batting_unit
+    spec = get_spec('batting')
+    run_unit(spec, client, bucket, 2016)
+
+    response = client.get_object(Bucket=bucket, Key=spec.s3_key(2016))
+    table = pq.read_table(io.BytesIO(response['Body'].read()))
+    assert table.schema.equals(spec.arrow_schema())
+    types = {field.name: field.type for field in table.schema}
+    assert types['hr'] == pa.int16() and types['season'] == pa.int16()
+    assert types['avg'] == pa.float32()
+    assert types['name'] == pa.dictionary(pa.int32(), pa.string())
+    assert types['created_at'] == pa.timestamp('us')
+    assert table.column('hr').to_pylist() == [14] * 5
+    assert response['Metadata'][SCHEMA_METADATA_KEY] == spec.schema_version()
+
+
+def test_schema_drift_fails_unit_without_writing(batting_unit):
+    from pipeline import run_unit
+
+    (client, bucket), pybaseball = batting_unit
+
+    def drifted(year):
+        # 上流で本塁打数が小数になった
+        df = batting_frame(year)
+        df['HR'] = 12.5
+        return df
+
+    pybaseball.batting_stats = StubFetcher(drifted)
+    with pytest.raises(SchemaDriftError, match='hr'):
+        run_unit(get_spec('batting'), client, bucket, 2016)
+
+    assert 'Contents' not in client.list_objects_v2(Bucket=bucket)
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from fetch_engine import FetchEngine, WorkUnit, parse_source_limits
+
+
+def test_parse_source_limits():
+    assert parse_source_limits('fangraphs=4, baseball_savant=2,') == {'fangraphs': 4, 'baseball_savant': 2}
+    assert parse_source_limits('') == {}
+
+
+def test_results_keep_submission_order_and_errors():
+    def fail():
+        raise ValueError('boom')
+
+    units = [WorkUnit('a', 2015, 's', lambda: 1), WorkUnit('a', 2016, 's', fail),
+             WorkUnit('b', 2015, 't', lambda: 3)]
+    results = FetchEngine(max_workers=2).run(units)
+    assert [(r.dataset, r.year) for r in results] == [('a', 2015), ('a', 2016), ('b', 2015)]
+    assert results[0].value == 1 and results[2].value == 3
+    assert not results[1].ok and 'boom' in results[1].error
+
+
+def test_source_limit_is_respected():
+    lock = threading.Lock()
+    live, peak = [0], [0]
+
+    def work():
+        with lock:
+            live[0] += 1
+            peak[0] = max(peak[0], live[0])
+        time.sleep(0.02)
+        with lock:
+            live[0] -= 1
+
+    units = [WorkUnit('a', year, 'slow', work) for year in range(10)]
+    FetchEngine(max_workers=8, source_limits={'slow': 2}).run(units)
+    assert peak[0] == 2
+
+
+def test_saturated_source_does_not_starve_others():
+    """上限に達した取得元の待ちジョブがワーカーを占有せず、他の取得元が先に進む"""
+    finished = {}
+
+    def slow(year):
+        time.sleep(0.3)
+        finished[('slow', year)] = time.monotonic()
+
+    def fast(year):
+        finished[('fast', year)] = time.monotonic()
+
+    units = ([WorkUnit('slow', year, 'slow', lambda y=year: slow(y)) for year in range(3)]
+             + [WorkUnit('fast', year, 'fast', lambda y=year: fast(y)) for year in range(3)])
+    start = time.monotonic()
+    FetchEngine(max_workers=2, source_limits={'slow': 1, 'fast': 1}).run(units)
+
+    # fast は最初の slow と並行して終わる (slow の2件目以降を待たない)
+    assert all(finished[('fast', year)] - start < 0.3 for year in range(3))
@@ -0,0 +1,48 @@
+"""
+取得ゲートウェイのテスト
+"""
+
+import pytest
+
+from fetch_gateway import FetchGateway
+
+
+def timing_out():
+    raise TimeoutError("read timed out")
+
+
+def test_reset_stats_keeps_limiter_and_breaker():
+    gateway = FetchGateway(rate_limits={'fangraphs': 1000}, retries=0, failure_threshold=2)
+    gateway.call('fangraphs', lambda: 1)
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            gateway.call('fangraphs', timing_out)
+    assert gateway.summary()['fangraphs']['calls'] == 3
+    assert gateway.summary()['fangraphs']['circuit'] == 'open'
+    source = gateway.source('fangraphs')
+    limit = source.limiter.limit
+
+    gateway.reset_stats()
+
+    stats = gateway.summary()['fangraphs']
+    assert (stats['calls'], stats['failures'], stats['retries'], stats['throttled_seconds']) == (0, 0, 0, 0)
+    assert stats['circuit'] == 'open'
+    assert gateway.source('fangraphs') is source and source.limiter.limit == limit
+
+
+def test_set_processes_splits_limits_between_workers():
+    gateway = FetchGateway(rate_limits={'fangraphs': 1, 'baseball_savant': 16},
+                           concurrency={'fangraphs': 4, 'baseball_savant': 4})
+    assert gateway.source('fangraphs').bucket.rate == 1
+
+    # Map で 8 ワーカーが並列に動く場合、各ワーカーは 1/8 ずつ使う
+    gateway.set_processes(8)
+    fangraphs, savant = gateway.source('fangraphs'), gateway.source('baseball_savant')
+    assert (fangraphs.bucket.rate, fangraphs.bucket.burst, fangraphs.limiter.maximum) == (0.125, 1, 1)
+    assert (savant.bucket.rate, savant.bucket.burst, savant.limiter.maximum) == (2, 2, 1)
+
+    # 同じ数なら状態を引き継ぐ
+    gateway.set_processes(8)
+    assert gateway.source('fangraphs') is fangraphs
+    gateway.set_processes(1)
+    assert gateway.source('fangraphs').bucket.rate == 1
@@ -0,0 +1,83 @@
+"""
+Glue テーブル定義 (lib/glue-tables.json) とパーティション射影のテスト
+
+射影の保存先テンプレートを CDK スタックと同じ方法で展開し、パイプラインが書き出すキー
+(moto の S3 に置く) がその下にあることを確認する。
+"""
+
+import os
+from datetime import date
+
+import pytest
+
+import datasets
+from datasets import DERIVED_REGISTRY, REGISTRY, get_spec, glue_tables
+
+GLUE_TABLES_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'glue-tables.json')
+
+
+def resolve_location(bucket, table, values):
+    """
+    CDK スタック (lib/baseball-cdk-stack.ts) と同じく s3://<bucket>/<name>/ + テンプレートを展開
+    """
+    template = f"s3://{bucket}/{table['name']}/" + table['projection']['storage.location.template']
+    for name, value in values.items():
+        digits = int(table['projection'].get(f"projection.{name}.digits", 0))
+        template = template.replace(f"${{{name}}}", str(value).zfill(digits))
+    return template
+
+
+def projection_range(table, name, start_year, end_year):
+    if name == 'year':
+        return range(start_year, end_year + 1)  # CDK スタックが設定値から補う
+    low, high = table['projection'][f"projection.{name}.range"].split(',')
+    return range(int(low), int(high) + 1)
+
+
+@pytest.mark.parametrize('spec', [s for s in REGISTRY + DERIVED_REGISTRY if s.partition_keys],
+                         ids=lambda s: s.key)
+def test_projection_resolves_to_written_keys(s3, spec):
+    client, bucket = s3
+    table = next(t for t in glue_tables() if t['name'] == spec.prefix)
+    if spec.key == 'statcast':
+        key = spec.window_key(date(2020, 7, 23), date(2020, 7, 29))
+        values = {'year': 2020, 'month': 7}
+    else:
+        key = spec.s3_key(2020)
+        values = {'year': 2020}
+    client.put_object(Bucket=bucket, Key=key, Body=b'PAR1')
+
+    assert table['projection']['projection.enabled'] == 'true'
+    assert [k['name'] for k in table['partitionKeys']] == list(values)
+    for name, value in values.items():
+        assert value in projection_range(table, name, 2015, 2025)
+    location = resolve_location(bucket, table, values)
+    prefix = location[len(f"s3://{bucket}/"):]
+    listed = client.list_objects_v2(Bucket=bucket, Prefix=prefix).get('Contents', [])
+    assert [obj['Key'] for obj in listed] == [key]
+
+
+def test_statcast_projection_covers_season_months():
+    spec = get_spec('statcast')
+    table = next(t for t in glue_tables() if t['name'] == spec.prefix)
+
+    months = projection_range(table, 'month', 2015, 2025)
+    assert months == range(spec.season_start[0], spec.season_end[0] + 1)
+    assert table['projection']['projection.month.digits'] == '2'
+
+
+def test_unpartitioned_tables_have_no_projection():
+    names = {t['name']: t for t in glue_tables()}
+    assert names[get_spec('players').prefix]['projection'] == {}
+    for spec in REGISTRY:
+        if spec.compact:
+            assert names[spec.compact_prefix]['projection'] == {}
+
+
+def test_check_detects_stale_glue_tables(tmp_path, capsys):
+    assert datasets.main(['--check', GLUE_TABLES_PATH]) == 0
+
+    stale = tmp_path / 'glue-tables.json'
+    stale.write_text(datasets.render_glue_tables().replace('"projection.enabled": "true"', '"x": "y"', 1))
+    assert datasets.main(['--check', str(stale)]) == 1
+    assert 'out of date' in capsys.readouterr().err
@@ -0,0 +1,96 @@
+"""
+過去データインポートスクリプト (baseball_historical_import_v2.py) の終了コードのテスト
+
+スクリプトはモジュールの読み込み時に実行されるので、新しいプロセスで実行する。
+pybaseball は偽のモジュール、書き込み先は moto の S3 (IMPORT_SINKS=s3)。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+LAMBDA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FAKE_PYBASEBALL = textwrap.dedent("""
+    import os
+    from sample_data import batting_frame
+
+    def batting_stats(year, end_season=None, **kwargs):
+        if str(year) in os.environ.get('FAIL_YEARS', '').split(','):
+            raise ValueError(f"Error parsing table for {year}")
+        return batting_frame(year)
+""")
+
+RUN_CODE = textwrap.dedent("""
+    import json, os, runpy, sys
+    from moto import mock_aws
+
+    with mock_aws():
+        import boto3
+        client = boto3.client('s3')
+        if os.environ.get('CREATE_BUCKET'):
+            client.create_bucket(Bucket='test-bucket',
+                                 CreateBucketConfiguration={'LocationConstraint': 'ap-northeast-1'})
+        try:
+            runpy.run_path(sys.argv[1], run_name='__main__')
+            code = 0
+        except SystemExit as e:
+            code = e.code
+        keys = []
+        if os.environ.get('CREATE_BUCKET'):
+            keys = [o['Key'] for o in client.list_objects_v2(Bucket='test-bucket').get('Contents', [])]
+    print(json.dumps({'exit_code': code, 'keys': keys}))
+""")
+
+
+@pytest.fixture
+def run_import(tmp_path, aws_credentials):
+    (tmp_path / 'pybaseball.py').write_text(FAKE_PYBASEBALL)
+
+    def run(create_bucket=True, fail_years=(), player_ids='off'):
+        env = dict(os.environ, IMPORT_SINKS='s3', S3_BUCKET='test-bucket', PLAYER_IDS=player_ids,
+                   PLAYER_INDEX_PATH=str(tmp_path / 'players' / 'register.parquet'),
+                   FETCH_RETRIES='0', FETCH_RATE_LIMITS='fangraphs=100', METRICS='off',
+                   FAIL_YEARS=','.join(str(y) for y in fail_years),
+                   CREATE_BUCKET='1' if create_bucket else '',
+                   PYTHONPATH=os.pathsep.join([str(tmp_path), LAMBDA_DIR, TESTS_DIR]))
+        script = os.path.join(LAMBDA_DIR, 'baseball_historical_import_v2.py')
+        output = subprocess.run([sys.executable, '-c', RUN_CODE, script], env=env, cwd=str(tmp_path),
+                                capture_output=True, text=True, check=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    return run
+
+
+def test_import_exits_zero_when_every_season_is_written(run_import):
+    result = run_import()
+
+    assert result['exit_code'] == 0
+    assert result['keys'] == [f"players_historical/year={y}/players_historical_{y}.parquet"
+                              for y in (2015, 2016, 2017)]
+
+
+def test_import_exits_non_zero_when_a_sink_fails(run_import):
+    # バケットがないので S3 シンクの書き込みがすべて失敗する
+    assert run_import(create_bucket=False)['exit_code'] == 1
+
+
+def test_import_exits_non_zero_when_a_season_fails_to_fetch(run_import):
+    result = run_import(fail_years=[2016])
+
+    assert result['exit_code'] == 1
+    # 取得できたシーズンは書き込む
+    assert len(result['keys']) == 2
+
+
+def test_import_does_not_write_null_player_ids_when_index_is_unavailable(run_import):
+    # 偽の pybaseball には chadwick_register がないので索引を作れない
+    result = run_import(player_ids='on')
+
+    assert result['exit_code'] == 1
+    assert result['keys'] == []
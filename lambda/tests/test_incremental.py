@@ -0,0 +1,54 @@
+"""
+インクリメンタル取得計画のテスト (既存オブジェクトのメタデータは moto に置く)
+"""
+
+from datasets import get_spec
+from incremental import (FETCHED_AT_METADATA_KEY, HASH_METADATA_KEY, SCHEMA_METADATA_KEY,
+                         plan_incremental, stale_reason)
+
+
+def put(client, bucket, spec, year, fetched_at='2025-01-01T00:00:00', schema=None, content_hash='abc'):
+    metadata = {FETCHED_AT_METADATA_KEY: fetched_at, SCHEMA_METADATA_KEY: schema or spec.schema_version()}
+    if content_hash:
+        metadata[HASH_METADATA_KEY] = content_hash
+    client.put_object(Bucket=bucket, Key=spec.s3_key(year), Body=b'PAR1', Metadata=metadata)
+
+
+def test_plan_refetches_only_stale_years(s3):
+    client, bucket = s3
+    spec = get_spec('team_batting')
+    put(client, bucket, spec, 2015)                                   # 最新
+    put(client, bucket, spec, 2016, content_hash=None)                # 旧形式 (ハッシュなし)
+    put(client, bucket, spec, 2017, fetched_at='2017-09-01T00:00:00')  # シーズン確定前に取得
+    put(client, bucket, spec, 2018, schema='0000000000000000')        # スキーマ変更
+    put(client, bucket, spec, 2019)                                   # 最新だが無効化
+    put(client, bucket, spec, 2021)                                   # 当年度
+
+    plan = plan_incremental(client, bucket, [spec], range(2015, 2022), season=2021,
+                            invalidate_years=[2019])
+
+    # 2020 はオブジェクトがない
+    assert plan == {'team_batting': [2016, 2017, 2018, 2019, 2020, 2021]}
+
+
+def test_plan_runs_every_year_for_datasets_managing_own_state(s3):
+    client, bucket = s3
+    batting, statcast = get_spec('batting'), get_spec('statcast')
+    put(client, bucket, batting, 2015)
+
+    plan = plan_incremental(client, bucket, [batting, statcast], [2015, 2016], season=2024)
+
+    assert plan == {'batting': [2016], 'statcast': [2015, 2016]}
+
+
+def test_stale_reason_from_head():
+    head = {'ContentLength': 10, 'ETag': '"abc"',
+            'Metadata': {HASH_METADATA_KEY: 'x', FETCHED_AT_METADATA_KEY: '2020-12-02T00:00:00'}}
+    assert stale_reason(head, 2020, 2024) is None
+    assert stale_reason(dict(head, ContentLength=0), 2020, 2024) == 'empty object'
+    # マルチパートのオブジェクトはハッシュがなくても ETag で判定済みとみなす
+    multipart = dict(head, ETag='"abc-3"', Metadata={FETCHED_AT_METADATA_KEY: '2020-12-02T00:00:00'})
+    assert stale_reason(multipart, 2020, 2024) is None
+    assert stale_reason(dict(head, Metadata={HASH_METADATA_KEY: 'x', FETCHED_AT_METADATA_KEY: 'bad'}),
+                        2020, 2024) == 'invalid fetch timestamp'
+    assert stale_reason(head, 2024, 2024) == 'current season'
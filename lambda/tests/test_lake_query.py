@@ -0,0 +1,130 @@
+"""
+lake_query のテスト
+
+エクスポートと同じレイアウト (<prefix>/year=YYYY/<filename>) のレイクを tmp_path に作る。
+各ファイルは spec.conform() で宣言したスキーマに揃える。
+"""
+
+import os
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from datasets import get_spec
+from lake_query import Lake
+
+# (name, player_id, hr)
+BATTING = {
+    2014: [('Mike Trout', 545361, 36), ('Will Smith', 669257, 1)],
+    2015: [('Mike Trout', 545361, 41), ('Bryce Harper', 547180, 42), ('Will Smith', 669257, 5)],
+    2016: [('Mike Trout', 545361, 29), ('Bryce Harper', 547180, 24), ('Will Smith', 519293, 0)],
+}
+
+
+def write_year(root, key, year, values):
+    """宣言した列のうち values にないものは 0 で埋めて1年度分のファイルを書く"""
+    import pyarrow.parquet as pq
+
+    spec = get_spec(key)
+    size = len(next(iter(values.values())))
+    columns = {}
+    for field in spec.arrow_schema():
+        if field.name in values:
+            columns[field.name] = values[field.name]
+        elif field.name == 'created_at':
+            columns[field.name] = [datetime(2024, 1, 1)] * size
+        elif field.name in ('season', 'Season'):
+            columns[field.name] = [year] * size
+        else:
+            columns[field.name] = [0] * size
+    path = os.path.join(root, spec.s3_key(year))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(spec.conform(pd.DataFrame(columns)), path)
+    return spec.s3_key(year)
+
+
+def team_values(teams, column, values):
+    return {'teamIDfg': list(range(1, len(teams) + 1)), 'Team': teams, column: values}
+
+
+@pytest.fixture
+def lake_root(tmp_path):
+    root = str(tmp_path / 'lake')
+    for year, rows in BATTING.items():
+        names, ids, hrs = zip(*rows)
+        write_year(root, 'batting', year, {'name': list(names), 'player_id': list(ids), 'hr': list(hrs)})
+    for year in (2015, 2016):
+        write_year(root, 'team_batting', year, team_values(['LAD', 'NYY'], 'HR', [year - 1800, 200]))
+        write_year(root, 'team_pitching', year, team_values(['LAD', 'NYY'], 'ERA', [3.5, 4.0]))
+    write_year(root, 'team_fielding', 2016, team_values(['LAD'], 'E', [80]))
+    return root
+
+
+def test_leaderboard_by_season(lake_root):
+    board = Lake(lake_root).leaderboard('batting', 'hr', years=(2015, 2016), limit=2)
+
+    assert board[['name', 'year', 'hr']].values.tolist() == [['Bryce Harper', 2015, 42],
+                                                             ['Mike Trout', 2015, 41]]
+
+
+def test_leaderboard_career_and_min_value(lake_root):
+    lake = Lake(lake_root)
+
+    career = lake.leaderboard('batting', 'hr', career=True)
+    assert career.values.tolist() == [['Mike Trout', 106, 3], ['Bryce Harper', 66, 2],
+                                      ['Will Smith', 6, 3]]
+
+    board = lake.leaderboard('batting', 'hr', min_value=30, limit=10)
+    assert board['hr'].tolist() == [42, 41, 36]
+
+
+def test_player_history_by_name_and_id(lake_root):
+    lake = Lake(lake_root)
+
+    assert lake.player_history('Mike Trout', years=(2015, 2016))['hr'].tolist() == [41, 29]
+    # 同名の別選手は名前では混ざり、player_id では分かれる
+    assert lake.player_history('Will Smith')['year'].tolist() == [2014, 2015, 2016]
+    history = lake.player_history(669257)
+    assert history['year'].tolist() == [2014, 2015]
+    assert set(history['player_id']) == {669257}
+
+
+def test_year_filter_prunes_partitions(lake_root):
+    # 範囲外の年度のファイルは開かない (壊れていても読み込みエラーにならない)
+    with open(os.path.join(lake_root, get_spec('batting').s3_key(2014)), 'wb') as f:
+        f.write(b'not a parquet file')
+    lake = Lake(lake_root)
+
+    assert sorted(lake.query('batting', years=(2015, 2016))['year'].unique()) == [2015, 2016]
+    with pytest.raises(Exception):
+        lake.query('batting')
+
+
+def test_team_splits_outer_joins_datasets(lake_root):
+    splits = Lake(lake_root).team_splits('LAD')
+
+    assert splits['year'].tolist() == [2015, 2016]
+    assert splits['batting_HR'].tolist() == [215, 216]
+    assert splits['pitching_ERA'].tolist() == [3.5, 3.5]
+    # 守備成績は 2016 年のみ
+    assert pd.isna(splits['fielding_E'][0]) and splits['fielding_E'][1] == 80
+    assert not any(c.startswith('batting_Team') for c in splits.columns)
+
+
+def test_s3_lake_downloads_only_requested_years(lake_root, s3, tmp_path):
+    client, bucket = s3
+    for directory, _, files in os.walk(lake_root):
+        for name in files:
+            path = os.path.join(directory, name)
+            client.upload_file(path, bucket, os.path.relpath(path, lake_root).replace(os.sep, '/'))
+    cache_dir = str(tmp_path / 'cache')
+
+    lake = Lake(f"s3://{bucket}", cache_dir=cache_dir, s3_client=client)
+    assert lake.leaderboard('batting', 'hr', years=2016, limit=1)['name'].tolist() == ['Mike Trout']
+    assert (lake.cache.stats['downloads'], lake.cache.stats['hits']) == (1, 0)
+
+    # 2回目はキャッシュから読む (内容が変わっていないので取得しない)
+    lake = Lake(f"s3://{bucket}", cache_dir=cache_dir, s3_client=client)
+    lake.leaderboard('batting', 'hr', years=(2015, 2016))
+    assert (lake.cache.stats['downloads'], lake.cache.stats['hits']) == (1, 1)
@@ -0,0 +1,76 @@
+"""
+パイプライン計測 (EMF 出力) のテスト
+
+1ユニットを moto の S3 に書き出し、標準出力の EMF 行を確認する。
+"""
+
+import json
+
+import pytest
+
+from datasets import get_spec
+from sample_data import StubFetcher, team_frame
+
+
+@pytest.fixture
+def team_unit(s3, fake_pybaseball, monkeypatch):
+    import fetch_gateway
+
+    monkeypatch.setattr(fetch_gateway, '_gateway', None)
+    monkeypatch.setenv('METRICS', 'on')
+    monkeypatch.setenv('METRICS_NAMESPACE', 'Test')
+    monkeypatch.setenv('FETCH_RETRIES', '0')
+    monkeypatch.setenv('FETCH_RATE_LIMITS', 'fangraphs=100')
+    fake_pybaseball.team_batting = StubFetcher(team_frame)
+    return s3, fake_pybaseball
+
+
+def emf_records(output):
+    return [json.loads(line) for line in output.splitlines() if line.startswith('{"_aws"')]
+
+
+def test_run_unit_emits_stage_metrics(team_unit, capsys):
+    from pipeline import run_unit
+
+    (client, bucket), _ = team_unit
+    spec = get_spec('team_batting')
+    run_unit(spec, client, bucket, 2016)
+
+    [record] = emf_records(capsys.readouterr().out)
+    directive = record['_aws']['CloudWatchMetrics'][0]
+    assert directive['Namespace'] == 'Test'
+    assert directive['Dimensions'] == [['Dataset'], []]
+    names = {m['Name'] for m in directive['Metrics']}
+    assert {'FetchTime', 'TransformTime', 'SerializeTime', 'UploadTime', 'UnitTime',
+            'Rows', 'Bytes', 'Failures', 'Retries', 'UnchangedFiles'} <= names
+    size = client.head_object(Bucket=bucket, Key=spec.s3_key(2016))['ContentLength']
+    assert (record['Dataset'], record['Year'], record['Status']) == ('team_batting', 2016, 'ok')
+    assert (record['Rows'], record['Bytes'], record['Failures']) == (3, size, 0)
+
+    # 内容が同じ再実行では書き込まず、UnchangedFiles に数える
+    run_unit(spec, client, bucket, 2016)
+    [record] = emf_records(capsys.readouterr().out)
+    assert (record['Rows'], record['Bytes'], record['UnchangedFiles']) == (0, 0, 1)
+
+
+def test_failed_unit_emits_failure(team_unit, capsys):
+    from pipeline import run_unit
+
+    (client, bucket), pybaseball = team_unit
+    pybaseball.team_batting.fail_years = {2016}
+    with pytest.raises(ValueError):
+        run_unit(get_spec('team_batting'), client, bucket, 2016)
+
+    [record] = emf_records(capsys.readouterr().out)
+    assert (record['Status'], record['Failures']) == ('failed', 1)
+    assert 'Error parsing table' in record['Error']
+
+
+def test_metrics_off_emits_nothing(team_unit, capsys, monkeypatch):
+    from pipeline import run_unit
+
+    (client, bucket), _ = team_unit
+    monkeypatch.setenv('METRICS', 'off')
+    run_unit(get_spec('team_batting'), client, bucket, 2016)
+
+    assert emf_records(capsys.readouterr().out) == []
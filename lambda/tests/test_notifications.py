@@ -0,0 +1,130 @@
+"""
+Slack 通知 (slack-notifier) のテスト
+
+Webhook の代わりにローカルの http.server を立て、受け取ったメッセージを記録する。
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import index
+import notifications
+
+
+class Webhook:
+    """受け取った JSON を記録し、status を返す Webhook の代わり (delay 秒待ってから応答)"""
+
+    def __init__(self):
+        self.messages = []
+        self.status = 200
+        self.delay = 0.0
+        webhook = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                time.sleep(webhook.delay)
+                webhook.messages.append(json.loads(body))
+                self.send_response(webhook.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Context:
+    def __init__(self, remaining_seconds):
+        self.remaining_seconds = remaining_seconds
+
+    def get_remaining_time_in_millis(self):
+        return int(self.remaining_seconds * 1000)
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    webhook = Webhook()
+    monkeypatch.setenv('SLACK_WEBHOOK_URL', webhook.url)
+    yield webhook
+    notifications.flush(timeout=5)
+    webhook.close()
+
+
+def sqs_records(count, state='ALARM'):
+    records = []
+    for i in range(count):
+        alarm = {'AlarmName': f"alarm-{i}", 'NewStateValue': state, 'NewStateReason': 'threshold'}
+        envelope = {'Message': json.dumps(alarm), 'Timestamp': '2024-05-01T00:00:00.000Z'}
+        records.append({'messageId': f"msg-{i}", 'body': json.dumps(envelope)})
+    return {'Records': records}
+
+
+def test_batch_is_sent_as_digest(webhook):
+    response = index.lambda_handler(sqs_records(25), Context(30))
+
+    assert response['statusCode'] == 200
+    # 25 件のアラーム → 20 件 + 5 件の2メッセージ
+    assert [len(m['attachments']) for m in webhook.messages] == [20, 5]
+    assert webhook.messages[0]['text'] == ':bell: CloudWatch Alarms: 25 notifications (1/2)'
+
+
+def test_same_alarm_is_coalesced(webhook):
+    event = sqs_records(1)
+    event['Records'] += sqs_records(1, state='OK')['Records']
+    event['Records'][1]['messageId'] = 'msg-ok'
+
+    index.lambda_handler(event, Context(30))
+
+    [message] = webhook.messages
+    [attachment] = message['attachments']
+    assert attachment['fields'][0]['value'] == 'OK'
+    assert attachment['fields'][1]['value'] == 'ALARM → OK'
+
+
+def test_failed_send_returns_batch_item_failures(webhook):
+    webhook.status = 400
+
+    response = index.lambda_handler(sqs_records(3), Context(30))
+
+    assert response == {'batchItemFailures': [{'itemIdentifier': f"msg-{i}"} for i in range(3)]}
+
+
+def test_pending_send_is_not_counted_in_next_invocation(webhook, capsys):
+    # 1回目: 応答が残り時間に間に合わない → 再配信させる
+    webhook.delay = 1.0
+    response = index.lambda_handler(sqs_records(1), Context(1.2))
+    assert response == {'batchItemFailures': [{'itemIdentifier': 'msg-0'}]}
+
+    # 2回目 (ウォームスタート): 前回の送信は結果に含めない
+    webhook.delay = 0.0
+    capsys.readouterr()
+    response = index.lambda_handler(sqs_records(2), Context(30))
+
+    assert response['statusCode'] == 200
+    assert "2 records → 2 alarms: {'sent': 1, 'failed': 0, 'pending': 0}" in capsys.readouterr().out
+
+
+def test_timed_out_send_is_cancelled_if_not_started(webhook):
+    webhook.delay = 0.5
+    futures = [notifications.send({'text': str(i)}) for i in range(3)]
+
+    result = notifications.flush(timeout=0.1, futures=futures)
+
+    assert result == {'sent': 0, 'failed': 0, 'pending': 3}
+    assert [f.cancelled() for f in futures] == [False, True, True]
+    # 取り消したものは送られず、次の flush でも数えない
+    assert notifications.flush(timeout=2) == {'sent': 0, 'failed': 0, 'pending': 0}
+    futures[0].result(timeout=2)
+    assert webhook.messages == [{'text': '0'}]
@@ -0,0 +1,104 @@
+"""
+run_local (plan → プロセス内のワーカー → 集計) のテスト
+
+取得関数は偽の pybaseball で差し替え、S3 は moto を使う。
+"""
+
+import io
+
+import pytest
+
+from sample_data import StubFetcher, batting_frame, team_frame
+
+
+@pytest.fixture
+def local_run(s3, fake_pybaseball, monkeypatch):
+    import fetch_gateway
+
+    monkeypatch.setattr(fetch_gateway, '_gateway', None)
+    for name, value in {'S3_BUCKET': s3[1], 'START_YEAR': '2015', 'END_YEAR': '2016',
+                        'CURRENT_SEASON': '2030', 'RESPONSE_CACHE': 'off', 'AVAILABILITY': 'off',
+                        'PLAYER_IDS': 'off', 'FETCH_RETRIES': '0',
+                        'FETCH_RATE_LIMITS': 'fangraphs=100'}.items():
+        monkeypatch.setenv(name, value)
+    fake_pybaseball.team_batting = StubFetcher(team_frame)
+    fake_pybaseball.batting_stats = StubFetcher(batting_frame)
+    return s3, fake_pybaseball
+
+
+def read_parquet(client, bucket, key):
+    import pyarrow.parquet as pq
+
+    return pq.read_table(io.BytesIO(client.get_object(Bucket=bucket, Key=key)['Body'].read()))
+
+
+def test_run_local_writes_units_and_manifest(local_run):
+    from orchestrator import run_local
+
+    (client, bucket), pybaseball = local_run
+    config, summary, cache_stats, availability, _, _ = run_local(
+        {'datasets': ['team_batting', 'batting']}, client, max_workers=4)
+
+    assert sorted(pybaseball.team_batting.calls) == [2015, 2016]
+    assert sorted(pybaseball.batting_stats.calls) == [2015, 2016]
+    assert cache_stats is None and availability is None
+
+    teams = summary['team_batting']
+    assert teams.records == 6
+    assert teams.completed_years == [2015, 2016]
+    assert teams.new_years == [2015, 2016]
+    assert summary['batting'].records == 10
+
+    table = read_parquet(client, bucket, 'team_batting_stats/year=2016/team_batting.parquet')
+    assert table.num_rows == 3
+    assert sorted(table.column('Team').to_pylist()) == ['BOS', 'LAD', 'NYY']
+
+    manifest = config.manifest(client).load()
+    assert manifest.is_done('team_batting', 2015) and manifest.is_done('batting', 2016)
+
+
+def test_run_local_records_failed_unit_and_resumes(local_run):
+    from orchestrator import run_local
+
+    (client, bucket), pybaseball = local_run
+    pybaseball.team_batting.fail_years = {2016}
+    config, summary, *_ = run_local({'datasets': ['team_batting'], 'run_id': 'resume-test'}, client)
+
+    assert summary['team_batting'].completed_years == [2015]
+    assert summary['team_batting'].failed_years == [2016]
+
+    # 同じ run_id で再実行すると完了済みのユニットは取得しない
+    pybaseball.team_batting.fail_years = set()
+    pybaseball.team_batting.calls.clear()
+    _, summary, *_ = run_local({'datasets': ['team_batting'], 'run_id': 'resume-test'}, client)
+
+    assert pybaseball.team_batting.calls == [2016]
+    assert summary['team_batting'].failed_years == []
+    assert summary['team_batting'].records == 6
+    read_parquet(client, bucket, 'team_batting_stats/year=2016/team_batting.parquet')
+
+
+def test_run_local_unchanged_on_rerun(local_run):
+    from orchestrator import run_local
+
+    client, _ = local_run[0]
+    run_local({'datasets': ['team_batting']}, client)
+    _, summary, *_ = run_local({'datasets': ['team_batting'], 'run_id': 'second'}, client)
+
+    assert summary['team_batting'].unchanged_years == [2015, 2016]
+    assert summary['team_batting'].changed_years == []
+
+
+def test_lambda_handler_reports_fetch_stats_per_run(local_run, monkeypatch):
+    import baseball_lambda
+
+    (client, _), _ = local_run
+    monkeypatch.setattr(baseball_lambda, 's3_client', client)
+    monkeypatch.setenv('COMPACTION', 'off')
+
+    # ウォームスタートで同じゲートウェイを使っても、前回の実行の呼び出しは数えない
+    for run in range(2):
+        response = baseball_lambda.lambda_handler({'datasets': ['team_batting'], 'run_id': f"run-{run}"},
+                                                  None)
+        assert response['statusCode'] == 200
+        assert response['body']['fetch']['fangraphs']['calls'] == 2
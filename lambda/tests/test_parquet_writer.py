@@ -0,0 +1,73 @@
+"""
+ストリーミング Parquet ライターのテスト (S3 は moto)
+"""
+
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from parquet_writer import MIN_PART_SIZE, StreamingParquetWriter
+
+
+def read_back(client, bucket, key):
+    response = client.get_object(Bucket=bucket, Key=key)
+    body = response['Body'].read()
+    return pq.ParquetFile(io.BytesIO(body)), body, response
+
+
+def test_small_output_is_single_put_with_content_hash(s3):
+    client, bucket = s3
+    df = pd.DataFrame({'season': [2024] * 25, 'hr': range(25)})
+
+    with StreamingParquetWriter(client, bucket, 'x/small.parquet', row_group_rows=10,
+                                metadata={'fetched-at': '2024-12-01T00:00:00'},
+                                hash_metadata_key='content-sha256') as writer:
+        writer.write_frame(df)
+
+    assert (writer.stats['rows'], writer.stats['row_groups'], writer.stats['multipart']) == (25, 3, False)
+    parquet, body, response = read_back(client, bucket, 'x/small.parquet')
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.read().to_pandas().equals(df)
+    assert response['Metadata'] == {'fetched-at': '2024-12-01T00:00:00',
+                                    'content-sha256': hashlib.sha256(body).hexdigest()}
+
+
+def test_large_output_is_uploaded_in_parts(s3):
+    client, bucket = s3
+    # 圧縮が効かない値で MIN_PART_SIZE を超える出力にする
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'value': rng.random(1_600_000)})
+
+    with StreamingParquetWriter(client, bucket, 'x/large.parquet', row_group_rows=200_000,
+                                compression='none', part_size=MIN_PART_SIZE,
+                                metadata={'fetched-at': '2024-12-01T00:00:00'},
+                                hash_metadata_key='content-sha256') as writer:
+        writer.write_frame(df)
+
+    assert writer.stats['multipart'] and writer.stats['parts'] >= 2
+    parquet, body, response = read_back(client, bucket, 'x/large.parquet')
+    assert len(body) == writer.stats['bytes']
+    assert parquet.metadata.num_rows == len(df) and parquet.metadata.num_row_groups == 8
+    # マルチパートでは開始時のメタデータのみ (内容ハッシュは付けられない)
+    assert response['Metadata'] == {'fetched-at': '2024-12-01T00:00:00'}
+    assert response['ETag'].strip('"').endswith(f"-{writer.stats['parts']}")
+
+
+def test_failure_aborts_multipart_upload(s3):
+    client, bucket = s3
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'value': rng.random(1_000_000)})
+
+    with pytest.raises(RuntimeError):
+        with StreamingParquetWriter(client, bucket, 'x/failed.parquet', row_group_rows=200_000,
+                                    compression='none', part_size=MIN_PART_SIZE) as writer:
+            writer.write_frame(df)
+            assert writer.sink.upload_id is not None
+            raise RuntimeError('transform failed')
+
+    assert client.list_multipart_uploads(Bucket=bucket).get('Uploads', []) == []
+    assert 'Contents' not in client.list_objects_v2(Bucket=bucket)
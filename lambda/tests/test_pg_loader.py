@@ -0,0 +1,203 @@
+"""
+players_historical へのロードのテスト
+
+ロード手順のテストはローカルの PostgreSQL を使う (PGHOST または PG_SECRET_ID がなければスキップ)。
+sslmode の既定は require なので、SSL なしのローカル/CI の PostgreSQL では PGSSLMODE=disable を指定する。
+
+    PGHOST=localhost PGUSER=postgres PGPASSWORD=... PGSSLMODE=disable python -m pytest lambda/tests/test_pg_loader.py
+
+本番のテーブルを壊さないよう、別名のテーブル (players_historical_test) に書き込む。
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from pg_loader import DuplicateKeyError, coerce_frame
+
+TABLE = 'players_historical_test'
+
+
+@pytest.fixture
+def pool():
+    if not (os.environ.get('PGHOST') or os.environ.get('PG_SECRET_ID')):
+        pytest.skip('local PostgreSQL is not configured (set PGHOST)')
+    pytest.importorskip('psycopg2')
+    from pg_pool import PgConfig, PgPool
+
+    pool = PgPool(PgConfig.from_env(), size=2)
+    drop_tables(pool)
+    yield pool
+    drop_tables(pool)
+    pool.close()
+
+
+def drop_tables(pool):
+    def drop(conn):
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE} CASCADE")
+            cur.execute(f"DROP TABLE IF EXISTS {TABLE}_staging CASCADE")
+        conn.commit()
+    pool.run(drop)
+
+
+def season_frame(season, players=20, hr_offset=0, ids=True):
+    return pd.DataFrame({
+        'player_name': [f"Player {i}" for i in range(players)],
+        'player_id': [600000 + i if ids else None for i in range(players)],
+        'season': season,
+        'team': [('NYY', 'BOS')[i % 2] for i in range(players)],
+        'games_played': 100,
+        'home_runs': [i + hr_offset for i in range(players)],
+        'batting_avg': 0.25,
+    })
+
+
+def test_coerce_frame_fills_defaults():
+    frame = coerce_frame(season_frame(2015, players=2).drop(columns=['games_played']))
+    assert list(frame['games_played']) == [0, 0]
+    assert list(frame['position']) == ['', '']
+    assert str(frame['player_id'].dtype) == 'Int64'
+
+
+def test_coerce_frame_keeps_same_name_players_with_ids():
+    frame = season_frame(2015, players=4)
+    frame.loc[2, 'player_name'] = 'Player 0'   # 同名・同チーム・同シーズンの別選手
+    assert len(coerce_frame(frame)) == 4
+
+
+def test_coerce_frame_rejects_duplicate_keys():
+    frame = season_frame(2015, players=4)
+    frame.loc[2, 'player_id'] = 600000   # 同じ選手・同チーム・同シーズン
+    with pytest.raises(DuplicateKeyError, match='player_id'):
+        coerce_frame(frame)
+
+    # ID を解決できなかった行は名前で区別する
+    frame = season_frame(2015, players=4)
+    frame['player_id'] = None
+    frame.loc[2, 'player_name'] = 'Player 0'
+    with pytest.raises(DuplicateKeyError, match='Player 0'):
+        coerce_frame(frame)
+
+
+def test_coerce_frame_rejects_missing_team():
+    with pytest.raises(DuplicateKeyError, match='empty'):
+        coerce_frame(season_frame(2015).drop(columns=['team']))
+
+
+def query(pool, sql):
+    def run(conn):
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            rows = cur.fetchall()
+        conn.commit()
+        return rows
+    return pool.run(run)
+
+
+def season_totals(pool):
+    return query(pool, f"SELECT season, COUNT(*), SUM(home_runs) FROM {TABLE} GROUP BY season ORDER BY season")
+
+
+def relations(pool):
+    return [name for (name,) in query(pool, f"""
+        SELECT relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema() AND c.relkind IN ('r', 'p') AND relname LIKE '{TABLE}%'
+        ORDER BY relname""")]
+
+
+def load(pool, mode, frames):
+    from sinks import PostgresSink, write_seasons
+
+    summary = write_seasons([PostgresSink(pool, mode=mode, table=TABLE)], frames)['postgres']
+    assert summary['failed_seasons'] == []
+    return summary
+
+
+def test_full_load_then_partition_swap_is_idempotent(pool):
+    frames = {2015: season_frame(2015), 2016: season_frame(2016)}
+
+    # テーブルがなければ full (ステージングにCOPY → 入れ替え)
+    summary = load(pool, 'partition', frames)
+    assert summary['mode'] == 'full'
+    assert relations(pool) == [TABLE, f"{TABLE}_y2015", f"{TABLE}_y2016"]
+    expected = [(2015, 20, 190), (2016, 20, 190)]
+    assert season_totals(pool) == expected
+
+    # 同じデータで再ロードしても内容は変わらず、準備テーブルも残らない
+    summary = load(pool, 'partition', frames)
+    assert summary['mode'] == 'partition'
+    assert season_totals(pool) == expected
+    assert relations(pool) == [TABLE, f"{TABLE}_y2015", f"{TABLE}_y2016"]
+
+    # 1シーズンだけ差し替え
+    load(pool, 'partition', {2016: season_frame(2016, hr_offset=1)})
+    assert season_totals(pool) == [(2015, 20, 190), (2016, 20, 210)]
+
+
+def test_upsert_reload_changes_nothing(pool):
+    load(pool, 'full', {2015: season_frame(2015)})
+
+    summary = load(pool, 'upsert', {2015: season_frame(2015)})
+    assert (summary['inserted'], summary['updated'], summary['unchanged']) == (0, 0, 20)
+
+    changed = season_frame(2015)
+    changed.loc[0, 'home_runs'] = 50
+    summary = load(pool, 'upsert', {2015: changed, 2016: season_frame(2016, players=5)})
+    assert (summary['inserted'], summary['updated'], summary['unchanged']) == (5, 1, 19)
+    assert season_totals(pool) == [(2015, 20, 240), (2016, 5, 10)]
+
+
+def counts(summary):
+    return summary['inserted'], summary['updated'], summary['unchanged']
+
+
+def indexes(pool):
+    return sorted(name for (name,) in query(
+        pool, f"SELECT indexname FROM pg_indexes WHERE tablename = '{TABLE}'"))
+
+
+def test_upsert_falls_back_to_name_for_unresolved_rows(pool):
+    load(pool, 'full', {2015: season_frame(2015, ids=False)})
+    assert counts(load(pool, 'upsert', {2015: season_frame(2015, ids=False)})) == (0, 0, 20)
+
+    # ID が解決できるようになったら既存の行に ID を設定する (行は増えない)
+    assert counts(load(pool, 'upsert', {2015: season_frame(2015)})) == (0, 20, 0)
+    assert query(pool, f"SELECT COUNT(*), COUNT(player_id) FROM {TABLE}") == [(20, 20)]
+
+    # 再び解決できなくなっても、名前が一致する既存行の ID を使う
+    assert counts(load(pool, 'upsert', {2015: season_frame(2015, ids=False)})) == (0, 0, 20)
+    assert query(pool, f"SELECT COUNT(*), COUNT(player_id) FROM {TABLE}") == [(20, 20)]
+
+
+def test_same_name_players_are_separate_rows(pool):
+    frame = season_frame(2015, players=4)
+    frame.loc[2, 'player_name'] = 'Player 0'
+    load(pool, 'full', {2015: frame})
+
+    assert counts(load(pool, 'upsert', {2015: frame})) == (0, 0, 4)
+    assert query(pool, f"SELECT player_id FROM {TABLE} WHERE player_name = 'Player 0' ORDER BY 1") == [
+        (600000,), (600002,)]
+
+
+def test_upgrade_schema_moves_key_to_player_id(pool):
+    load(pool, 'full', {2015: season_frame(2015, ids=False)})
+
+    # player_id 追加前のテーブル (名前の一意キー) に戻す
+    def downgrade(conn):
+        with conn.cursor() as cur:
+            cur.execute(f"ALTER TABLE {TABLE} DROP COLUMN player_id")
+            cur.execute(f"CREATE UNIQUE INDEX {TABLE}_key ON {TABLE} (player_name, season, team)")
+        conn.commit()
+    pool.run(downgrade)
+    assert indexes(pool) == [f"{TABLE}_key", f"{TABLE}_pkey", f"{TABLE}_season_hr_idx"]
+
+    assert counts(load(pool, 'upsert', {2015: season_frame(2015)})) == (0, 20, 0)
+    assert indexes(pool) == [f"{TABLE}_name_key", f"{TABLE}_pkey", f"{TABLE}_player_key",
+                             f"{TABLE}_season_hr_idx"]
+    assert query(pool, f"SELECT COUNT(*), COUNT(player_id) FROM {TABLE}") == [(20, 20)]
+
+    # 移行後のテーブルへのパーティション差し替えも同じインデックスで ATTACH できる
+    load(pool, 'partition', {2015: season_frame(2015, hr_offset=1), 2016: season_frame(2016)})
+    assert season_totals(pool) == [(2015, 20, 210), (2016, 20, 190)]
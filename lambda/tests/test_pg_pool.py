@@ -0,0 +1,75 @@
+import threading
+import types
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+from pg_pool import PgConfig, PgPool
+
+
+class FakeConnectionPool:
+    """ThreadedConnectionPool の代わり (接続しない)"""
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        pass
+
+    def getconn(self):
+        return types.SimpleNamespace(closed=0, rollback=lambda: None)
+
+    def putconn(self, conn, close=False):
+        pass
+
+    def closeall(self):
+        pass
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr('psycopg2.pool.ThreadedConnectionPool', FakeConnectionPool)
+    return PgPool(PgConfig(host='localhost'), size=8, retries=1, backoff=0)
+
+
+def test_retries_connection_errors(pool):
+    attempts = []
+
+    def flaky(conn):
+        attempts.append(conn)
+        if len(attempts) == 1:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        return 'ok'
+
+    assert pool.run(flaky) == 'ok'
+    assert pool.retry_count == 1
+
+
+def test_retry_count_is_exact_under_concurrency(pool):
+    threads, per_thread = 16, 50
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        for _ in range(per_thread):
+            seen = []
+
+            def flaky(conn):
+                seen.append(conn)
+                if len(seen) == 1:
+                    raise psycopg2.OperationalError('connection reset')
+            pool.run(flaky)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    assert pool.retry_count == threads * per_thread
+
+
+def test_sslmode_defaults_to_require(monkeypatch):
+    for name in ('PG_SECRET_ID', 'PGSSLMODE', 'PGPORT'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('PGHOST', 'localhost')
+    assert PgConfig.from_env().sslmode == 'require'
+    monkeypatch.setenv('PGSSLMODE', 'disable')
+    assert PgConfig.from_env().sslmode == 'disable'
@@ -0,0 +1,115 @@
+"""
+選手IDの解決 (players.py) のテスト
+
+索引は build_index_frame と同じカラムの小さな DataFrame から作る。
+"""
+
+import pandas as pd
+import pytest
+
+import players
+from sample_data import StubFetcher, batting_frame
+
+
+def index_frame(rows):
+    """(player_id, key_fangraphs, name_first, name_last, first_year, last_year) の行から索引を作る"""
+    columns = ['player_id', 'key_fangraphs', 'name_first', 'name_last', 'first_year', 'last_year']
+    frame = pd.DataFrame(rows, columns=columns)
+    frame['key_fangraphs'] = frame['key_fangraphs'].astype('Int64')
+    return frame
+
+
+@pytest.fixture
+def index():
+    return players.PlayerIndex(index_frame([
+        (545361, 10155, 'Mike', 'Trout', 2011, 2030),
+        (660670, 18401, 'Ronald', 'Acuña', 2018, 2030),
+        (502110, 6184, 'J.D.', 'Martinez', 2011, 2030),
+        (519293, 11828, 'Will', 'Smith', 2012, 2030),
+        (669257, 19197, 'Will', 'Smith', 2019, 2030),
+    ]))
+
+
+@pytest.fixture
+def reset_index(monkeypatch, tmp_path):
+    """プロセスで共有する索引を空にし、保存先を tmp_path にする"""
+    monkeypatch.setattr(players, '_index', None)
+    monkeypatch.setattr(players, '_loaded_at', 0.0)
+    monkeypatch.setattr(players, '_failed_at', None)
+    monkeypatch.setenv('PLAYER_IDS', 'on')
+    monkeypatch.setenv('PLAYER_INDEX_PATH', str(tmp_path / 'players' / 'register.parquet'))
+
+
+def test_resolve_by_fangraphs_id(index):
+    # 名前が違っていても IDfg が優先される
+    result = index.resolve(pd.Series([10155, 18401], index=[7, 9]), ['Someone Else', None], 2024)
+
+    assert result.tolist() == [545361, 660670]
+    assert str(result.dtype) == 'Int32'
+    assert list(result.index) == [0, 1]
+
+
+def test_resolve_falls_back_to_normalized_name(index):
+    result = index.resolve([99999, None, None], ['Ronald Acuna Jr.', 'j. d. martinez', 'Nobody'], 2024)
+
+    assert result.tolist()[:2] == [660670, 502110]
+    assert pd.isna(result[2])
+
+
+def test_resolve_same_name_by_season(index):
+    # 2015年に出場した Will Smith は1人だけ、2024年は2人いるので決まらない
+    assert index.resolve(names=['Will Smith'], year=2015).tolist() == [519293]
+    assert pd.isna(index.resolve(names=['Will Smith'], year=2024)[0])
+
+
+def test_get_index_returns_none_when_register_is_unavailable(reset_index, monkeypatch):
+    calls = []
+
+    def fail():
+        calls.append(1)
+        raise ConnectionError('github.com unreachable')
+
+    monkeypatch.setattr(players, 'fetch_register', fail)
+
+    assert players.get_index() is None
+    # RETRY_AFTER_SECONDS の間は取り直さない
+    assert players.get_index() is None
+    assert calls == [1]
+
+
+def test_get_index_is_none_when_disabled(reset_index, monkeypatch):
+    monkeypatch.setenv('PLAYER_IDS', 'off')
+    monkeypatch.setattr(players, 'fetch_register', lambda: pytest.fail('register fetched'))
+
+    assert players.get_index() is None
+
+
+def test_export_keeps_existing_player_ids_when_index_is_unavailable(s3, fake_pybaseball, reset_index,
+                                                                    monkeypatch):
+    import fetch_gateway
+    from datasets import get_spec
+    from pipeline import run_unit
+    from test_orchestrator import read_parquet
+
+    client, bucket = s3
+    monkeypatch.setattr(fetch_gateway, '_gateway', None)
+    monkeypatch.setenv('FETCH_RETRIES', '0')
+    monkeypatch.setenv('FETCH_RATE_LIMITS', 'fangraphs=100')
+    fake_pybaseball.batting_stats = StubFetcher(batting_frame)
+    spec = get_spec('batting')
+    ids = [545361 + i for i in range(5)]
+    monkeypatch.setattr(players, '_index', players.PlayerIndex(index_frame([
+        (player_id, 1000 + i, 'Player', str(i), 2011, 2030) for i, player_id in enumerate(ids)])))
+    monkeypatch.setattr(players, '_loaded_at', float('inf'))
+
+    _, keys, change = run_unit(spec, client, bucket, 2024)
+    assert change == 'new'
+    assert read_parquet(client, bucket, keys[0]).column('player_id').to_pylist() == ids
+
+    # 索引を読み込めなくなっても、null で上書きせずに既存の ID を引き継ぐ
+    monkeypatch.setattr(players, '_index', None)
+    monkeypatch.setattr(players, '_failed_at', float('inf'))
+    _, keys, change = run_unit(spec, client, bucket, 2024)
+
+    assert change == 'unchanged'
+    assert read_parquet(client, bucket, keys[0]).column('player_id').to_pylist() == ids
@@ -0,0 +1,130 @@
+import time
+
+import pandas as pd
+import pytest
+
+from response_cache import ResponseCache
+
+CURRENT_SEASON = 2025
+
+
+def frame(n=10, seed=0):
+    return pd.DataFrame({'Name': [f"Player {i}" for i in range(n)], 'HR': range(seed, seed + n)})
+
+
+class Fetcher:
+    """呼び出し回数を数える取得関数"""
+
+    def __init__(self, data=None):
+        self.data = frame() if data is None else data
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.data
+
+
+@pytest.fixture
+def make_cache(s3, tmp_path):
+    client, bucket = s3
+
+    def make(name='l1', **kwargs):
+        return ResponseCache(client, bucket, CURRENT_SEASON, local_dir=str(tmp_path / name), **kwargs)
+    return make
+
+
+def test_miss_then_local_hit(make_cache):
+    cache = make_cache()
+    fetch = Fetcher()
+    first = cache.get_or_fetch('batting_stats', (2020,), {'qual': 100}, 2020, fetch)
+    second = cache.get_or_fetch('batting_stats', (2020,), {'qual': 100}, 2020, fetch)
+
+    assert fetch.calls == 1
+    pd.testing.assert_frame_equal(first, second)
+    stats = cache.summary()
+    assert (stats['misses'], stats['local_hits'], stats['s3_hits']) == (1, 1, 0)
+    assert stats['hit_rate'] == 0.5
+    assert stats['local_entries'] == 1
+
+
+def test_falls_back_to_s3_when_tmp_is_empty(make_cache):
+    make_cache('cold-1').get_or_fetch('batting_stats', (2020,), {}, 2020, Fetcher())
+
+    # 別コンテナ (空の /tmp) からは S3 で当たり、/tmp にも保存される
+    cache = make_cache('cold-2')
+    fetch = Fetcher()
+    data = cache.get_or_fetch('batting_stats', (2020,), {}, 2020, fetch)
+    cache.get_or_fetch('batting_stats', (2020,), {}, 2020, fetch)
+
+    assert fetch.calls == 0
+    assert len(data) == 10
+    stats = cache.summary()
+    assert (stats['misses'], stats['s3_hits'], stats['local_hits']) == (0, 1, 1)
+
+
+def test_current_season_expires_after_ttl(make_cache):
+    cache = make_cache(current_season_ttl=0.05)
+    fetch = Fetcher()
+    cache.get_or_fetch('batting_stats', (CURRENT_SEASON,), {}, CURRENT_SEASON, fetch)
+    time.sleep(0.1)
+    cache.get_or_fetch('batting_stats', (CURRENT_SEASON,), {}, CURRENT_SEASON, fetch)
+
+    assert fetch.calls == 2
+    stats = cache.summary()
+    # /tmp と S3 の両方で期限切れ
+    assert stats['expired'] == 2
+    assert stats['misses'] == 2
+
+
+def test_final_season_never_expires(make_cache):
+    cache = make_cache(current_season_ttl=0.05)
+    fetch = Fetcher()
+    cache.get_or_fetch('batting_stats', (2019,), {}, 2019, fetch)
+    time.sleep(0.1)
+    cache.get_or_fetch('batting_stats', (2019,), {}, 2019, fetch)
+    assert fetch.calls == 1
+
+
+def test_refresh_skips_cache_and_overwrites(make_cache):
+    cache = make_cache()
+    cache.get_or_fetch('batting_stats', (2020,), {}, 2020, Fetcher(frame(seed=0)))
+    fresh = cache.get_or_fetch('batting_stats', (2020,), {}, 2020, Fetcher(frame(seed=100)), refresh=True)
+    cached = make_cache('other').get_or_fetch('batting_stats', (2020,), {}, 2020, Fetcher())
+
+    assert fresh['HR'].iloc[0] == 100
+    assert cached['HR'].iloc[0] == 100
+
+
+def test_lru_eviction_under_size_cap(make_cache):
+    probe = make_cache('probe')
+    probe.get_or_fetch('batting_stats', (2000,), {}, 2000, Fetcher())
+    entry_size = probe.summary()['local_bytes']
+
+    # 2件分の上限
+    cache = make_cache(max_local_bytes=int(entry_size * 2.5))
+    for year in (2015, 2016):
+        cache.get_or_fetch('batting_stats', (year,), {}, year, Fetcher())
+    # 2015 を参照して新しくし、2017 の追加で 2016 が追い出される
+    cache.get_or_fetch('batting_stats', (2015,), {}, 2015, Fetcher())
+    cache.get_or_fetch('batting_stats', (2017,), {}, 2017, Fetcher())
+
+    stats = cache.summary()
+    assert stats['evictions'] == 1
+    assert stats['local_entries'] == 2
+    assert stats['local_bytes'] <= cache.max_local_bytes
+
+    before = cache.summary()
+    cache.get_or_fetch('batting_stats', (2015,), {}, 2015, Fetcher())
+    cache.get_or_fetch('batting_stats', (2016,), {}, 2016, Fetcher())
+    after = cache.summary()
+    assert after['local_hits'] - before['local_hits'] == 1   # 2015 は /tmp
+    assert after['s3_hits'] - before['s3_hits'] == 1         # 2016 は S3 から
+
+
+def test_warm_start_reloads_tmp_index(make_cache):
+    make_cache('warm').get_or_fetch('batting_stats', (2020,), {}, 2020, Fetcher())
+    cache = make_cache('warm')
+    fetch = Fetcher()
+    cache.get_or_fetch('batting_stats', (2020,), {}, 2020, fetch)
+    assert fetch.calls == 0
+    assert cache.summary()['local_hits'] == 1
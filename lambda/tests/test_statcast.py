@@ -0,0 +1,80 @@
+"""
+Statcast のウィンドウ分割取得のテスト (取得関数は偽の pybaseball、S3 は moto)
+"""
+
+import dataclasses
+import io
+import json
+from datetime import date
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from datasets import get_spec
+from statcast import export_season, season_windows
+
+
+class StubStatcast:
+    """ウィンドウの各日に1球ずつ返す statcast() (fail_starts のウィンドウは例外にする)"""
+
+    def __init__(self, fail_starts=()):
+        self.fail_starts = set(fail_starts)
+        self.calls = []
+
+    def __call__(self, start_dt, end_dt, **kwargs):
+        self.calls.append((start_dt, end_dt))
+        if start_dt in self.fail_starts:
+            raise ValueError(f"Error fetching {start_dt}")
+        days = pd.date_range(start_dt, end_dt)
+        # 取得結果は日付の降順 (書き出し時に並べ替える)。pybaseball は game_date を datetime64 で返す
+        return pd.DataFrame({'game_date': days[::-1],
+                             'game_pk': range(len(days)), 'at_bat_number': 1, 'pitch_number': 1,
+                             'player_name': 'Pitcher', 'release_speed': 95.5})
+
+
+@pytest.fixture
+def statcast_spec(s3, fake_pybaseball, monkeypatch):
+    import fetch_gateway
+
+    monkeypatch.setattr(fetch_gateway, '_gateway', None)
+    monkeypatch.setenv('FETCH_RETRIES', '0')
+    monkeypatch.setenv('FETCH_RATE_LIMITS', 'baseball_savant=100')
+    fake_pybaseball.statcast = StubStatcast()
+    # 2020 年の短縮シーズン開幕月の一部だけにする
+    return dataclasses.replace(get_spec('statcast'), season_start=(7, 23), season_end=(8, 5))
+
+
+def test_season_windows_do_not_cross_months(statcast_spec):
+    assert season_windows(statcast_spec, 2020) == [
+        (date(2020, 7, 23), date(2020, 7, 29)),
+        (date(2020, 7, 30), date(2020, 7, 31)),
+        (date(2020, 8, 1), date(2020, 8, 5)),
+    ]
+    # 当年度は今日までで打ち切る
+    assert season_windows(statcast_spec, 2020, today=date(2020, 7, 25)) == [
+        (date(2020, 7, 23), date(2020, 7, 25))]
+
+
+def test_export_season_writes_windows_and_resumes(s3, fake_pybaseball, statcast_spec):
+    client, bucket = s3
+    fake_pybaseball.statcast.fail_starts = {'2020-07-30'}
+
+    with pytest.raises(RuntimeError, match='1 statcast window'):
+        export_season(statcast_spec, client, bucket, 2020)
+
+    key = 'statcast/year=2020/month=07/statcast_20200723_20200729.parquet'
+    table = pq.read_table(io.BytesIO(client.get_object(Bucket=bucket, Key=key)['Body'].read()))
+    assert table.column('game_date').to_pylist() == [date(2020, 7, d) for d in range(23, 30)]
+    progress = json.loads(client.get_object(
+        Bucket=bucket, Key='_state/statcast/year=2020/progress.json')['Body'].read())
+    assert sorted(progress['windows']) == ['2020-07-23_2020-07-29', '2020-08-01_2020-08-05']
+
+    # 再実行では失敗したウィンドウだけ取得する
+    fake_pybaseball.statcast.fail_starts = set()
+    fake_pybaseball.statcast.calls.clear()
+    rows, keys = export_season(statcast_spec, client, bucket, 2020)
+
+    assert fake_pybaseball.statcast.calls == [('2020-07-30', '2020-07-31')]
+    assert (rows, keys) == (2, ['statcast/year=2020/month=07/statcast_20200730_20200731.parquet'])
+    assert export_season(statcast_spec, client, bucket, 2020) == (0, [])
@@ -6,17 +6,37 @@ import * as ecr from 'aws-cdk-lib/aws-ecr';
 import * as events from 'aws-cdk-lib/aws-events';
 import * as targets from 'aws-cdk-lib/aws-events-targets';
 import * as sns from 'aws-cdk-lib/aws-sns';
+import * as sqs from 'aws-cdk-lib/aws-sqs';
+import * as lambdaEventSources from 'aws-cdk-lib/aws-lambda-event-sources';
 import * as subscriptions from 'aws-cdk-lib/aws-sns-subscriptions';
 import * as cloudwatch from 'aws-cdk-lib/aws-cloudwatch';
 import * as cloudwatch_actions from 'aws-cdk-lib/aws-cloudwatch-actions';
 import * as glue from 'aws-cdk-lib/aws-glue';
 import * as iam from 'aws-cdk-lib/aws-iam';
+import * as sfn from 'aws-cdk-lib/aws-stepfunctions';
+import * as tasks from 'aws-cdk-lib/aws-stepfunctions-tasks';
 import * as dotenv from 'dotenv';
+import * as fs from 'fs';
 import * as path from 'path';
 
 // .env ファイル読み込み
 dotenv.config();
 
+// Glueテーブル定義（python lambda/datasets.py > lib/glue-tables.json で生成）
+interface GlueTableDefinition {
+  constructId: string;
+  name: string;
+  description: string;
+  partitionKeys: glue.CfnTable.ColumnProperty[];
+  columns: glue.CfnTable.ColumnProperty[];
+  // パーティション射影のパラメータ (year の範囲とバケットはスタック側で補う)
+  projection: { [key: string]: string };
+}
+
+const glueTableDefinitions: GlueTableDefinition[] = JSON.parse(
+  fs.readFileSync(path.join(__dirname, 'glue-tables.json'), 'utf-8'),
+);
+
 export class BaseballCdkStack extends cdk.Stack {
   constructor(scope: Construct, id: string, props?: cdk.StackProps) {
     super(scope, id, props);
@@ -27,6 +47,10 @@ export class BaseballCdkStack extends cdk.Stack {
       throw new Error('SLACK_WEBHOOK_URL is not set in .env file');
     }
 
+    // 取得対象の年度範囲 (Lambda の START_YEAR / END_YEAR と Glue のパーティション射影で共通)
+    const startYear = 2015;
+    const endYear = 2025;
+
     // S3バケット作成（Data Lake）
     const dataBucket = new s3.Bucket(this, 'BaseballDataBucket', {
       bucketName: `baseball-stats-data-${this.account}`,
@@ -34,6 +58,11 @@ export class BaseballCdkStack extends cdk.Stack {
       blockPublicAccess: s3.BlockPublicAccess.BLOCK_ALL,
       removalPolicy: cdk.RemovalPolicy.RETAIN, // データ保護のため削除しない
       lifecycleRules: [
+        {
+          // ストリーミングParquetライターの中断したマルチパートアップロードを掃除
+          id: 'AbortIncompleteMultipartUploads',
+          abortIncompleteMultipartUploadAfter: cdk.Duration.days(1),
+        },
         {
           id: 'TransitionToIA',
           transitions: [
@@ -55,211 +84,47 @@ export class BaseballCdkStack extends cdk.Stack {
       },
     });
 
-    // Glue Table（Athenaクエリ用）
-    const glueTable = new glue.CfnTable(this, 'BattingStatsTable', {
-      catalogId: this.account,
-      databaseName: glueDatabase.ref,
-      tableInput: {
-        name: 'batting_stats',
-        description: 'MLB batting statistics by year',
-        tableType: 'EXTERNAL_TABLE',
-        partitionKeys: [
-          {
-            name: 'year',
-            type: 'int',
-            comment: 'Season year',
-          },
-        ],
-        storageDescriptor: {
-          columns: [
-            { name: 'name', type: 'string', comment: 'Player name' },
-            { name: 'season', type: 'int', comment: 'Season year' },
-            { name: 'games', type: 'int', comment: 'Games played' },
-            { name: 'at_bats', type: 'int', comment: 'At bats' },
-            { name: 'runs', type: 'int', comment: 'Runs scored' },
-            { name: 'hits', type: 'int', comment: 'Hits' },
-            { name: 'hr', type: 'int', comment: 'Home runs' },
-            { name: 'rbi', type: 'int', comment: 'Runs batted in' },
-            { name: 'sb', type: 'int', comment: 'Stolen bases' },
-            { name: 'avg', type: 'double', comment: 'Batting average' },
-            { name: 'created_at', type: 'timestamp', comment: 'Record creation timestamp' },
-          ],
-          location: `s3://${dataBucket.bucketName}/batting_stats/`,
-          inputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
-          outputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
-          serdeInfo: {
-            serializationLibrary: 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe',
-          },
-        },
-      },
-    });
-    glueTable.addDependency(glueDatabase);
-
-    // Glue Table（投手成績用）
-    const gluePitchingTable = new glue.CfnTable(this, 'PitchingStatsTable', {
-      catalogId: this.account,
-      databaseName: glueDatabase.ref,
-      tableInput: {
-        name: 'pitching_stats',
-        description: 'MLB pitching statistics by year',
-        tableType: 'EXTERNAL_TABLE',
-        partitionKeys: [
-          {
-            name: 'year',
-            type: 'int',
-            comment: 'Season year',
-          },
-        ],
-        storageDescriptor: {
-          columns: [
-            { name: 'name', type: 'string', comment: 'Pitcher name' },
-            { name: 'season', type: 'int', comment: 'Season year' },
-            { name: 'games', type: 'int', comment: 'Games pitched' },
-            { name: 'wins', type: 'int', comment: 'Wins' },
-            { name: 'losses', type: 'int', comment: 'Losses' },
-            { name: 'era', type: 'double', comment: 'Earned run average' },
-            { name: 'strikeouts', type: 'int', comment: 'Strikeouts' },
-            { name: 'innings_pitched', type: 'double', comment: 'Innings pitched' },
-            { name: 'whip', type: 'double', comment: 'WHIP (walks + hits per inning)' },
-            { name: 'created_at', type: 'timestamp', comment: 'Record creation timestamp' },
-          ],
-          location: `s3://${dataBucket.bucketName}/pitching_stats/`,
-          inputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
-          outputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
-          serdeInfo: {
-            serializationLibrary: 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe',
-          },
-        },
-      },
-    });
-    gluePitchingTable.addDependency(glueDatabase);
-
-    // Glue Table（チーム打撃成績用）
-    const glueTeamBattingTable = new glue.CfnTable(this, 'TeamBattingStatsTable', {
-      catalogId: this.account,
-      databaseName: glueDatabase.ref,
-      tableInput: {
-        name: 'team_batting_stats',
-        description: 'MLB team batting statistics by year',
-        tableType: 'EXTERNAL_TABLE',
-        partitionKeys: [
-          {
-            name: 'year',
-            type: 'int',
-            comment: 'Season year',
-          },
-        ],
-        storageDescriptor: {
-          columns: [
-            { name: 'teamIDfg', type: 'int', comment: 'Team ID' },
-            { name: 'Season', type: 'int', comment: 'Season year' },
-            { name: 'Team', type: 'string', comment: 'Team abbreviation' },
-            { name: 'G', type: 'int', comment: 'Games played' },
-            { name: 'AB', type: 'int', comment: 'At bats' },
-            { name: 'H', type: 'int', comment: 'Hits' },
-            { name: 'HR', type: 'int', comment: 'Home runs' },
-            { name: 'RBI', type: 'int', comment: 'Runs batted in' },
-            { name: 'AVG', type: 'double', comment: 'Batting average' },
-            { name: 'OBP', type: 'double', comment: 'On-base percentage' },
-            { name: 'SLG', type: 'double', comment: 'Slugging percentage' },
-            { name: 'wRC+', type: 'int', comment: 'Weighted runs created plus' },
-            { name: 'WAR', type: 'double', comment: 'Wins above replacement' },
-            { name: 'created_at', type: 'timestamp', comment: 'Record creation timestamp' },
-          ],
-          location: `s3://${dataBucket.bucketName}/team_batting_stats/`,
-          inputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
-          outputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
-          serdeInfo: {
-            serializationLibrary: 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe',
+    // Glue Tables（Athenaクエリ用）
+    // カラム定義は lambda/datasets.py のレジストリから生成した glue-tables.json を使用
+    // パーティションはパーティション射影で解決する (MSCK REPAIR / パーティション登録は不要。
+    // year=YYYY/ が書き込まれた時点でクエリ可能)
+    for (const table of glueTableDefinitions) {
+      const tableLocation = `s3://${dataBucket.bucketName}/${table.name}/`;
+      const projection: { [key: string]: string } = {};
+      if (table.projection['projection.enabled']) {
+        Object.assign(projection, table.projection, {
+          'projection.year.range': `${startYear},${endYear}`,
+          'storage.location.template': tableLocation + table.projection['storage.location.template'],
+        });
+      }
+      const glueTable = new glue.CfnTable(this, table.constructId, {
+        catalogId: this.account,
+        databaseName: glueDatabase.ref,
+        tableInput: {
+          name: table.name,
+          description: table.description,
+          tableType: 'EXTERNAL_TABLE',
+          parameters: {
+            classification: 'parquet',
+            ...projection,
           },
-        },
-      },
-    });
-    glueTeamBattingTable.addDependency(glueDatabase);
-
-    // Glue Table（チーム投手成績用）
-    const glueTeamPitchingTable = new glue.CfnTable(this, 'TeamPitchingStatsTable', {
-      catalogId: this.account,
-      databaseName: glueDatabase.ref,
-      tableInput: {
-        name: 'team_pitching_stats',
-        description: 'MLB team pitching statistics by year',
-        tableType: 'EXTERNAL_TABLE',
-        partitionKeys: [
-          {
-            name: 'year',
-            type: 'int',
-            comment: 'Season year',
-          },
-        ],
-        storageDescriptor: {
-          columns: [
-            { name: 'teamIDfg', type: 'int', comment: 'Team ID' },
-            { name: 'Season', type: 'int', comment: 'Season year' },
-            { name: 'Team', type: 'string', comment: 'Team abbreviation' },
-            { name: 'W', type: 'int', comment: 'Wins' },
-            { name: 'L', type: 'int', comment: 'Losses' },
-            { name: 'ERA', type: 'double', comment: 'Earned run average' },
-            { name: 'IP', type: 'double', comment: 'Innings pitched' },
-            { name: 'SO', type: 'int', comment: 'Strikeouts' },
-            { name: 'BB', type: 'int', comment: 'Walks' },
-            { name: 'WHIP', type: 'double', comment: 'WHIP' },
-            { name: 'FIP', type: 'double', comment: 'Fielding independent pitching' },
-            { name: 'WAR', type: 'double', comment: 'Wins above replacement' },
-            { name: 'created_at', type: 'timestamp', comment: 'Record creation timestamp' },
-          ],
-          location: `s3://${dataBucket.bucketName}/team_pitching_stats/`,
-          inputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
-          outputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
-          serdeInfo: {
-            serializationLibrary: 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe',
+          partitionKeys: table.partitionKeys,
+          storageDescriptor: {
+            columns: table.columns,
+            location: tableLocation,
+            inputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+            outputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+            serdeInfo: {
+              serializationLibrary: 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe',
+            },
           },
         },
-      },
-    });
-    glueTeamPitchingTable.addDependency(glueDatabase);
+      });
+      glueTable.addDependency(glueDatabase);
+    }
 
-    // Glue Table（チーム守備成績用）
-    const glueTeamFieldingTable = new glue.CfnTable(this, 'TeamFieldingStatsTable', {
-      catalogId: this.account,
-      databaseName: glueDatabase.ref,
-      tableInput: {
-        name: 'team_fielding_stats',
-        description: 'MLB team fielding statistics by year',
-        tableType: 'EXTERNAL_TABLE',
-        partitionKeys: [
-          {
-            name: 'year',
-            type: 'int',
-            comment: 'Season year',
-          },
-        ],
-        storageDescriptor: {
-          columns: [
-            { name: 'teamIDfg', type: 'int', comment: 'Team ID' },
-            { name: 'Season', type: 'int', comment: 'Season year' },
-            { name: 'Team', type: 'string', comment: 'Team name' },
-            { name: 'G', type: 'int', comment: 'Games' },
-            { name: 'Inn', type: 'double', comment: 'Innings' },
-            { name: 'PO', type: 'int', comment: 'Putouts' },
-            { name: 'A', type: 'int', comment: 'Assists' },
-            { name: 'E', type: 'int', comment: 'Errors' },
-            { name: 'DP', type: 'int', comment: 'Double plays' },
-            { name: 'DRS', type: 'int', comment: 'Defensive runs saved' },
-            { name: 'UZR', type: 'double', comment: 'Ultimate zone rating' },
-            { name: 'Def', type: 'double', comment: 'Defensive value' },
-            { name: 'created_at', type: 'timestamp', comment: 'Record creation timestamp' },
-          ],
-          location: `s3://${dataBucket.bucketName}/team_fielding_stats/`,
-          inputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
-          outputFormat: 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
-          serdeInfo: {
-            serializationLibrary: 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe',
-          },
-        },
-      },
-    });
-    glueTeamFieldingTable.addDependency(glueDatabase);
+    // パイプライン計測 (EMF) のメトリクス名前空間
+    const pipelineMetricsNamespace = 'BaseballPipeline';
 
     // Lambda関数作成（Container Image版） - VPC外で実行
     const dataFetchFunction = new lambda.DockerImageFunction(this, 'DataFetchFunctionV3', {
@@ -269,17 +134,93 @@ export class BaseballCdkStack extends cdk.Stack {
       ),
       timeout: cdk.Duration.minutes(15),
       memorySize: 3008,
+      ephemeralStorageSize: cdk.Size.mebibytes(2048), // /tmp レスポンスキャッシュ用
       environment: {
         S3_BUCKET: dataBucket.bucketName,
-        START_YEAR: '2015',
-        END_YEAR: '2025',
+        START_YEAR: String(startYear),
+        END_YEAR: String(endYear),
         PYBASEBALL_CACHE: '/tmp/.pybaseball',
         SLACK_WEBHOOK_URL: slackWebhookUrl,
+        FETCH_MAX_WORKERS: '8',
+        SOURCE_CONCURRENCY: 'fangraphs=4,baseball_savant=4',
+        FETCH_RATE_LIMITS: 'fangraphs=1,baseball_savant=2', // 1秒あたりの呼び出し数
+        FETCH_RETRIES: '3',
+        STATCAST_CONCURRENCY: '4',
+        RESPONSE_CACHE_MAX_MB: '1024',
+        CACHE_CURRENT_SEASON_TTL_HOURS: '6',
+        METRICS_NAMESPACE: pipelineMetricsNamespace,
       },
     });
 
-    // Lambdaに S3 書き込み権限付与
-    dataBucket.grantWrite(dataFetchFunction);
+    // Lambdaに S3 読み書き権限付与（インクリメンタル判定で既存オブジェクトをHEADする）
+    dataBucket.grantReadWrite(dataFetchFunction);
+
+    // ==========================================
+    // Fan-out 実行 (Step Functions)
+    // plan → (dataset, year) ごとのワーカーを Map で並列実行 → summarize (Slack通知1回)
+    // いずれも同じLambda (同じイメージ) を action を変えて呼び出す
+    // ==========================================
+    const planExport = new tasks.LambdaInvoke(this, 'PlanExport', {
+      lambdaFunction: dataFetchFunction,
+      payload: sfn.TaskInput.fromObject({
+        action: 'plan',
+        'request.$': '$',
+        // 実行名を run_id にする (入力に run_id を指定すると、その実行の続きから再開)
+        'execution.$': '$$.Execution.Name',
+      }),
+      payloadResponseOnly: true,
+    });
+
+    // 並列に動くワーカー数。取得元のレート制限はプロセス単位なので、各ワーカーは
+    // FETCH_RATE_LIMITS / SOURCE_CONCURRENCY をこの数で割った分だけ使う (fetch_gateway.py)
+    const exportMapConcurrency = 8;
+
+    const exportUnit = new tasks.LambdaInvoke(this, 'ExportUnit', {
+      lambdaFunction: dataFetchFunction,
+      payload: sfn.TaskInput.fromObject({
+        action: 'unit',
+        'config.$': '$.config',
+        'unit.$': '$.unit',
+        processes: exportMapConcurrency,
+      }),
+      payloadResponseOnly: true,
+    });
+    // ワーカーのタイムアウト等は失敗ユニットとして集計に回す
+    exportUnit.addCatch(new sfn.Pass(this, 'UnitFailed', {
+      parameters: {
+        'dataset.$': '$.unit.dataset',
+        'year.$': '$.unit.year',
+        'error.$': '$.failure.Cause',
+      },
+    }), { resultPath: '$.failure' });
+
+    const exportUnits = new sfn.Map(this, 'ExportUnits', {
+      itemsPath: '$.units',
+      itemSelector: { 'config.$': '$.config', 'unit.$': '$$.Map.Item.Value' },
+      maxConcurrency: exportMapConcurrency,
+      resultPath: '$.results',
+    });
+    exportUnits.itemProcessor(exportUnit);
+
+    const summarizeExport = new tasks.LambdaInvoke(this, 'SummarizeExport', {
+      lambdaFunction: dataFetchFunction,
+      payload: sfn.TaskInput.fromObject({
+        action: 'summarize',
+        'config.$': '$.config',
+        'up_to_date.$': '$.up_to_date',
+        'started_at.$': '$.started_at',
+        'availability.$': '$.availability',
+        'results.$': '$.results',
+      }),
+      payloadResponseOnly: true,
+    });
+
+    const exportStateMachine = new sfn.StateMachine(this, 'ExportStateMachine', {
+      stateMachineName: 'baseball-export-fanout',
+      definitionBody: sfn.DefinitionBody.fromChainable(
+        planExport.next(exportUnits).next(summarizeExport)),
+      timeout: cdk.Duration.hours(6),
+    });
 
     // ==========================================
     // SNS Topic (アラーム通知用)
@@ -293,7 +234,7 @@ export class BaseballCdkStack extends cdk.Stack {
     // Slack通知Lambda関数
     // ==========================================
     const slackNotifierFunction = new lambda.Function(this, 'SlackNotifierFunction', {
-      runtime: lambda.Runtime.PYTHON_3_9,
+      runtime: lambda.Runtime.PYTHON_3_12,
       handler: 'index.lambda_handler',
       code: lambda.Code.fromAsset(path.join(__dirname, '../lambda/slack-notifier')),
       timeout: cdk.Duration.seconds(30),
@@ -302,8 +243,18 @@ export class BaseballCdkStack extends cdk.Stack {
       },
     });
 
-    // SNS TopicにSlack通知Lambda購読
-    alarmTopic.addSubscription(new subscriptions.LambdaSubscription(slackNotifierFunction));
+    // SNS Topic → SQS → Slack通知Lambda
+    // 同時に発生したアラームを最大30秒ためて1回の呼び出し (1つのダイジェスト) で送る
+    const alarmQueue = new sqs.Queue(this, 'AlarmNotificationQueue', {
+      visibilityTimeout: cdk.Duration.seconds(180),
+      retentionPeriod: cdk.Duration.days(1),
+    });
+    alarmTopic.addSubscription(new subscriptions.SqsSubscription(alarmQueue));
+    slackNotifierFunction.addEventSource(new lambdaEventSources.SqsEventSource(alarmQueue, {
+      batchSize: 50,
+      maxBatchingWindow: cdk.Duration.seconds(30),
+      reportBatchItemFailures: true,
+    }));
 
     // ==========================================
     // CloudWatch Alarms
@@ -357,6 +308,126 @@ export class BaseballCdkStack extends cdk.Stack {
     lambdaThrottleAlarm.addAlarmAction(new cloudwatch_actions.SnsAction(alarmTopic));
     lambdaThrottleAlarm.addOkAction(new cloudwatch_actions.SnsAction(alarmTopic));
 
+    // 4. Fan-out 実行の失敗 (plan / summarize の失敗・実行タイムアウト)
+    const exportStateMachineFailureAlarm = new cloudwatch.Alarm(this, 'ExportStateMachineFailureAlarm', {
+      metric: exportStateMachine.metricFailed({
+        period: cdk.Duration.minutes(5),
+        statistic: 'Sum',
+      }),
+      threshold: 1,
+      evaluationPeriods: 1,
+      comparisonOperator: cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+      alarmName: 'Baseball-Export-Fanout-Failures',
+      alarmDescription: 'Baseball fan-out export state machine execution failed',
+      treatMissingData: cloudwatch.TreatMissingData.NOT_BREACHING,
+    });
+    exportStateMachineFailureAlarm.addAlarmAction(new cloudwatch_actions.SnsAction(alarmTopic));
+    exportStateMachineFailureAlarm.addOkAction(new cloudwatch_actions.SnsAction(alarmTopic));
+
+    // ==========================================
+    // パイプライン計測 (EMF) のメトリクス
+    // ==========================================
+    const pipelineMetric = (metricName: string, statistic: string, label?: string) =>
+      new cloudwatch.Metric({
+        namespace: pipelineMetricsNamespace,
+        metricName,
+        statistic,
+        label,
+        period: cdk.Duration.minutes(15),
+      });
+
+    // 5. ユニット単位の失敗 (Lambda自体は成功しても一部 (dataset, year) が失敗した場合)
+    const pipelineUnitFailureAlarm = new cloudwatch.Alarm(this, 'PipelineUnitFailureAlarm', {
+      metric: pipelineMetric('Failures', 'Sum'),
+      threshold: 1,
+      evaluationPeriods: 1,
+      comparisonOperator: cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+      alarmName: 'Baseball-Pipeline-Unit-Failures',
+      alarmDescription: 'One or more (dataset, year) export units failed',
+      treatMissingData: cloudwatch.TreatMissingData.NOT_BREACHING,
+    });
+    pipelineUnitFailureAlarm.addAlarmAction(new cloudwatch_actions.SnsAction(alarmTopic));
+    pipelineUnitFailureAlarm.addOkAction(new cloudwatch_actions.SnsAction(alarmTopic));
+
+    // 6. 取得ステージの遅延 (タイムアウト到達前に、どのユニットの取得が遅いかを検知)
+    const pipelineSlowFetchAlarm = new cloudwatch.Alarm(this, 'PipelineSlowFetchAlarm', {
+      metric: pipelineMetric('FetchTime', 'Maximum'),
+      threshold: 5 * 60 * 1000, // 1ユニットの取得が5分以上
+      evaluationPeriods: 1,
+      comparisonOperator: cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+      alarmName: 'Baseball-Pipeline-Slow-Fetch',
+      alarmDescription: 'A single (dataset, year) fetch took 5+ minutes',
+      treatMissingData: cloudwatch.TreatMissingData.NOT_BREACHING,
+    });
+    pipelineSlowFetchAlarm.addAlarmAction(new cloudwatch_actions.SnsAction(alarmTopic));
+
+    // ダッシュボード: ステージ別の所要時間・データ量・キャッシュ効率
+    const pipelineDashboard = new cloudwatch.Dashboard(this, 'PipelineDashboard', {
+      dashboardName: 'Baseball-Pipeline',
+    });
+    pipelineDashboard.addWidgets(
+      new cloudwatch.GraphWidget({
+        title: 'Stage time (sum of units)',
+        left: ['FetchTime', 'TransformTime', 'SerializeTime', 'UploadTime'].map(
+          (name) => pipelineMetric(name, 'Sum', name.replace('Time', ''))),
+        stacked: true,
+        width: 12,
+      }),
+      new cloudwatch.GraphWidget({
+        title: 'Run time vs Lambda duration',
+        left: [
+          pipelineMetric('RunTime', 'Maximum', 'RunTime'),
+          dataFetchFunction.metricDuration({ statistic: 'Maximum', period: cdk.Duration.minutes(15) }),
+        ],
+        leftAnnotations: [lambdaTimeoutAlarm.toAnnotation()],
+        width: 12,
+      }),
+    );
+    pipelineDashboard.addWidgets(
+      new cloudwatch.GraphWidget({
+        title: 'Slowest unit by dataset',
+        left: [new cloudwatch.MathExpression({
+          expression: `SEARCH('{${pipelineMetricsNamespace},Dataset} MetricName="UnitTime"', 'Maximum', 900)`,
+          label: '',
+          period: cdk.Duration.minutes(15),
+        })],
+        width: 12,
+      }),
+      new cloudwatch.GraphWidget({
+        title: 'Rows / bytes written',
+        left: [pipelineMetric('Rows', 'Sum', 'Rows')],
+        right: [pipelineMetric('Bytes', 'Sum', 'Bytes')],
+        width: 12,
+      }),
+    );
+    pipelineDashboard.addWidgets(
+      new cloudwatch.GraphWidget({
+        title: 'Response cache',
+        left: [
+          pipelineMetric('CacheHits', 'Sum', 'Hits'),
+          pipelineMetric('CacheMisses', 'Sum', 'Misses'),
+        ],
+        width: 8,
+      }),
+      new cloudwatch.GraphWidget({
+        title: 'Retries / failures',
+        left: [
+          pipelineMetric('Retries', 'Sum', 'Retries'),
+          pipelineMetric('Failures', 'Sum', 'Unit failures'),
+          pipelineMetric('RunFailures', 'Sum', 'Run failures'),
+        ],
+        width: 8,
+      }),
+      new cloudwatch.AlarmStatusWidget({
+        title: 'Alarms',
+        alarms: [
+          lambdaErrorAlarm, lambdaTimeoutAlarm, lambdaThrottleAlarm, exportStateMachineFailureAlarm,
+          pipelineUnitFailureAlarm, pipelineSlowFetchAlarm,
+        ],
+        width: 8,
+      }),
+    );
+
     // EventBridge ルール: 毎週日曜 0時 (UTC)
     const rule = new events.Rule(this, 'WeeklyScheduleRule', {
       schedule: events.Schedule.cron({
@@ -367,8 +438,10 @@ export class BaseballCdkStack extends cdk.Stack {
       description: 'Run baseball data fetch every Sunday at midnight UTC',
     });
 
-    // Lambda関数をターゲットに設定
-    rule.addTarget(new targets.LambdaFunction(dataFetchFunction));
+    // Fan-out ステートマシンをターゲットに設定（週次はインクリメンタル、全件再取得は手動で mode=full）
+    rule.addTarget(new targets.SfnStateMachine(exportStateMachine, {
+      input: events.RuleTargetInput.fromObject({ mode: 'incremental' }),
+    }));
 
     // ==========================================
     // Outputs
@@ -398,6 +471,16 @@ export class BaseballCdkStack extends cdk.Stack {
       description: 'Lambda Function ARN',
     });
 
+    new cdk.CfnOutput(this, 'PipelineDashboardName', {
+      value: pipelineDashboard.dashboardName,
+      description: 'CloudWatch Dashboard for pipeline stage metrics',
+    });
+
+    new cdk.CfnOutput(this, 'ExportStateMachineArn', {
+      value: exportStateMachine.stateMachineArn,
+      description: 'Fan-out export state machine ARN',
+    });
+
     new cdk.CfnOutput(this, 'SNSTopicArn', {
       value: alarmTopic.topicArn,
       description: 'SNS Topic ARN for CloudWatch Alarms',